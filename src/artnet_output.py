@@ -0,0 +1,96 @@
+# Art-Net DMX output for the timed cues: one universe, sent over UDP from its own thread. A scene sets some
+# channels, optionally crossfading from the current values. The frame is resent every second (and at 40 Hz
+# during a fade), nodes drop the output if they stop hearing from us.
+
+import socket
+import struct
+import threading
+import time
+
+from osc_input import parse_address
+
+ARTNET_PORT = 6454
+FADE_RATE = 40  # Frames per second during a fade, DMX refreshes at 44 Hz at most
+
+
+def artdmx_packet(sequence, universe, data):
+    """ ArtDmx packet: 15-bit port address (net, sub-net, universe) and an even number of channels """
+    if len(data) % 2:
+        data = bytes(data) + b'\0'
+    return b'Art-Net\0' + struct.pack('<H', 0x5000) + struct.pack('>H', 14) + \
+        bytes([sequence, 0, universe & 0xFF, universe >> 8 & 0x7F]) + struct.pack('>H', len(data)) + bytes(data)
+
+
+class ArtNetSender(object):
+    def __init__(self, address, universe=0, logger=None, refresh_s=1.0):
+        host, port = parse_address(address) if ':' in address else (address, ARTNET_PORT)
+        self.address = host, port
+        self.universe = universe
+        self.logger = logger
+        self.refresh_s = refresh_s
+        self._lock = threading.Lock()
+        self._levels = [0.0] * 512
+        self._fade = None  # (from levels, to levels, start, duration)
+        self._dirty = threading.Event()
+        self._sequence = 0
+        self._sock = None
+        self._thread = None
+        self._running = False
+
+    def _log(self, msg):
+        if self.logger:
+            self.logger.log("[Art-Net] " + msg)
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="ArtNetSender", daemon=True)
+        self._thread.start()
+        self._log("Sending universe %d to %s:%d" % ((self.universe,) + self.address))
+
+    def stop(self):
+        if self._thread:
+            self._running = False
+            self._dirty.set()
+            self._thread.join()
+            self._thread = None
+            self._sock.close()
+            self._sock = None
+
+    def set_scene(self, channels, fade_ms=0):
+        """ `channels`: {channel 1-512: level 0-255}, the other channels keep their levels """
+        with self._lock:
+            start = self._current(time.monotonic())
+            target = list(start)
+            for channel, level in channels.items():
+                target[int(channel) - 1] = max(0, min(255, int(level)))
+            self._fade = (start, target, time.monotonic(), fade_ms / 1000.0)
+        self._dirty.set()
+
+    def _current(self, now):
+        if not self._fade:
+            return self._levels
+        start, target, t0, duration = self._fade
+        k = 1.0 if duration <= 0 else min(1.0, (now - t0) / duration)
+        self._levels = [a + (b - a) * k for a, b in zip(start, target)]
+        if k >= 1.0:
+            self._fade = None
+        return self._levels
+
+    def frame(self):
+        with self._lock:
+            return bytes(int(round(level)) for level in self._current(time.monotonic()))
+
+    def _run(self):
+        while self._running:
+            self._dirty.clear()
+            data = self.frame()
+            self._sequence = self._sequence % 255 + 1  # 0 disables sequencing
+            try:
+                self._sock.sendto(artdmx_packet(self._sequence, self.universe, data), self.address)
+            except OSError as e:
+                self._log("Send to %s:%d failed: %s" % (self.address + (e,)))
+            with self._lock:
+                fading = self._fade is not None
+            self._dirty.wait(1.0 / FADE_RATE if fading else self.refresh_s)
@@ -0,0 +1,87 @@
+# Named audio output profiles: input caching, audio output module and device, resampler for each player -
+# 'main', the video ZAD path 'zad' (the main player again, so only the caching applies) and the background music
+# 'bg'. The built-in profiles can be overridden and new ones added in the .fest config. Without a profile
+# VLC's defaults are used. Plus the test tone and the recommendation of the calibration run.
+
+import statistics
+import wave
+
+SECTIONS = ('main', 'zad', 'bg')
+
+BUILTIN_PROFILES = {
+    "live-low-latency": {
+        'main': {'file_caching_ms': 100, 'network_caching_ms': 500, 'resampler': 'speex_resampler',
+                 'resampler_quality': 3},
+        'zad': {'file_caching_ms': 100},
+        'bg': {'file_caching_ms': 1000, 'resampler': 'soxr', 'resampler_quality': 3},
+    },
+    "safe": {
+        'main': {'file_caching_ms': 1000, 'network_caching_ms': 3000},
+        'zad': {'file_caching_ms': 1000},
+        'bg': {'file_caching_ms': 3000, 'network_caching_ms': 5000, 'resampler': 'soxr', 'resampler_quality': 4},
+    },
+}
+
+RESAMPLER_QUALITY_ARGS = {'speex_resampler': '--speex-resampler-quality', 'soxr': '--soxr-resampler-quality',
+                          'samplerate': '--src-converter-type'}
+
+
+def all_profiles(custom):
+    """ Built-in profiles updated with the ones of the config """
+    return {**BUILTIN_PROFILES, **(custom or {})}
+
+
+def get_profile(custom, name):
+    """ The profile by name, KeyError if there is no such profile, {} for no name (VLC defaults) """
+    return all_profiles(custom)[name] if name else {}
+
+
+def instance_args(profile, section):
+    """ vlc.Instance() arguments of the section """
+    options = profile.get(section, {})
+    args = []
+    if 'file_caching_ms' in options:
+        args.append('--file-caching=%d' % options['file_caching_ms'])
+    if 'network_caching_ms' in options:
+        args.append('--network-caching=%d' % options['network_caching_ms'])
+    if options.get('aout'):
+        args.append('--aout=%s' % options['aout'])
+    if options.get('resampler'):
+        args.append('--audio-resampler=%s' % options['resampler'])
+        if 'resampler_quality' in options and options['resampler'] in RESAMPLER_QUALITY_ARGS:
+            args.append('%s=%d' % (RESAMPLER_QUALITY_ARGS[options['resampler']], options['resampler_quality']))
+    if options.get('args'):
+        args.append(options['args'])
+    return " ".join(args)
+
+
+def media_options(profile, section):
+    """ Per-media options of the section: the caching, the only part the ZAD path can set on the shared player """
+    options = profile.get(section, {})
+    media = []
+    if 'file_caching_ms' in options:
+        media.append(':file-caching=%d' % options['file_caching_ms'])
+    if 'network_caching_ms' in options:
+        media.append(':network-caching=%d' % options['network_caching_ms'])
+    return media
+
+
+def audio_device(profile, section):
+    return profile.get(section, {}).get('device') or None
+
+
+def write_test_tone(file_path, seconds=2, rate=48000):
+    """ Silence: the calibration plays it through the real output in the venue """
+    with wave.open(file_path, 'wb') as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b'\0' * 4 * rate * seconds)
+
+
+def recommend(results):
+    """ The name of the profile with the lowest median latency of those that never failed,
+        `results` is {name: [latency ms or None for a failed start]} """
+    ok = {name: statistics.median(latencies) for name, latencies in results.items()
+          if latencies and None not in latencies}
+    return min(ok, key=ok.get) if ok else None
@@ -1,13 +1,14 @@
 import os
 import sys
-import threading
 import time
 
 import vlc
 import wx
-import wx.grid
 
-from constants import Colors, FileTypes, Config
+from bg_music_index import BackgroundMusicIndex
+import cue_scheduler
+from constants import Colors, Config
+from waveform_bar import WaveformBar
 
 
 class BackgroundMusicPlayer(object):
@@ -16,12 +17,25 @@ class BackgroundMusicPlayer(object):
 
         self.timer_update_ms = 500
         self.volume = 50
-        self.vlc_instance = vlc.Instance()
+        vlc_args = parent.vlc_args('bg')
+        self.vlc_instance = parent.media_engine.instance(vlc_args) if parent.media_engine else vlc.Instance(vlc_args)
+        self.probe_instance = vlc.Instance('--intf=dummy') if parent.media_engine else self.vlc_instance
         self.player = self.vlc_instance.media_player_new()
+        parent.set_audio_device(self.player, 'bg')
         self.player.audio_set_volume(self.volume)
         self.player.audio_set_mute(False)
+        self.errors_in_row = 0
+        player_events = self.player.event_manager()
+        for event_type in (vlc.EventType.MediaPlayerEndReached, vlc.EventType.MediaPlayerEncounteredError):
+            player_events.event_attach(event_type, lambda e: wx.CallAfter(self.main_window.on_bg_player_end, e.type,
+                                                                           self.current_track_i))
         self.window = None
         self.playlist = None
+        self.playlist_listed = False
+        self.play_when_listed = False
+        self.played_today = set()
+        self.index = None
+        self.scan_generation = 0
         self.current_track_i = -1
         self.fade_in_out = True
 
@@ -33,38 +47,114 @@ class BackgroundMusicPlayer(object):
         self.window.vol_slider.SetValue(self.volume)
         self.window.set_volume_from_slider()
         if self.playlist:
-            self.load_playlist_to_grid()
+            self.load_playlist_to_list()
             self.main_window.play_bg_item.Enable(True)
         if self.player.get_state() in {vlc.State.Playing, vlc.State.Paused}:
             self.window.lock_btn.Enable(True)
 
     def load_files(self, bg_music_dir):
-        file_paths = [os.path.join(bg_music_dir, f) for f in sorted(os.listdir(bg_music_dir))]
-        self.playlist = [{'title': os.path.basename(p).rsplit('.', 1)[0],
-                          'path': p,
-                          'color': None}
-                         for p in file_paths if os.path.isfile(p) and os.path.basename(p).rsplit('.', 1)[1] in FileTypes.audio_extensions]
+        """ Starts indexing the folder recursively, the playlist is filled in batches on the GUI thread """
+        if self.main_window.fest_file_path:
+            db_path = os.path.splitext(self.main_window.fest_file_path)[0] + '.bgindex.sqlite'
+        else:  # Not in the working directory, wherever that is
+            data_dir = wx.StandardPaths.Get().GetUserDataDir()
+            os.makedirs(data_dir, exist_ok=True)
+            db_path = os.path.join(data_dir, 'bgindex.sqlite')
+        if not self.index or self.index.db_path != db_path:
+            self.close_index()
+            self.index = BackgroundMusicIndex(db_path, self.main_window.logger)
+        self.played_today = self.index.played_since(self.index.start_of_day())
+
+        self.scan_generation += 1
+        generation = self.scan_generation
+        self.playlist = []
+        self.playlist_listed = False
+        self.current_track_i = -1
         if self.window:
-            self.load_playlist_to_grid()
-
-    def load_playlist_to_grid(self):
-        if self.window.grid.GetNumberRows() > 0:
-            self.window.grid.DeleteRows(0, self.window.grid.GetNumberRows(), False)
-        self.window.grid.AppendRows(len(self.playlist))
-        for i in range(len(self.playlist)):
-            self.window.grid.SetCellValue(i, 0, self.playlist[i]['title'])
-            self.window.grid.SetReadOnly(i, 0)
-            if self.playlist[i]['color']:
-                self.window.grid.SetCellBackgroundColour(i, 0, self.playlist[i]['color'])
-        self.window.grid.AutoSize()
-        self.window.Layout()
-        self.window.play_btn.Enable(True)
+            self.load_playlist_to_list()
+        self.index.scan_async(bg_music_dir,
+                              lambda tracks: wx.CallAfter(self.on_tracks_listed, generation, tracks),
+                              lambda: wx.CallAfter(self.on_playlist_listed, generation),
+                              lambda updates: wx.CallAfter(self.on_tracks_updated, generation, updates),
+                              self.probe)
+
+    @property
+    def current_track_path(self):
+        if self.playlist and 0 <= self.current_track_i < len(self.playlist):
+            return self.playlist[self.current_track_i]['path']
+        return None
+
+    def close_index(self):
+        if self.index:
+            self.index.close()
+            self.index = None
+
+    def probe(self, file_path, cancelled=lambda: False):
+        """ Duration and tags for the index, called from the index thread """
+        media = self.probe_instance.media_new(file_path)
+        media.parse_with_options(vlc.MediaParseFlag.local, 3000)
+        start = time.time()
+        while media.get_parsed_status() == 0 and time.time() - start < 4 and not cancelled():
+            time.sleep(0.01)
+        duration = media.get_duration()
+        title, artist = media.get_meta(vlc.Meta.Title), media.get_meta(vlc.Meta.Artist)
+        media.release()
+        if title == os.path.basename(file_path):  # VLC falls back to the file name
+            title = None
+        return duration if duration > 0 else None, title, artist
+
+    def on_tracks_listed(self, generation, tracks):
+        if generation != self.scan_generation:
+            return
+        for track in tracks:
+            if track['path'] in self.played_today:
+                track['color'] = Colors.ROW_PLAYED_TO_END
+        self.playlist.extend(tracks)
+        if self.window and tracks:
+            self.load_playlist_to_list()
+
+    def on_playlist_listed(self, generation):
+        if generation != self.scan_generation:
+            return
+        self.playlist_listed = True
+        self.main_window.restore_bg_state()
+        if self.play_when_listed:
+            self.play_when_listed = False
+            if self.playlist:
+                self.switch_track_async(False)
+
+    def on_tracks_updated(self, generation, updates):
+        if generation != self.scan_generation:
+            return
+        for i, track in updates.items():
+            self.playlist[i].update(track)
+        if self.window:
+            self.window.playlist_ctrl.RefreshItems(min(updates), max(updates))
+
+    def load_playlist_to_list(self):
+        self.window.playlist_ctrl.SetItemCount(len(self.playlist))
+        self.window.playlist_ctrl.Refresh()
+        self.window.play_btn.Enable(bool(self.playlist))
         player_state = self.main_window.bg_player.player.get_state()
         if player_state in range(5):  # If playing
             self.window.pause_btn.SetValue(player_state == vlc.State.Paused)
 
+    def refresh_track(self, i):
+        if self.window and 0 <= i < len(self.playlist):
+            self.window.playlist_ctrl.RefreshItem(i)
+
+    def next_track_i(self):
+        """ The next track not played today, or just the next one when all of them were """
+        n = len(self.playlist)
+        for step in range(1, n + 1):
+            i = (self.current_track_i + step) % n
+            if self.playlist[i]['path'] not in self.played_today:
+                return i
+        return (self.current_track_i + 1) % n
+
     def switch_track_async(self, from_grid=True):
-        threading.Thread(target=self.switch_track_sync, args=(from_grid,)).start()
+        self.main_window.cues.submit('bg', cue_scheduler.GO, 'switch track', self.switch_track_sync, from_grid,
+                                     deadline_s=5)
         self.main_window.bg_player_timer_start(self.timer_update_ms)
 
     def switch_track_sync(self, from_grid=True):
@@ -77,15 +167,10 @@ class BackgroundMusicPlayer(object):
                     self.fade_out_sync(self.main_window.config[Config.BG_FADE_STOP_DELAYS])  # Blocks thread
             else:
                 self.playlist[self.current_track_i]['color'] = Colors.ROW_PLAYED_TO_END
-        if self.window:
-            self.window.grid.SetCellBackgroundColour(self.current_track_i, 0,
-                                                     self.playlist[self.current_track_i]['color'])
-            self.window.grid.ForceRefresh()  # Updates colors
+            wx.CallAfter(self.refresh_track, self.current_track_i)
 
-        if self.window and from_grid:
-            self.current_track_i = self.window.grid.GetSelectedRows()[0]
-        else:
-            self.current_track_i = (self.current_track_i + 1) % len(self.playlist)
+        selected = self.window.playlist_ctrl.GetFirstSelected() if self.window and from_grid else -1
+        self.current_track_i = selected if selected >= 0 else self.next_track_i()
 
         self.main_window.bg_player.play_sync()
         self.main_window.bg_pause_switch.Enable(True)
@@ -95,19 +180,23 @@ class BackgroundMusicPlayer(object):
         if window_exists:
             wx.CallAfter(lambda: self.window.vol_slider.Enable(False))
 
-        vol_msg = ''
-        for i in vol_range:
-            self.player.audio_set_volume(i)
+        vol_msg, i = '', vol_range[0]
+        direction = 'in' if vol_range[0] < vol_range[-1] else 'out'
+        steps = vol_range
+        if self.main_window.media_engine:  # Stepped by the engine, stalls of the GUI process do not matter
+            self.player.fade_volume(vol_range[-1], delay)
+            steps = iter(lambda: self.player.audio_get_volume() if self.player.fading else None, None)
+        for i in steps:
+            if not self.main_window.media_engine:
+                self.player.audio_set_volume(i)
             vol_msg = 'Vol: %d' % self.player.audio_get_volume()
-            wx.CallAfter(lambda: self.main_window.set_bg_player_status('Fading %s... %s' %
-                                                                       ('in' if vol_range[0] < vol_range[-1] else 'out',
-                                                                   vol_msg)))
+            wx.CallAfter(lambda: self.main_window.set_bg_player_status('Fading %s... %s' % (direction, vol_msg)))
             if window_exists:
                 def ui_upd():
                     self.window.vol_slider.SetValue(i)
                     self.window.vol_label.SetLabel("FAD: %d" % i)
                 wx.CallAfter(ui_upd)
-            time.sleep(delay)
+            cue_scheduler.sleep(delay)
 
         wx.CallAfter(lambda: self.main_window.set_bg_player_status(vol_msg))
 
@@ -123,8 +212,9 @@ class BackgroundMusicPlayer(object):
     def fade_out_sync(self, delay):
         self._fade_sync(range(self.volume, -1, -1), delay)
 
-    def play_sync(self):
-        self.player.set_media(self.vlc_instance.media_new(self.playlist[self.current_track_i]['path']))
+    def play_sync(self, start_ms=0):
+        options = self.main_window.media_options('bg') + ([':start-time=%.3f' % (start_ms / 1000)] if start_ms else [])
+        self.player.set_media(self.vlc_instance.media_new(self.playlist[self.current_track_i]['path'], *options))
         if self.player.play() != 0:  # [Play] button is pushed here!
             wx.CallAfter(lambda: self.main_window.set_bg_player_status("Playback FAILED !!!"))
             return
@@ -133,19 +223,28 @@ class BackgroundMusicPlayer(object):
         start = time.time()
         while state != vlc.State.Playing:
             state = self.player.get_state()
+            if state == vlc.State.Error:  # See on_bg_player_end
+                wx.CallAfter(lambda: self.main_window.set_bg_player_status("Playback FAILED !!!"))
+                return
             status = "%s [%fs]" % (self.main_window.player_state_parse(state), (time.time() - start))
             wx.CallAfter(lambda: self.main_window.set_bg_player_status(status))
-            time.sleep(0.005)
+            cue_scheduler.sleep(0.005)
 
-        self.playlist[self.current_track_i]['color'] = Colors.ROW_PLAYING_NOW
+        self.errors_in_row = 0
+        track = self.playlist[self.current_track_i]
+        track['color'] = Colors.ROW_PLAYING_NOW
+        self.main_window.journal_bg()
+        self.played_today.add(track['path'])
+        if self.index:
+            self.index.record_play(track['path'])
 
         if self.window:
             def ui_upd():
                 self.window.pause_btn.Enable(True)
                 self.window.lock_btn.Enable(True)
-                self.window.grid.SetCellBackgroundColour(self.current_track_i, 0, Colors.ROW_PLAYING_NOW)
-                self.window.grid.ForceRefresh()  # Updates colors
+                self.refresh_track(self.current_track_i)
                 self.window.pause_btn.SetValue(False)
+                self.window.waveform.set_peaks(self.main_window.waveform_peaks(track['path']))
 
             wx.CallAfter(ui_upd)
 
@@ -156,7 +255,7 @@ class BackgroundMusicPlayer(object):
             self.player.audio_set_volume(volume)
             status = "Trying to unmute... [%fs]" % (time.time() - start)
             wx.CallAfter(lambda: self.main_window.set_bg_player_status(status))
-            time.sleep(0.005)
+            cue_scheduler.sleep(0.005)
 
         if self.fade_in_out:
             self.fade_in_sync(self.main_window.config[Config.BG_FADE_STOP_DELAYS])
@@ -165,18 +264,20 @@ class BackgroundMusicPlayer(object):
                                                                    (self.main_window.player_state_parse(self.player.get_state()),
                                                                self.player.audio_get_volume())))
 
-    def pause_async(self, paused):
+    def pause_async(self, paused, fade=None):
         if not self.playlist:
             return
-        threading.Thread(target=self.pause_sync, args=(paused,)).start()
+        fade = self.fade_in_out if fade is None else fade
+        self.main_window.cues.submit('bg', cue_scheduler.STOP if paused else cue_scheduler.GO,
+                                     'pause' if paused else 'resume', self.pause_sync, paused, fade)
         if not paused:
             self.main_window.bg_player_timer_start(self.timer_update_ms)
 
-    def pause_sync(self, paused):
-        if self.fade_in_out and paused:
+    def pause_sync(self, paused, fade=True):
+        if fade and paused:
             self.fade_out_sync(self.main_window.config[Config.BG_FADE_PAUSE_DELAYS])
         self.player.set_pause(paused)
-        if self.fade_in_out and not paused:
+        if fade and not paused:
             self.fade_in_sync(self.main_window.config[Config.BG_FADE_PAUSE_DELAYS])
 
 
@@ -228,22 +329,9 @@ class BackgroundMusicWindow(wx.Frame):
         self.vol_label = wx.StaticText(self, label='VOL', size=(60, -1), style=wx.ALIGN_LEFT)
         self.top_toolbar.Add(self.vol_label, 0, wx.ALIGN_CENTER_VERTICAL)
 
-        # --- Table ---
-        self.grid = wx.grid.Grid(self)
-        self.grid.CreateGrid(0, 1)
-        self.grid.HideColLabels()
-        self.grid.DisableDragRowSize()
-        self.grid.SetRowLabelSize(20)
-        self.grid.SetSelectionMode(wx.grid.Grid.GridSelectRows)
-
-        def select_row(e):
-            row = e.Row if hasattr(e, 'Row') else e.TopRow
-            self.grid.Unbind(wx.grid.EVT_GRID_RANGE_SELECT)
-            self.grid.SelectRow(row)
-            self.grid.Bind(wx.grid.EVT_GRID_RANGE_SELECT, select_row)
-
-        self.grid.Bind(wx.grid.EVT_GRID_SELECT_CELL, select_row)
-        self.grid.Bind(wx.grid.EVT_GRID_RANGE_SELECT, select_row)
+        # --- Playlist ---
+        self.playlist_ctrl = PlaylistCtrl(self, main_window.bg_player)
+        self.playlist_ctrl.Bind(wx.EVT_LIST_ITEM_ACTIVATED, lambda e: main_window.background_play(from_grid=True))
 
         # --- Time Slider ---
 
@@ -264,14 +352,18 @@ class BackgroundMusicWindow(wx.Frame):
         self.time_label = wx.StaticText(self, label='Stopped', size=(60, -1), style=wx.ALIGN_CENTER)
         self.bottom_toolbar.Add(self.time_label, 0, wx.ALIGN_CENTER_VERTICAL)
 
+        self.waveform = WaveformBar(self, size=(-1, 40), on_seek=self.on_waveform_seek)
+
         main_sizer.Add(self.top_toolbar, 0, wx.EXPAND)
-        main_sizer.Add(self.grid, 1, wx.EXPAND | wx.TOP, border=1)
+        main_sizer.Add(self.playlist_ctrl, 1, wx.EXPAND | wx.TOP, border=1)
+        main_sizer.Add(self.waveform, 0, wx.EXPAND | wx.TOP, border=1)
         main_sizer.Add(self.bottom_toolbar, 0, wx.EXPAND)
 
         self.SetSizer(main_sizer)
         self.Layout()
 
         self.Bind(wx.EVT_CLOSE, main_window.on_bg_player_win_close)
+        self.Bind(wx.EVT_ICONIZE, main_window.update_position_timers)
 
         f3_id, f4_id, shift_f4_id, esc_id, shift_esc_id = wx.NewId(), wx.NewId(), wx.NewId(), wx.NewId(), wx.NewId()
         self.Bind(wx.EVT_MENU, main_window.play_pause_bg, id=f3_id)
@@ -295,3 +387,37 @@ class BackgroundMusicWindow(wx.Frame):
     def on_seeking(self, e):
         self.main_window.bg_player_timer_start(False)
         self.main_window.on_background_timer(seeking_time=e.Int)
+
+    def on_waveform_seek(self, ms):
+        if self.time_slider.IsEnabled():  # Same lock as the slider
+            self.main_window.on_bg_seek(ms=ms)
+
+
+class PlaylistCtrl(wx.ListCtrl):
+    """ Virtual list: only the visible rows are asked for, so the library size does not matter """
+    def __init__(self, parent, bg_player):
+        wx.ListCtrl.__init__(self, parent, style=wx.LC_REPORT | wx.LC_VIRTUAL | wx.LC_SINGLE_SEL | wx.LC_HRULES)
+        self.bg_player = bg_player
+        self.attrs = {}
+        self.InsertColumn(0, 'Title', width=260)
+        self.InsertColumn(1, 'Artist', width=120)
+        self.InsertColumn(2, 'Time', wx.LIST_FORMAT_RIGHT, width=50)
+
+    def OnGetItemText(self, item, col):
+        track = self.bg_player.playlist[item]
+        if col == 0:
+            return track['title']
+        elif col == 1:
+            return track['artist'] or ''
+        elif track['duration']:
+            return "%d:%02d" % divmod(track['duration'] // 1000, 60)
+        return ''
+
+    def OnGetItemAttr(self, item):
+        color = self.bg_player.playlist[item]['color']
+        if not color:
+            return None
+        if color not in self.attrs:
+            self.attrs[color] = wx.ItemAttr()
+            self.attrs[color].SetBackgroundColour(color)
+        return self.attrs[color]
@@ -0,0 +1,154 @@
+# Persistent index of the background music library: recursive scan, tags and durations cached in SQLite
+# next to the .fest file, plus the play history used to avoid repeating tracks during the day.
+
+import os
+import sqlite3
+import threading
+import time
+
+from constants import FileTypes
+
+
+class BackgroundMusicIndex(object):
+    def __init__(self, db_path, logger=None, batch_size=200):
+        self.db_path = db_path
+        self.logger = logger
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS tracks (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+                         "inode INTEGER, title TEXT, artist TEXT, duration_ms INTEGER)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS history (path TEXT, played_at REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS history_time ON history (played_at)")
+        self._thread = None
+        self._cancelled = None  # threading.Event of the running scan, each scan has its own
+        self._closed = False
+
+    def _log(self, msg):
+        if self.logger:
+            self.logger.log("[BG Index] " + msg)
+
+    def close(self):
+        self.cancel()
+        with self._lock:
+            self._closed = True  # A scan that did not stop in time must not write any more
+            self._db.close()
+
+    # ------------------------------------------------ Scanning ------------------------------------------------
+
+    @staticmethod
+    def list_tracks(root):
+        """ Audio files under the root, sorted by relative path, with their stat results """
+        for folder, dirs, names in os.walk(root):
+            dirs.sort()
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for name in sorted(names):
+                if name.startswith('.') or '.' not in name or \
+                        name.rsplit('.', 1)[1].lower() not in FileTypes.audio_extensions:
+                    continue
+                file_path = os.path.join(folder, name)
+                try:
+                    yield file_path, os.stat(file_path)
+                except OSError:
+                    continue
+
+    def scan_async(self, root, on_batch, on_listed, on_updated, probe=None):
+        """ Lists the library in batches first (`on_batch(tracks)`, then `on_listed()`), then probes the tracks
+        missing from the cache and reports them in batches with `on_updated({index: track})`.
+        The callbacks are called from the scanning thread. `probe(path, cancelled)` returns (duration_ms, title,
+        artist), `cancelled()` tells it to give up on a slow file. A scan left behind by cancel() keeps its own
+        cancelled state, so it never comes back to life. """
+        self.cancel()
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._scan, name="BackgroundMusicIndex", daemon=True,
+                                        args=(root, on_batch, on_listed, on_updated, probe, self._cancelled))
+        self._thread.start()
+
+    def cancel(self, timeout=1.0):
+        if self._thread:
+            self._cancelled.set()
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                self._log("Scan did not stop in %.1fs, left behind" % timeout)
+            self._thread = None
+
+    def _scan(self, root, on_batch, on_listed, on_updated, probe, cancelled):
+        start = time.time()
+        with self._lock:
+            if self._closed:
+                return
+            cached = {row[0]: row[1:] for row in
+                      self._db.execute("SELECT path, size, mtime_ns, inode, title, artist, duration_ms FROM tracks")}
+
+        batch, to_probe, i = [], [], 0
+        for file_path, st in self.list_tracks(root):
+            if cancelled.is_set():
+                return
+            identity = (st.st_size, st.st_mtime_ns, st.st_ino)
+            track = {'title': os.path.basename(file_path).rsplit('.', 1)[0], 'path': file_path, 'color': None,
+                     'artist': None, 'duration': None, 'identity': identity}
+            row = cached.get(file_path)
+            if row and tuple(row[:3]) == identity:
+                track['title'] = row[3] or track['title']
+                track['artist'], track['duration'] = row[4], row[5]
+            else:
+                to_probe.append((i, file_path, identity))
+            batch.append(track)
+            i += 1
+            if len(batch) >= self.batch_size:
+                on_batch(batch)
+                batch = []
+        on_batch(batch)
+        on_listed()
+        self._log("%d tracks listed in %.2fs, %d to probe" % (i, time.time() - start, len(to_probe)))
+        if not probe or not to_probe:
+            return
+
+        updated, rows = {}, []
+        for index, file_path, identity in to_probe:
+            if cancelled.is_set():
+                break
+            try:
+                duration, title, artist = probe(file_path, cancelled.is_set)
+            except Exception as e:  # Broken files should not stop the indexer
+                self._log("Can't probe %s: %s" % (file_path, e))
+                continue
+            if cancelled.is_set():  # The probe may have given up half way
+                break
+            track = {'duration': duration, 'artist': artist}
+            if title:
+                track['title'] = title
+            updated[index] = track
+            rows.append((file_path,) + identity + (title, artist, duration))
+            if len(updated) >= self.batch_size // 10:
+                self._save(rows, cancelled)
+                on_updated(updated)
+                updated, rows = {}, []
+        if updated and not cancelled.is_set():
+            self._save(rows, cancelled)
+            on_updated(updated)
+        self._log("Probed %d tracks in %.1fs" % (len(to_probe), time.time() - start))
+
+    def _save(self, rows, cancelled):
+        with self._lock:
+            if self._closed or cancelled.is_set():
+                return
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.execute("COMMIT")
+
+    # ------------------------------------------------ History ------------------------------------------------
+
+    def record_play(self, file_path):
+        with self._lock:
+            self._db.execute("INSERT INTO history VALUES (?, ?)", (file_path, time.time()))
+
+    def played_since(self, timestamp):
+        with self._lock:
+            return {row[0] for row in self._db.execute("SELECT DISTINCT path FROM history WHERE played_at >= ?",
+                                                       (timestamp,))}
+
+    @staticmethod
+    def start_of_day():
+        return time.mktime(time.localtime()[:3] + (0, 0, 0, 0, 0, -1))
@@ -0,0 +1,147 @@
+# Full-text index of the Cosplay2 request data: an FTS5 table built from requests/list/values into a cache
+# database next to the .fest file. Only the requests whose data changed are re-indexed when the source changes.
+# Searches use their own read-only connection: with WAL they see the last committed index and never wait for
+# a re-index in progress.
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA_VERSION = 1
+
+
+class C2SearchIndex(object):
+    def __init__(self, index_path, source_path, logger=None):
+        self.index_path = index_path
+        self.source_path = source_path
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._thread = None
+        self._db = sqlite3.connect(index_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        if self._meta('schema') != str(SCHEMA_VERSION):
+            self._db.execute("DROP TABLE IF EXISTS docs")
+            self._db.execute("DROP TABLE IF EXISTS fts")
+            self._db.execute("DELETE FROM meta")
+        self._db.execute("CREATE TABLE IF NOT EXISTS docs (request_id INTEGER PRIMARY KEY, number TEXT, digest TEXT)")
+        self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5(title, body, "
+                         "tokenize = 'unicode61 remove_diacritics 2')")  # rowid = requests.id
+        self._set_meta('schema', SCHEMA_VERSION)
+        self._reader = sqlite3.connect('file:%s?mode=ro' % index_path.replace('?', '%3f'), uri=True,
+                                       check_same_thread=False)
+        self._read_lock = threading.Lock()  # Searches from several threads, never held by update()
+
+    def _log(self, msg):
+        if self.logger:
+            self.logger.log("[C2 Search] " + msg)
+
+    def _meta(self, key):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    def close(self):
+        if self._thread:
+            self._thread.join()
+        with self._read_lock:
+            self._reader.close()
+        with self._lock:
+            self._db.close()
+
+    # ------------------------------------------------ Indexing ------------------------------------------------
+
+    def source_stamp(self):
+        try:
+            st = os.stat(self.source_path)
+        except OSError:
+            return None
+        return "%d|%d" % (st.st_size, st.st_mtime_ns)
+
+    @property
+    def stale(self):
+        return self.source_stamp() != self._meta('source')
+
+    def update_async(self):
+        """ Re-indexes in a thread if the source database changed, searches keep working meanwhile """
+        if (self._thread and self._thread.is_alive()) or not self.stale:
+            return
+        self._thread = threading.Thread(target=self.update, name="C2SearchIndex", daemon=True)
+        self._thread.start()
+
+    def read_source(self):
+        """ {request_id: (number, title, body)} from the Cosplay2 database """
+        docs = {}
+        src = sqlite3.connect('file:%s?mode=ro' % self.source_path.replace('?', '%3f'), uri=True)
+        try:
+            for request_id, number, nom, card_code, voting_number, voting_title in src.execute(
+                    "SELECT requests.id, requests.number, list.title, list.card_code, voting_number, voting_title "
+                    "FROM requests LEFT JOIN list ON list.id = topic_id"):
+                title = " ".join(str(x) for x in (nom, card_code, voting_number, voting_title) if x)
+                docs[request_id] = [str(number), title, []]
+            for request_id, title, value in src.execute(
+                    "SELECT request_id, title, value FROM [values] ORDER BY request_id, request_section_id, rowid"):
+                if request_id in docs and value not in (None, ''):
+                    docs[request_id][2].append("%s: %s" % (title, value))
+        finally:
+            src.close()
+        return {k: (number, title, "\n".join(body)) for k, (number, title, body) in docs.items()}
+
+    def update(self):
+        start = time.time()
+        stamp = self.source_stamp()
+        try:
+            docs = self.read_source()
+        except sqlite3.Error as e:
+            self._log("Can't read %s: %s" % (self.source_path, e))
+            return
+        with self._lock:
+            known = dict(self._db.execute("SELECT request_id, digest FROM docs"))
+            changed = 0
+            self._db.execute("BEGIN")
+            try:
+                for request_id in set(known) - set(docs):
+                    self._db.execute("DELETE FROM docs WHERE request_id = ?", (request_id,))
+                    self._db.execute("DELETE FROM fts WHERE rowid = ?", (request_id,))
+                for request_id, (number, title, body) in docs.items():
+                    digest = hashlib.blake2b(("%s\0%s\0%s" % (number, title, body)).encode('utf-8'),
+                                             digest_size=16).hexdigest()
+                    if known.get(request_id) == digest:
+                        continue
+                    changed += 1
+                    self._db.execute("INSERT OR REPLACE INTO docs VALUES (?, ?, ?)", (request_id, number, digest))
+                    self._db.execute("DELETE FROM fts WHERE rowid = ?", (request_id,))
+                    self._db.execute("INSERT INTO fts (rowid, title, body) VALUES (?, ?, ?)",
+                                     (request_id, title, body))
+                self._set_meta('source', stamp)
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+        self._log("%d requests, %d re-indexed in %.2fs" % (len(docs), changed, time.time() - start))
+
+    # ------------------------------------------------ Searching ------------------------------------------------
+
+    @staticmethod
+    def match_query(text):
+        """ Every word as a prefix, all of them required """
+        words = [w.replace('"', '""') for w in text.split()]
+        return " ".join('"%s"*' % w for w in words if w.strip('"'))
+
+    def search(self, text, limit=5000):
+        """ Set of requests.number values (as strings) whose data matches the text """
+        query = self.match_query(text)
+        if not query:
+            return set()
+        with self._read_lock:
+            try:
+                rows = self._reader.execute("SELECT docs.number FROM fts JOIN docs ON docs.request_id = fts.rowid "
+                                            "WHERE fts MATCH ? LIMIT ?", (query, limit)).fetchall()
+            except sqlite3.Error as e:
+                self._log("Query %r failed: %s" % (query, e))
+                return set()
+        return {row[0] for row in rows}
@@ -4,11 +4,22 @@
 class Config:
     LAST_SESSION_PATH = "last_fest.txt"
     PROJECTOR_SCREEN = "Projector Screen"
+    PROJECTOR_SCALING = "Projector Scaling"
+    PROJECTOR_OUTPUTS = "Additional Projector Outputs"
+    IMAGE_MEMORY_BUDGET = "Image Memory Budget (MB)"
+    GRID_THUMBNAILS = "Grid Thumbnails"
     FILENAME_RE = "Filename RegEx"
     BG_TRACKS_DIR = "Background Tracks Dir"
     BG_ZAD_PATH = "Background ZAD Path"
     FILES_DIRS = "Files Dirs"
     VLC_ARGUMENTS = "VLC CLI Arguments"
+    AUDIO_PROFILE = "Audio Output Profile"
+    AUDIO_PROFILES = "Audio Output Profiles"
+    STAGING_DIR = "Media Staging Dir"
+    STAGING_MAX_MB_S = "Media Staging Bandwidth (MB/s)"
+    RECORD_INPUT = "Record Operator Input"
+    STALL_THRESHOLD_MS = "UI Stall Threshold (ms)"
+    MEDIA_ENGINE_PROCESS = "Players In Separate Process"
     BG_FADE_STOP_DELAYS = "BG Player Stop Fade In/Out Delays"
     BG_FADE_PAUSE_DELAYS = "BG Player Pause Fade In/Out Delays"
     COUNTDOWN_TIME_FMT = "Countdown Time Format"
@@ -16,14 +27,34 @@ class Config:
     TEXT_WIN_FIELDS = "Main Fields in Text Window"
     COUNTDOWN_OPENING_TEXT = "Countdown Opening Text"
     COUNTDOWN_INTERMISSION_TEXT = "Countdown Intermission Text"
+    REMOTE_CONTROL_ADDRESS = "Remote Control Address"
+    REMOTE_CONTROL_TOKEN = "Remote Control Token"
+    OSC_LISTEN_ADDRESS = "OSC Listen Address"
+    OSC_FEEDBACK_ADDRESS = "OSC Feedback Address"
+    TIMECODE_OUTPUT_ADDRESS = "Timecode Output Address"
+    TIMECODE_OUTPUT_FORMAT = "Timecode Output Format"
+    TIMECODE_OUTPUT_FPS = "Timecode Output FPS"
+    ARTNET_OUTPUT_ADDRESS = "Art-Net Output Address"
+    ARTNET_UNIVERSE = "Art-Net Universe"
+    DMX_SCENES = "DMX Scenes"
+    TIMELINE_MODE = "Timeline Mode"
+    TIMELINE_GAP_S = "Timeline Changeover (s)"
+    REPLICATION_ROLE = "Replication Role"
+    REPLICATION_ADDRESS = "Replication Address"
+    REPLICATION_TIMEOUT_S = "Replication Heartbeat Timeout (s)"
+    REPLICATION_AUTO_FAILOVER = "Replication Auto Failover"
 
 
 class Columns:
     NUM = u'№'
+    THUMB = 'zad'
     FILES = 'files'
     NOTES = 'notes'
     NAME = 'name'
     C2_REQUEST_ID = 'req_id'
+    STAGING = 'local'
+    START = 'start'
+    SLIP = 'slip'
 
 
 class Strings:
@@ -0,0 +1,203 @@
+# One scheduler for the player actions instead of a thread per action. Each player (lane) has a serialised
+# executor fed from a priority queue, every command has a cancellation token, an optional deadline and a trace.
+# A command of a higher priority cancels the one in flight on its lane and drops the queued ones below it,
+# so a fade can not outlive an emergency stop or lower the volume of the next item. A superseding command
+# replaces the ones of its own priority: a new GO is the one the operator wants, not the one still starting.
+#
+# Long actions cooperate through sleep() / checkpoint(), which raise Cancelled once their token is cancelled.
+# Called outside of the scheduler they behave as time.sleep() and a no-op.
+
+import collections
+import heapq
+import itertools
+import threading
+import time
+
+EMERGENCY, STOP, GO, UI = 0, 1, 2, 3  # Lower runs first
+PRIORITY_NAMES = {EMERGENCY: 'emergency', STOP: 'stop', GO: 'go', UI: 'ui'}
+
+_local = threading.local()
+
+
+class Cancelled(Exception):
+    pass
+
+
+class CancelToken(object):
+    def __init__(self):
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        self._event.set()
+
+    def check(self):
+        if self._event.is_set():
+            raise Cancelled()
+
+    def sleep(self, seconds):
+        """ Wakes up as soon as the token is cancelled """
+        if self._event.wait(seconds):
+            raise Cancelled()
+
+
+def current_token():
+    return getattr(_local, 'token', None)
+
+
+def sleep(seconds):
+    token = current_token()
+    if token:
+        token.sleep(seconds)
+    else:
+        time.sleep(seconds)
+
+
+def checkpoint():
+    token = current_token()
+    if token:
+        token.check()
+
+
+class Command(object):
+    def __init__(self, seq, lane, priority, name, func, args, deadline, on_failed=None):
+        self.seq = seq
+        self.lane = lane
+        self.priority = priority
+        self.name = name
+        self.func = func
+        self.args = args
+        self.deadline = deadline  # time.monotonic() value or None
+        self.on_failed = on_failed
+        self.token = CancelToken()
+        self.submitted = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.outcome = 'queued'
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def trace_entry(self):
+        start_latency = (self.started or self.finished or time.monotonic()) - self.submitted
+        run_time = self.finished - self.started if self.started and self.finished else None
+        return {'lane': self.lane, 'priority': PRIORITY_NAMES[self.priority], 'name': self.name,
+                'outcome': self.outcome, 'start_latency_ms': round(start_latency * 1000, 1),
+                'run_ms': round(run_time * 1000, 1) if run_time is not None else None}
+
+
+class CueScheduler(object):
+    def __init__(self, lanes, logger=None, trace_size=500, late_start_ms=250):
+        self.logger = logger
+        self.late_start_ms = late_start_ms
+        self.trace = collections.deque(maxlen=trace_size)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._queues = {lane: [] for lane in lanes}
+        self._in_flight = {lane: None for lane in lanes}
+        self._running = True
+        self._threads = [threading.Thread(target=self._work, args=(lane,), name="Cues-%s" % lane, daemon=True)
+                         for lane in lanes]
+        for thread in self._threads:
+            thread.start()
+
+    def _log(self, msg):
+        if self.logger:
+            self.logger.log("[Cues] " + msg)
+
+    def _finish(self, command, outcome):
+        command.outcome = outcome
+        command.finished = time.monotonic()
+        entry = command.trace_entry()
+        self.trace.append(entry)
+        if outcome != 'done' or entry['start_latency_ms'] > self.late_start_ms:
+            self._log("%(lane)s/%(priority)s '%(name)s': %(outcome)s, started after %(start_latency_ms)s ms" % entry)
+        if outcome != 'done' and command.on_failed:
+            try:
+                command.on_failed(outcome)
+            except Exception as e:
+                self._log("'%s' failure handler failed: %r" % (command.name, e))
+
+    def submit(self, lane, priority, name, func, *args, deadline_s=None, supersede=False, on_failed=None):
+        """ Queues func(*args) on the lane. It is dropped if it can not start within `deadline_s` seconds.
+            `supersede` cancels the command of the same priority in flight on the lane and drops the queued ones.
+            `on_failed(outcome)` is called when the command does not complete (expired, preempted, superseded,
+            cancelled or failed), from the thread that ended it and under the scheduler lock: it must not block. """
+        command = Command(next(self._seq), lane, priority, name, func, args,
+                          time.monotonic() + deadline_s if deadline_s is not None else None, on_failed)
+        with self._cond:
+            if not self._running:
+                return None
+            if priority == EMERGENCY:
+                self._preempt(self._queues.keys(), 'preempted')
+            elif priority <= STOP:
+                self._preempt([lane], 'preempted', below=priority)
+            if supersede:
+                self._preempt([lane], 'superseded', below=priority - 1, up_to=priority)
+            heapq.heappush(self._queues[lane], command)
+            self._cond.notify_all()
+        return command
+
+    def preempt(self, lanes=None):
+        """ Cancels what is in flight and drops what is queued, at once: the emergency stop """
+        with self._cond:
+            self._preempt(self._queues.keys() if lanes is None else lanes, 'preempted')
+
+    def _preempt(self, lanes, outcome, below=EMERGENCY - 1, up_to=UI):
+        """ Commands with a priority value greater than `below` and not greater than `up_to` only """
+        for lane in lanes:
+            in_flight = self._in_flight[lane]
+            if in_flight and below < in_flight.priority <= up_to:
+                in_flight.token.cancel()  # Reported as cancelled by the lane
+            kept = []
+            for command in self._queues[lane]:
+                if below < command.priority <= up_to:
+                    self._finish(command, outcome)
+                else:
+                    kept.append(command)
+            heapq.heapify(kept)
+            self._queues[lane] = kept
+
+    def busy(self, lane):
+        with self._cond:
+            return bool(self._in_flight[lane] or self._queues[lane])
+
+    def stop(self, timeout=2.0):
+        with self._cond:
+            self._preempt(self._queues.keys(), 'cancelled')
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _work(self, lane):
+        queue = self._queues
+        while True:
+            with self._cond:
+                while self._running and not queue[lane]:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                command = heapq.heappop(queue[lane])
+                if command.deadline is not None and time.monotonic() > command.deadline:
+                    self._finish(command, 'expired')
+                    continue
+                self._in_flight[lane] = command
+            command.started = time.monotonic()
+            _local.token = command.token
+            try:
+                command.token.check()
+                command.func(*command.args)
+                outcome = 'done'
+            except Cancelled:
+                outcome = 'cancelled'
+            except Exception as e:  # A failed cue must not stop the lane
+                outcome = 'error: %r' % e
+            finally:
+                _local.token = None
+            with self._cond:
+                self._in_flight[lane] = None
+                self._finish(command, outcome)
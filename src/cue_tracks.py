@@ -0,0 +1,175 @@
+# Timed cues of the items: ZAD swaps, blackouts, DMX scenes and OSC messages at offsets into the track, kept in
+# <fest>.cues.json next to the .fest file:
+#   {"142": [{"at": "1:23.5", "action": "zad", "arg": "143"}, {"at": "3:10", "action": "dmx", "arg": "blue",
+#            "fade": 2}, {"at": "3:12", "action": "osc", "arg": "/eos/cue/5/fire", "args": []}, ...]}
+# A dedicated thread fires them against the PlaybackClock: it sleeps until shortly before the cue, re-reads the
+# clock and spins out the last milliseconds, so seeks, pauses and the drift correction are followed up to the
+# moment of firing.
+
+import bisect
+import collections
+import json
+import os
+import threading
+import time
+
+ACTIONS = ('zad', 'blackout', 'dmx', 'osc')
+
+
+class TimedCue(object):
+    def __init__(self, at_ms, action, arg=None, fields=None):
+        self.at_ms = at_ms
+        self.action = action
+        self.arg = arg
+        self.fields = fields or {}  # The rest of the entry: 'fade' of a DMX scene, 'args' and 'to' of OSC
+
+    def __repr__(self):
+        return "%s %s at %.3fs" % (self.action, self.arg if self.arg is not None else '', self.at_ms / 1000)
+
+
+def parse_time(value):
+    """ Seconds or "[[h:]m:]s[.fff]" to ms """
+    if isinstance(value, (int, float)):
+        return float(value) * 1000
+    seconds = 0.0
+    for part in str(value).strip().split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds * 1000
+
+
+def load_cue_tracks(file_path):
+    """ {item num: [TimedCue sorted by time]}, {} without the file, ValueError on a broken one """
+    if not os.path.isfile(file_path):
+        return {}
+    with open(file_path, 'r', encoding='utf-8-sig') as f:
+        data = json.load(f)
+    tracks = {}
+    for num, entries in data.items():
+        cues = []
+        for entry in entries:
+            entry = dict(entry)
+            action = entry.pop('action', None)
+            if action not in ACTIONS:
+                raise ValueError("Unknown action %r of item %s" % (action, num))
+            cues.append(TimedCue(parse_time(entry.pop('at')), action, entry.pop('arg', None), entry))
+        tracks[num] = sorted(cues, key=lambda cue: cue.at_ms)
+    return tracks
+
+
+class CueTrackRunner(object):
+    def __init__(self, clock, fire, logger=None, lookahead_ms=30, spin_ms=2, late_ms=250, idle_ms=10):
+        """ `fire(item, cue)` is called from the runner thread. Cues more than `late_ms` late (after a seek or
+            a stall) are skipped rather than fired in a burst. """
+        self.clock = clock
+        self.fire = fire
+        self.logger = logger
+        self.lookahead = lookahead_ms
+        self.spin = spin_ms
+        self.late = late_ms
+        self.idle = idle_ms / 1000.0
+        self.lateness_ms = collections.deque(maxlen=1000)
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._item = None
+        self._cues = []
+        self._times = []
+        self._index = None  # Next cue, None until the first clock reading after arming
+        self._generation = 0
+        self._running = False
+        self._thread = None
+
+    def _log(self, msg):
+        if self.logger:
+            self.logger.log("[Timed Cues] " + msg)
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="CueTrackRunner", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread:
+            self._running = False
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+
+    def arm(self, item, cues):
+        """ The cues of the item now in the player, fired from its current position on """
+        with self._lock:
+            self._item, self._cues = item, list(cues)
+            self._times = [cue.at_ms for cue in self._cues]
+            self._index = None
+            self._generation += 1
+        self._wake.set()
+
+    def disarm(self):
+        """ Nothing more fires for the current item: it is stopping, fading out or stopped """
+        with self._lock:
+            armed = bool(self._cues)
+            self._item, self._cues, self._times, self._index = None, [], [], None
+            self._generation += 1
+        self._wake.set()
+        if armed and self.lateness_ms:
+            self._log(self.lateness_summary())
+
+    def _sleep(self, seconds):
+        self._wake.wait(seconds)
+        self._wake.clear()
+
+    def _run(self):
+        while self._running:
+            with self._lock:
+                item, cues, times, index, generation = \
+                    self._item, self._cues, self._times, self._index, self._generation
+            if not cues:
+                self._sleep(self.idle)
+                continue
+            self.clock.sample()
+            pos = self.clock.now_ms()
+            if pos is None or not self.clock.running:  # Not started yet or paused: the position is held
+                self._sleep(self.idle)
+                continue
+            if index is None or (index > 0 and pos < times[index - 1] - self.late):  # Armed or seek back
+                index = bisect.bisect_left(times, pos - self.late)
+            while index < len(cues) and pos - times[index] > self.late:
+                self._log("Skipped %s of %s, %.0f ms late" % (cues[index], item, pos - times[index]))
+                index += 1
+            with self._lock:
+                if generation != self._generation:
+                    continue
+                self._index = index
+            if index >= len(cues):
+                self._sleep(self.idle * 10)
+                continue
+
+            remaining = times[index] - pos
+            if remaining > self.lookahead:  # Far away: come back to look at the clock again
+                self._sleep(min(remaining - self.lookahead, 200) / 1000.0)
+                continue
+            if remaining > self.spin:
+                time.sleep((remaining - self.spin) / 1000.0)
+                pos = self.clock.now_ms()
+                if pos is None or times[index] - pos > self.spin:  # Paused or seeked meanwhile
+                    continue
+            spin_until = time.monotonic() + max(remaining, self.spin) * 4 / 1000.0  # The clock stopped if longer
+            while pos is not None and pos < times[index]:
+                if generation != self._generation or not self.clock.running or time.monotonic() > spin_until:
+                    pos = None  # Disarmed, paused or stalled: look at the clock again from the top
+                    break
+                pos = self.clock.now_ms()
+            with self._lock:
+                if generation != self._generation or pos is None:
+                    continue
+                self._index = index + 1
+            self.lateness_ms.append(pos - times[index])
+            try:
+                self.fire(item, cues[index])
+            except Exception as e:
+                self._log("%s of %s failed: %s" % (cues[index], item, e))
+
+    def lateness_summary(self):
+        s = sorted(self.lateness_ms)
+        return "%d cues fired, lateness mean %.2fms, p99 %.2fms, max %.2fms" % \
+               (len(s), sum(s) / len(s), s[int(len(s) * 0.99)], s[-1])
@@ -1,4 +1,7 @@
+import hashlib
 import shutil
+import sys
+import threading
 import time
 
 import os
@@ -7,6 +10,64 @@ import wx
 from constants import FileTypes
 
 
+def copy_file_verified(src_path, dst_path, progress=None, cancelled=None, chunk_size=8 * 1024 * 1024):
+    """ Copies a file using the kernel fast paths when possible, returns the BLAKE2 digest of the source.
+    `progress(done, total)` is called from the calling thread, `cancelled()` aborts the copy with InterruptedError. """
+    total = os.path.getsize(src_path)
+    src_hash = hashlib.blake2b()
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    fast_copy = getattr(os, 'copy_file_range', None)
+    if not fast_copy and hasattr(os, 'sendfile') and sys.platform.startswith('linux'):  # To a regular file
+        fast_copy = os.sendfile
+
+    with open(src_path, 'rb', buffering=0) as src, open(dst_path, 'wb', buffering=0) as dst:
+        src_fd, dst_fd = src.fileno(), dst.fileno()
+        done = 0
+        while done < total:
+            if cancelled and cancelled():
+                raise InterruptedError("Copy cancelled")
+            n = 0
+            if fast_copy:
+                try:
+                    if fast_copy is os.sendfile:
+                        n = os.sendfile(dst_fd, src_fd, done, min(chunk_size, total - done))
+                    else:
+                        n = fast_copy(src_fd, dst_fd, min(chunk_size, total - done), done, done)
+                except OSError:  # Cross-device or unsupported FS, falling back to read/write
+                    fast_copy = None
+                    n = 0
+            if n:
+                # The data is in the page cache now, hashing it is cheap
+                hashed = os.preadv(src_fd, [view[:n]], done)
+                src_hash.update(view[:hashed])
+            else:
+                src.seek(done)
+                n = src.readinto(view)
+                if not n:
+                    break
+                src_hash.update(view[:n])
+                dst.seek(done)
+                dst.write(view[:n])
+            done += n
+            if progress:
+                progress(done, total)
+        os.fsync(dst_fd)
+    return src_hash.hexdigest()
+
+
+def file_digest(file_path, chunk_size=8 * 1024 * 1024):
+    h = hashlib.blake2b()
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    with open(file_path, 'rb') as f:
+        n = f.readinto(view)
+        while n:
+            h.update(view[:n])
+            n = f.readinto(view)
+    return h.hexdigest()
+
+
 class FileReplacer(wx.Dialog):
     def __init__(self, parent, num):
         wx.Dialog.__init__(self, parent, title=_(u"Replace File for №%s") % num)
@@ -27,18 +88,32 @@ class FileReplacer(wx.Dialog):
         top_sizer.Add(file_picker_box_sizer, 0, wx.ALL | wx.EXPAND, 5)
         self.Bind(wx.EVT_FILEPICKER_CHANGED, self.file_chosen, self.file_picker)
 
+        self.progress_bar = wx.Gauge(self, range=1)
+        top_sizer.Add(self.progress_bar, 0, wx.LEFT | wx.RIGHT | wx.EXPAND, 5)
+        self.progress_label = wx.StaticText(self, label='')
+        top_sizer.Add(self.progress_label, 0, wx.LEFT | wx.RIGHT | wx.EXPAND, 5)
+
         top_sizer.Add(wx.StaticLine(self), 0, wx.ALL | wx.EXPAND, 5)
         buttons_sizer = wx.BoxSizer(wx.HORIZONTAL)
         self.ok_button = wx.Button(self, wx.ID_OK, "OK")
         self.ok_button.Bind(wx.EVT_BUTTON, self.on_ok)
         buttons_sizer.Add(self.ok_button, 1)
-        buttons_sizer.Add(wx.Button(self, wx.ID_CANCEL, _("Cancel")), 1)
+        cancel_button = wx.Button(self, wx.ID_CANCEL, _("Cancel"))
+        cancel_button.Bind(wx.EVT_BUTTON, self.on_cancel)
+        buttons_sizer.Add(cancel_button, 1)
         top_sizer.Add(buttons_sizer, 0, wx.EXPAND | wx.ALL, 5)
+        self.Bind(wx.EVT_CLOSE, self.on_cancel)
 
         self.SetSizerAndFit(top_sizer)
 
+        self.num = num
         self.src_file = None
         self.bkp_path = None
+        self.worker = None
+        self.cancelled = False
+        self.committed = False  # Past the point of no return: the swap is happening
+        self.cancel_lock = threading.Lock()
+        self.last_progress_update = 0
         self.src_file_selected()
 
     @property
@@ -74,6 +149,82 @@ class FileReplacer(wx.Dialog):
         if not os.path.exists(bkp_dir):
             os.mkdir(bkp_dir)
         self.bkp_path = os.path.join(bkp_dir, time.strftime("%d%m%y%H%M%S-", time.localtime()) + src_name)
-        shutil.move(self.src_file, self.bkp_path)
-        shutil.copy(self.tgt_file, self.src_file)  # TODO: Async and progress bar
-        self.EndModal(wx.ID_OK)
+
+        self.ok_button.Enable(False)
+        self.src_file_chooser.Enable(False)
+        self.file_picker.Enable(False)
+        self.worker = threading.Thread(target=self.replace_sync, args=(self.tgt_file, self.src_file, self.bkp_path))
+        self.worker.start()
+
+    def on_cancel(self, e=None):
+        if self.worker:
+            with self.cancel_lock:
+                self.cancelled = not self.committed  # The worker ends the dialog
+        else:
+            self.EndModal(wx.ID_CANCEL)
+
+    def on_progress(self, done, total):
+        now = time.monotonic()
+        if done < total and now - self.last_progress_update < 0.1:
+            return
+        self.last_progress_update = now
+        wx.CallAfter(self.progress_ui_upd, done, total, _("Copying... %d / %d MB") % (done >> 20, total >> 20))
+
+    def progress_ui_upd(self, done, total, text):
+        self.progress_bar.SetRange(max(total >> 10, 1))
+        self.progress_bar.SetValue(done >> 10)
+        self.progress_label.SetLabel(text)
+
+    def replace_sync(self, tgt_file, src_file, bkp_path):
+        """ Copies to a temporary file next to the original, verifies it and swaps the files atomically """
+        folder, name = os.path.split(src_file)
+        tmp_path = os.path.join(folder, '.%s.part' % name)
+        error = None
+        moved = False  # The original is only in the backup folder
+        try:
+            start = time.monotonic()
+            digest = copy_file_verified(tgt_file, tmp_path, self.on_progress, lambda: self.cancelled)
+            wx.CallAfter(self.progress_label.SetLabel, _("Verifying..."))
+            if file_digest(tmp_path) != digest:
+                raise IOError(_("Checksum mismatch, the copy is corrupted"))
+            with self.cancel_lock:  # Last chance to cancel, the original is not touched until here
+                if self.cancelled:
+                    raise InterruptedError("Copy cancelled")
+                self.committed = True
+            try:
+                os.link(src_file, bkp_path)  # Backup without moving, so the original stays in place until the swap
+            except OSError:
+                shutil.move(src_file, bkp_path)
+                moved = True
+            os.replace(tmp_path, src_file)
+            self.main_window.logger.log("Replaced '%s' with '%s' in %.1fs, BLAKE2 %s" %
+                                        (src_file, tgt_file, time.monotonic() - start, digest))
+        except Exception as ex:
+            error = ex
+            try:
+                if moved and not os.path.exists(src_file):
+                    shutil.move(bkp_path, src_file)
+                if os.path.isfile(tmp_path):
+                    os.remove(tmp_path)
+            except OSError as cleanup_ex:
+                self.main_window.logger.log("[ERROR] Could not restore '%s' from '%s': %s" %
+                                            (src_file, bkp_path, cleanup_ex))
+        finally:
+            wx.CallAfter(self.on_replaced, error)
+
+    def on_replaced(self, error):
+        self.worker.join()
+        self.worker = None
+        if error and self.cancelled:
+            self.EndModal(wx.ID_CANCEL)
+        elif error:
+            self.main_window.logger.log("[ERROR] File replacement failed: %s" % error)
+            wx.MessageBox(_("File replacement failed:\n%s") % error, _("Replace File"), wx.OK | wx.ICON_ERROR, self)
+            self.progress_label.SetLabel('')
+            self.progress_bar.SetValue(0)
+            self.src_file_chooser.Enable(True)
+            self.file_picker.Enable(True)
+            self.ok_button.Enable(True)
+        else:
+            self.main_window.refresh_item(self.num)
+            self.EndModal(wx.ID_OK)
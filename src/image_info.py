@@ -0,0 +1,69 @@
+# Image dimensions from the file headers, without decoding, to plan a decode within a memory budget.
+# JPEG can be decoded directly at 1/2, 1/4 or 1/8 of the size (DCT scaling), other formats are decoded whole.
+
+import struct
+
+JPEG_SCALES = (8, 4, 2, 1)
+BYTES_PER_PIXEL = 4  # RGB + alpha in wx.Image
+
+
+def image_size(file_path):
+    """ Returns (format, width, height) or None if the format is not recognized """
+    with open(file_path, 'rb') as f:
+        head = f.read(32)
+        if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+            w, h = struct.unpack('>II', head[16:24])
+            return 'png', w, h
+        if head[:6] in (b'GIF87a', b'GIF89a'):
+            w, h = struct.unpack('<HH', head[6:10])
+            return 'gif', w, h
+        if head.startswith(b'BM'):
+            w, h = struct.unpack('<ii', head[18:26])
+            return 'bmp', w, abs(h)
+        if head.startswith(b'\xff\xd8'):
+            return _jpeg_size(f)
+    return None
+
+
+def _jpeg_size(f):
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        while marker[1] == 0xFF:  # Fill bytes
+            marker = marker[1:] + f.read(1)
+        code = marker[1]
+        if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:  # No payload
+            continue
+        length, = struct.unpack('>H', f.read(2))
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):  # Start of frame
+            h, w = struct.unpack('>xHH', f.read(5))
+            return 'jpeg', w, h
+        f.seek(length - 2, 1)
+
+
+def jpeg_scale(size, target):
+    """ The largest DCT reduction that still gives at least the target size in both dimensions """
+    w, h = size
+    target_w, target_h = target
+    for scale in JPEG_SCALES:
+        if w // scale >= target_w and h // scale >= target_h:
+            return scale
+    return 1
+
+
+def decode_plan(file_path, target=None, jpeg_draft=True):
+    """ (format, decoded width, decoded height, bytes) for a decode aimed at the target size (None: full size).
+    `jpeg_draft`: the decoder supports DCT scaling. None if the header is not readable. """
+    try:
+        info = image_size(file_path)
+    except (OSError, struct.error):
+        return None
+    if not info:
+        return None
+    fmt, w, h = info
+    if fmt == 'jpeg' and target and jpeg_draft:
+        scale = jpeg_scale((w, h), target)
+        w, h = -(-w // scale), -(-h // scale)
+    return fmt, w, h, w * h * BYTES_PER_PIXEL
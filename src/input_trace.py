@@ -0,0 +1,102 @@
+# Operator input traces for the replay runner: every F-key, selection, search and notes edit is written as a
+# timestamped JSON line, so a show can be replayed headless later, from the show state the recording started
+# with. Only the last traces are kept. Plus the latency statistics of the replay reports and their comparison
+# with a stored baseline.
+
+import glob
+import json
+import os
+import threading
+import time
+
+
+class InputRecorder(object):
+    def __init__(self, file_path, session, keep=20):
+        """ `keep`: the number of traces in the folder, the oldest ones (by name) are removed """
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        folder = os.path.dirname(file_path) or '.'
+        os.makedirs(folder, exist_ok=True)
+        for old_path in sorted(glob.glob(os.path.join(glob.escape(folder), '*.jsonl')))[:-keep + 1 or None]:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+        self._file = open(file_path, 'a', encoding='utf-8')
+        self._write({'session': session, 'started': time.strftime('%Y-%m-%d %H:%M:%S')})
+
+    def _write(self, entry):
+        with self._lock:
+            if self._file:
+                self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                self._file.flush()  # The trace must survive a crash of the show
+
+    def record_state(self, state):
+        """ The show state (ShowState.to_dict()) the replay starts from """
+        self._write({'t': round((time.monotonic() - self._start) * 1000, 1), 'state': state})
+
+    def record(self, action, arg=None):
+        self._write({'t': round((time.monotonic() - self._start) * 1000, 1), 'action': action, 'arg': arg})
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+
+def load_trace(file_path):
+    """ (header, [events]), events are dicts with 't' in ms, 'action' and 'arg'. The header has the recorded
+        show state under 'state' when there is one. """
+    header, events = {}, []
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if 'action' in entry:
+                events.append(entry)
+            elif 'state' in entry:
+                header.setdefault('state', entry['state'])
+            elif not header:
+                header = entry
+    return header, events
+
+
+def percentile(sorted_samples, p):
+    if not sorted_samples:
+        return None
+    k = (len(sorted_samples) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_samples) - 1)
+    return sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (k - lo)
+
+
+def summarize(samples):
+    """ Latency distribution in ms """
+    samples = sorted(samples)
+    if not samples:
+        return {'count': 0}
+    return {'count': len(samples), 'p50': round(percentile(samples, 50), 2), 'p90': round(percentile(samples, 90), 2),
+            'p99': round(percentile(samples, 99), 2), 'max': round(samples[-1], 2)}
+
+
+def compare(report, baseline, tolerance=0.25, slack_ms=5.0):
+    """ Regressions of a report against the baseline: p90 or max over the baseline by more than
+        `tolerance` (relative) and `slack_ms` (absolute, small latencies are noisy) """
+    regressions = []
+    for section, metrics in baseline.items():
+        if not isinstance(metrics, dict):
+            continue
+        for name, base in metrics.items():
+            current = report.get(section, {}).get(name)
+            if not current or not current.get('count') or not base.get('count'):
+                continue
+            for stat in ('p90', 'max'):
+                limit = base[stat] * (1 + tolerance) + slack_ms
+                if current[stat] > limit:
+                    regressions.append("%s/%s %s: %.1f ms, baseline %.1f ms" % (section, name, stat, current[stat],
+                                                                                base[stat]))
+    return regressions
@@ -2,9 +2,14 @@
 # -*- coding: utf-8 -*-
 
 import bisect
+import collections
 import os
 import re
+import shutil
+import socket
+import statistics
 import sys
+import tempfile
 import threading
 import subprocess
 import time
@@ -13,20 +18,50 @@ import json
 import functools
 import gettext
 import copy
+import multiprocessing
+import sqlite3
 
 import vlc
 import wx
 import wx.grid
 
+import audio_profiles
+from artnet_output import ArtNetSender
 from background_music_player import BackgroundMusicPlayer
+from c2_search import C2SearchIndex
+import media_engine
+import media_staging
+import cue_scheduler
+from input_trace import InputRecorder
+from media_level import MediaLevel
+from cue_tracks import CueTrackRunner, load_cue_tracks
 from constants import Config, Colors, Columns, FileTypes, Strings
-from projector import ProjectorWindow
+from projector import ProjectorGroup, PilImage, load_image, scale_image
+from projector_mirror import ProjectorMirror
+from image_info import decode_plan
+from thumbnails import ThumbnailCache
+from thumbnail_render import ThumbnailRenderer, ThumbnailCellRenderer, PreviewPane, THUMB_SIZE, PREVIEW_SIZE
+from video_frames import VideoFrameTap
 from settings import SettingsDialog
 from logger import Logger
 from file_replacer import FileReplacer
 from text_window import TextWindow
 from os_tools import path
 from timecode_window import TimecodeWindow
+from stall_watchdog import StallWatchdog
+from stalls_window import StallsWindow
+from timeline import TimelineScheduler, format_slip, occurrence, parse_start, project_slips
+from show_journal import ShowJournal, ShowState
+from media_manifest import MediaManifest
+from media_staging import MediaStaging
+from remote_server import RemoteControlServer
+from replication import PrimaryWatch, ReplicationPrimary, ReplicationStandby
+from osc_input import OscListener, encode_message, parse_address
+from playback_clock import PlaybackClock
+from timecode_output import TimecodeSender
+from waveform import BUCKET_MS, WaveformCache
+from waveform_bar import WaveformBar
+from zad_pack import ZadPack
 
 locale_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'locale')
 if os.path.isfile(os.path.join(locale_dir, 'ru', 'LC_MESSAGES', 'main.mo')):
@@ -45,16 +80,31 @@ if sys.platform.startswith('linux'):
 
 
 class MainWindow(wx.Frame):
-    def __init__(self, parent, title):
+    def __init__(self, parent, title, session=None, config_overrides=None, replay=False, initial_state=None):
+        """ `session`, `config_overrides`, `replay` and `initial_state` are given by the replay runner. A replay does
+            not touch the show state journal, the grid starts from `initial_state` (ShowState.to_dict()). """
         wx.Frame.__init__(self, parent, title=title, size=(800, 400))
         self.Bind(wx.EVT_CLOSE, self.on_close, self)
+        self.Bind(wx.EVT_ICONIZE, self.update_position_timers, self)
         self.SetBackgroundColour(wx.SystemSettings.GetColour(wx.SYS_COLOUR_FRAMEBK))
 
         self.player_time_update_interval_ms = 300
         self.fade_out_delays_ms = 10
         self.logger = Logger(self)
         base_config = {Config.PROJECTOR_SCREEN: wx.Display.GetCount() - 1,  # The last one
-                       Config.VLC_ARGUMENTS: "",
+                       Config.PROJECTOR_SCALING: "fit",  # "fill", "stretch" or "none"
+                       Config.PROJECTOR_OUTPUTS: [],  # [{"screen": 2, "scaling": "fill"}], side screens
+                       Config.IMAGE_MEMORY_BUDGET: 256,  # Per decoded backdrop
+                       Config.GRID_THUMBNAILS: False,
+                       Config.VLC_ARGUMENTS: "",  # Added to the main player ones of the audio profile
+                       Config.AUDIO_PROFILE: "",  # "live-low-latency", "safe" or your own, VLC defaults if empty
+                       Config.AUDIO_PROFILES: {},  # {"name": {"main": {"file_caching_ms": 300, "aout": "...",
+                       #                                         "device": "..."}, "zad": {...}, "bg": {...}}}
+                       Config.STAGING_DIR: "",  # A folder on a local disk to mirror the media to, when they are slow
+                       Config.STAGING_MAX_MB_S: 20,  # 0 is unlimited
+                       Config.RECORD_INPUT: False,  # <fest>.traces/*.jsonl for the replay runner, the last 20
+                       Config.STALL_THRESHOLD_MS: 200,  # UI stalls longer than this are logged, 0 disables
+                       Config.MEDIA_ENGINE_PROCESS: False,  # VLC in a child process, restarted if it crashes
                        Config.FILENAME_RE: r"^(?P<num>\d{1,3}[a-z]?)[\W_]{1,3}(?P<name>.*)$",
                        Config.BG_TRACKS_DIR: "",
                        Config.BG_ZAD_PATH: "",
@@ -65,13 +115,31 @@ class MainWindow(wx.Frame):
                        Config.TEXT_WIN_FIELDS: ["Пожелания по сценическому свету (необязательно)"],
                        Config.COUNTDOWN_OPENING_TEXT: u"До начала фестиваля",
                        Config.COUNTDOWN_INTERMISSION_TEXT: u"До конца перерыва",
-                       Config.COUNTDOWN_TIME_FMT: u"Ждём Вас в %s ^_^"}
+                       Config.COUNTDOWN_TIME_FMT: u"Ждём Вас в %s ^_^",
+                       Config.REMOTE_CONTROL_ADDRESS: "",  # "0.0.0.0:8765" to control from the LAN
+                       Config.REMOTE_CONTROL_TOKEN: "",
+                       Config.OSC_LISTEN_ADDRESS: "",  # "127.0.0.1:53000", "0.0.0.0:53000" for the LAN
+                       Config.OSC_FEEDBACK_ADDRESS: "",
+                       Config.TIMECODE_OUTPUT_ADDRESS: "",  # "192.168.1.255:5005"
+                       Config.TIMECODE_OUTPUT_FORMAT: "mtc",  # or "smpte"
+                       Config.TIMECODE_OUTPUT_FPS: 25,
+                       Config.ARTNET_OUTPUT_ADDRESS: "",  # "2.255.255.255" for the timed DMX cues
+                       Config.ARTNET_UNIVERSE: 0,
+                       Config.DMX_SCENES: {},  # {"blue": {"1": 255, "4": 128}}, channel: level
+                       Config.TIMELINE_MODE: False,  # Rows get scheduled start times: "12:00", "15:30 countdown"
+                       Config.TIMELINE_GAP_S: 30,  # Between the items, for the projected slip
+                       Config.REPLICATION_ROLE: "",  # "primary" or "standby" for a hot standby laptop
+                       Config.REPLICATION_ADDRESS: "",  # Primary: "0.0.0.0:8766", standby: "192.168.1.10:8766"
+                       Config.REPLICATION_TIMEOUT_S: 1.5,
+                       # Or only the menu item when the primary is lost. Only with a fenced primary: when the
+                       # heartbeats stop because of the network, the primary plays on and both run the show
+                       Config.REPLICATION_AUTO_FAILOVER: False}
 
         self.config_ok = False
         self.fest_file_path = ''
-        if os.path.isfile(Config.LAST_SESSION_PATH):
+        if session or os.path.isfile(Config.LAST_SESSION_PATH):
             try:
-                self.fest_file_path = open(Config.LAST_SESSION_PATH, 'r', encoding='utf-8-sig').read()
+                self.fest_file_path = session or open(Config.LAST_SESSION_PATH, 'r', encoding='utf-8-sig').read()
             except UnicodeDecodeError:
                 try:
                     self.fest_file_path = open(Config.LAST_SESSION_PATH, 'r', encoding='latin-1').read()
@@ -102,8 +170,24 @@ class MainWindow(wx.Frame):
 
         if not self.config_ok:
             self.config = base_config
+        if config_overrides:
+            self.config.update(config_overrides)
 
         self.proj_win = None
+        self.video_tap = None
+        self.thumbnails = None
+        self.thumbnail_bitmaps = collections.OrderedDict()  # Thumbnail file -> wx.Bitmap
+        self.thumbnail_sources = {}  # Num -> file the thumbnail is made of
+        self.thumbnail_refresh_pending = False
+        self.waveforms = None
+        self.time_bar_src = None
+        self.c2_search = None
+        self.staging = None
+        self.zad_pack = None
+        self.zad_pack_building = False
+        self.staging_rows = {}  # Staged file -> item num
+        self.staging_files = {}  # Item num -> staged files
+        self.staging_refresh_pending = False
         self.text_win = None
         self.timecode_win = None
         self.req_id_field_number = None
@@ -115,14 +199,59 @@ class MainWindow(wx.Frame):
         self.full_grid_data = None
         self.num_in_player = None
         self.current_playing_row = None
+        self.replay = replay
+        self.initial_state = initial_state
+        self.journal = ShowJournal(os.path.splitext(self.fest_file_path)[0], self.logger) \
+            if self.fest_file_path and not replay else None
+        self.restored_state = None
+        self.stalls = collections.deque(maxlen=200)
+        self.stalls_win = None
+        self.stall_watchdog = None
+        if self.config[Config.STALL_THRESHOLD_MS]:
+            self.stall_watchdog = StallWatchdog(wx.CallAfter, self.on_stall,
+                                                threshold_ms=self.config[Config.STALL_THRESHOLD_MS])
+            wx.CallAfter(self.stall_watchdog.start)  # Once the main loop runs
+        self.input_recorder = None
+        if self.fest_file_path and self.config[Config.RECORD_INPUT]:
+            self.input_recorder = InputRecorder(os.path.join(os.path.splitext(self.fest_file_path)[0] + '.traces',
+                                                             time.strftime('input-%Y%m%d-%H%M%S.jsonl')),
+                                                self.fest_file_path)
 
         self.player_time_update_timer = wx.Timer(self)
         self.Bind(wx.EVT_TIMER, self.player_time_update, self.player_time_update_timer)
 
+        self.cues = cue_scheduler.CueScheduler(['main', 'bg'], self.logger)  # Player actions, one lane per player
+        try:
+            self.audio_profile = audio_profiles.get_profile(self.config[Config.AUDIO_PROFILES],
+                                                            self.config[Config.AUDIO_PROFILE])
+        except KeyError:
+            self.logger.log("[WARNING] No audio output profile '%s', VLC defaults are used" %
+                            self.config[Config.AUDIO_PROFILE])
+            self.audio_profile = {}
+        self.media_engine = None
+        if self.config[Config.MEDIA_ENGINE_PROCESS]:
+            if media_engine.supported():
+                self.media_engine = media_engine.MediaEngine(self.vlc_args('main'), self.logger,
+                                                             self.on_media_engine_restart)
+            else:
+                self.logger.log("[Media Engine] Not supported on this platform, the players stay in-process")
+
         self.bg_player = BackgroundMusicPlayer(self)
         self.bg_player_timer = wx.Timer(self)
         self.Bind(wx.EVT_TIMER, self.on_background_timer, self.bg_player_timer)
 
+        self.remote_server = None
+        self.osc_listener = None
+        self.timecode_sender = None
+        self.replication_primary = None
+        self.standby = None
+        self.primary_watch = None  # After a takeover
+        self.replica_stale = False  # Deltas are skipped until the next snapshot
+        self.replication_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.publish_playback, self.replication_timer)
+        self.state_publish_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.publish_remote_state, self.state_publish_timer)
+
         self.bg_tracks_dir = None
         self.files_dirs = [path.make_abs(d, path.fest_file) for d in self.config[Config.FILES_DIRS]]
 
@@ -153,6 +282,16 @@ class MainWindow(wx.Frame):
 
         self.Bind(wx.EVT_MENU, self.on_settings, menu_file.Append(wx.ID_ANY, _("&Settings")))
 
+        self.Bind(wx.EVT_MENU, lambda e: self.media_manifest_async(verify=False),
+                  menu_file.Append(wx.ID_ANY, _("Build Media &Manifest")))
+        self.Bind(wx.EVT_MENU, lambda e: self.media_manifest_async(verify=True),
+                  menu_file.Append(wx.ID_ANY, _("&Verify Media Against Manifest")))
+        self.Bind(wx.EVT_MENU, lambda e: self.media_manifest_async(verify=True, quick=True),
+                  menu_file.Append(wx.ID_ANY, _("&Quick Check of Media (Size and Date Only)")))
+        self.Bind(wx.EVT_MENU, self.calibrate_audio_async,
+                  menu_file.Append(wx.ID_ANY, _("&Calibrate Audio Output Profiles")))
+        self.Bind(wx.EVT_MENU, self.load_timed_cues, menu_file.Append(wx.ID_ANY, _("Re&load Timed Cues")))
+
         show_log_menu_item = menu_file.Append(wx.ID_ANY, _("&Show Log"))
 
         def on_log(e):
@@ -160,6 +299,20 @@ class MainWindow(wx.Frame):
             show_log_menu_item.Enable(False)
 
         self.Bind(wx.EVT_MENU, on_log, show_log_menu_item)
+        self.Bind(wx.EVT_MENU, self.stalls_win_show, menu_file.Append(wx.ID_ANY, _("Show UI S&talls")))
+
+        self.Bind(wx.EVT_MENU, self.discard_show_state,
+                  menu_file.Append(wx.ID_ANY, _("&Discard Saved Show State")))
+
+        self.remote_server_item = menu_file.Append(wx.ID_ANY, _("&Remote Control Server"), kind=wx.ITEM_CHECK)
+        self.Bind(wx.EVT_MENU, lambda e: self.remote_server_switch(e.IsChecked()), self.remote_server_item)
+        self.osc_item = menu_file.Append(wx.ID_ANY, _("&OSC Cue Input"), kind=wx.ITEM_CHECK)
+        self.Bind(wx.EVT_MENU, lambda e: self.osc_switch(e.IsChecked()), self.osc_item)
+        self.timecode_item = menu_file.Append(wx.ID_ANY, _("&Timecode Output"), kind=wx.ITEM_CHECK)
+        self.Bind(wx.EVT_MENU, lambda e: self.timecode_output_switch(e.IsChecked()), self.timecode_item)
+        self.take_over_item = menu_file.Append(wx.ID_ANY, _("Take &Over From Primary"))
+        self.take_over_item.Enable(False)
+        self.Bind(wx.EVT_MENU, self.take_over, self.take_over_item)
 
         self.prefer_audio = menu_file.Append(wx.ID_ANY, _("&Prefer No Video (fallback)"), kind=wx.ITEM_CHECK)
         self.prefer_audio.Check(False)
@@ -205,6 +358,13 @@ class MainWindow(wx.Frame):
         self.destroy_proj_win_item = proj_win_menu.Append(wx.ID_ANY, _("&Destroy"))
         self.destroy_proj_win_item.Enable(False)
         self.Bind(wx.EVT_MENU, self.destroy_proj_win, self.destroy_proj_win_item)
+        proj_win_menu.AppendSeparator()
+        self.preview_item = proj_win_menu.Append(wx.ID_ANY, _("ZAD &Preview Pane"), kind=wx.ITEM_CHECK)
+        self.Bind(wx.EVT_MENU, lambda e: self.preview_pane_switch(e.IsChecked()), self.preview_item)
+        self.Bind(wx.EVT_MENU, lambda e: self.mirror_switch(e.IsChecked()),
+                  proj_win_menu.Append(wx.ID_ANY, _("Projector &Mirror"), kind=wx.ITEM_CHECK))
+        proj_win_menu.AppendSeparator()
+        self.Bind(wx.EVT_MENU, self.build_zad_pack_async, proj_win_menu.Append(wx.ID_ANY, _("&Build Show Pack")))
         menu_bar.Append(proj_win_menu, _("&Projector Window"))
 
         # --- Text Windows ---
@@ -238,7 +398,8 @@ class MainWindow(wx.Frame):
         self.Bind(wx.EVT_MENU, self.fade_switched, self.bg_fade_switch)
 
         self.play_bg_item = menu_bg_music.Append(wx.ID_ANY, _("&Play Selected Item\tF4"))
-        self.Bind(wx.EVT_MENU, lambda e: self.background_play(from_grid=True), self.play_bg_item)
+        self.Bind(wx.EVT_MENU, self.recorded('bg_selected', lambda e: self.background_play(from_grid=True)),
+                  self.play_bg_item)
         self.play_bg_item.Enable(False)
 
         self.bg_pause_switch = menu_bg_music.Append(wx.ID_ANY, _("&Pause\tF3"), kind=wx.ITEM_CHECK)
@@ -262,15 +423,16 @@ class MainWindow(wx.Frame):
         self.play_next_bg_item = menu_play.Append(wx.ID_ANY, _("Play &Next BG Track\tShift+F4"))
         self.play_next_bg_item.Enable(False)
 
-        self.Bind(wx.EVT_MENU, self.emergency_stop, emergency_stop_item)
-        self.Bind(wx.EVT_MENU, self.show_zad, show_zad_item)
-        self.Bind(wx.EVT_MENU, self.clear_zad, clear_zad_item)
-        self.Bind(wx.EVT_MENU, self.play_async, play_track_item)
-        self.Bind(wx.EVT_MENU, self.stop_async, fade_out_item)
-        self.Bind(wx.EVT_MENU, self.end_show, end_show_item)
-        self.Bind(wx.EVT_MENU, lambda e: self.clear_zad(e, True), no_show_item)
-        self.Bind(wx.EVT_MENU, self.play_pause_bg_end_show, self.play_pause_bg_end_show_item)
-        self.Bind(wx.EVT_MENU, self.background_play, self.play_next_bg_item)
+        self.Bind(wx.EVT_MENU, self.recorded('emergency_stop', self.emergency_stop), emergency_stop_item)
+        self.Bind(wx.EVT_MENU, self.recorded('show_zad', self.show_zad), show_zad_item)
+        self.Bind(wx.EVT_MENU, self.recorded('clear_zad', self.clear_zad), clear_zad_item)
+        self.Bind(wx.EVT_MENU, self.recorded('play_async', self.play_async), play_track_item)
+        self.Bind(wx.EVT_MENU, self.recorded('stop_async', self.stop_async), fade_out_item)
+        self.Bind(wx.EVT_MENU, self.recorded('end_show', self.end_show), end_show_item)
+        self.Bind(wx.EVT_MENU, self.recorded('no_show', lambda e: self.clear_zad(e, True)), no_show_item)
+        self.Bind(wx.EVT_MENU, self.recorded('play_pause_bg_end_show', self.play_pause_bg_end_show),
+                  self.play_pause_bg_end_show_item)
+        self.Bind(wx.EVT_MENU, self.recorded('bg_next', self.background_play), self.play_next_bg_item)
 
         self.SetAcceleratorTable(wx.AcceleratorTable([
             wx.AcceleratorEntry(wx.ACCEL_SHIFT, wx.WXK_ESCAPE, emergency_stop_item.GetId()),
@@ -314,7 +476,12 @@ class MainWindow(wx.Frame):
         self.toolbar.Add(self.fade_out_btn, 0)
         self.fade_out_btn.Bind(wx.EVT_BUTTON, self.stop_async)
 
-        self.time_bar = wx.Gauge(self, range=1, size=(-1, toolbar_base_height))
+        self.bg_level_src, self.bg_level_peaks = None, None
+        self.media_level = MediaLevel(self, [(_("Main"), self.main_levels), (_("BG"), self.bg_levels)],
+                                      size=(120, toolbar_base_height))
+        self.toolbar.Add(self.media_level, 0, wx.ALIGN_CENTER_VERTICAL | wx.LEFT | wx.RIGHT, border=2)
+
+        self.time_bar = WaveformBar(self, size=(-1, toolbar_base_height))
         self.toolbar.Add(self.time_bar, 1, wx.ALIGN_CENTER_VERTICAL)
         self.time_label = wx.StaticText(self, label='Stop', size=(50, -1), style=wx.ALIGN_CENTER)
         self.toolbar.Add(self.time_label, 0, wx.ALIGN_CENTER_VERTICAL)
@@ -357,6 +524,7 @@ class MainWindow(wx.Frame):
             if not e.Selecting() or hasattr(e, 'TopRow') and e.TopRow == e.BottomRow:
                 return
             row = e.Row if hasattr(e, 'Row') else self.grid.GridCursorRow
+            self.record_input('select', self.get_num(row))
             self.grid.Unbind(wx.grid.EVT_GRID_RANGE_SELECT)
             self.grid.SelectRow(row)
             self.grid.Bind(wx.grid.EVT_GRID_RANGE_SELECT, select_row)
@@ -369,12 +537,8 @@ class MainWindow(wx.Frame):
                 if num not in self.data:
                     self.text_win.clear(num)
                     return
-                row_data = self.data[num]
-                if Columns.C2_REQUEST_ID in row_data:
-                    req_id = row_data[Columns.C2_REQUEST_ID]
-                elif '_' + Columns.C2_REQUEST_ID in row_data:
-                    req_id = row_data['_' + Columns.C2_REQUEST_ID]
-                else:
+                req_id = self.item_req_id(num)
+                if req_id is None:
                     self.logger.log('No request id column found in filenames. Add "{0}" or "_{0}" to your regex'
                                     .format(Columns.C2_REQUEST_ID))
                     self.text_win.clear()
@@ -384,6 +548,9 @@ class MainWindow(wx.Frame):
             if self.text_win:
                 text_win_load()
 
+            self.journal_cursor(row)
+            self.update_preview(row)
+
             if not self.is_playing:
                 self.set_timecode('№ %s ■' % self.get_num(row))
 
@@ -409,8 +576,21 @@ class MainWindow(wx.Frame):
         self.grid.Bind(wx.EVT_KEY_DOWN, on_grid_key_down)
         self.grid.Bind(wx.grid.EVT_GRID_CELL_LEFT_DCLICK, play_if_track)  # For emergency situations
 
+        self.preview_pane = PreviewPane(self)
+        self.preview_pane.Hide()
+        self.mirror = ProjectorMirror(self, self)
+        self.mirror.Hide()
+
+        side_sizer = wx.BoxSizer(wx.VERTICAL)
+        side_sizer.Add(self.mirror, 0, wx.EXPAND | wx.BOTTOM, border=1)
+        side_sizer.Add(self.preview_pane, 1, wx.EXPAND)
+
+        grid_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        grid_sizer.Add(self.grid, 1, wx.EXPAND)
+        grid_sizer.Add(side_sizer, 0, wx.EXPAND | wx.LEFT, border=1)
+
         main_sizer.Add(self.toolbar, 0, wx.EXPAND)
-        main_sizer.Add(self.grid, 1, wx.EXPAND | wx.TOP, border=1)
+        main_sizer.Add(grid_sizer, 1, wx.EXPAND | wx.TOP, border=1)
 
         self.SetSizer(main_sizer)
 
@@ -420,17 +600,45 @@ class MainWindow(wx.Frame):
 
         # ----------------------- VLC ---------------------
 
-        self.vlc_instance = vlc.Instance(self.config[Config.VLC_ARGUMENTS])
+        self.vlc_instance = self.media_engine.instance() if self.media_engine else vlc.Instance(self.vlc_args('main'))
 
         self.player = self.vlc_instance.media_player_new()
+        self.set_audio_device(self.player, 'main')
         self.player.audio_set_volume(100)
         self.player.audio_set_mute(False)
+        self.playback_clock = PlaybackClock(self.player.get_time,
+                                            lambda: self.player.get_state() == vlc.State.Playing)
+        self.player_generation = 0  # Events of a media replaced by the next item are ignored
+        self.item_end_handled = True
+        self.timed_cues = {}  # Item num -> [TimedCue], from <fest>.cues.json
+        self.cue_runner = CueTrackRunner(self.playback_clock, self.fire_timed_cue, self.logger)
+        self.cue_runner.start()
+        self.artnet_sender = None
+        self.cue_osc_sock = None
+        self.timeline = None
+        self.timeline_started = {}  # Row key -> wall time its item or countdown started
+        self.timeline_last = None  # Row key started last
+        self.item_lengths = {}  # Item num -> seconds, None until its waveform is ready
+        self.timeline_rows_cache = None  # See timeline_rows()
+        self.slip_texts = {}  # Row -> text of its slip cell
+        self.timeline_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.refresh_slips, self.timeline_timer)
+        player_events = self.player.event_manager()
+        for event_type in (vlc.EventType.MediaPlayerEndReached, vlc.EventType.MediaPlayerStopped,
+                           vlc.EventType.MediaPlayerEncounteredError):
+            # Called on a VLC thread which must not call libvlc back
+            player_events.event_attach(event_type, lambda e: wx.CallAfter(self.on_player_end, e.type,
+                                                                           self.player_generation))
 
         # https://github.com/maddox/vlc/blob/master/src/control/video.c#L626
         # https://wiki.videolan.org/deinterlacing
         self.player.video_set_deinterlace("blend")
 
         self.vol_control.SetValue(self.player.audio_get_volume())
+        if WaveformCache.available():  # The levels are read from the waveform peaks
+            self.media_level.start()
+        else:
+            self.media_level.Hide()
 
         self.player_status = "VLC %s: %s" % \
                              (vlc.libvlc_get_version().decode(), self.player_state_parse(self.player.get_state()))
@@ -446,6 +654,14 @@ class MainWindow(wx.Frame):
                 self.load_files()
                 if self.config[Config.BG_TRACKS_DIR]:
                     self.on_bg_load_files()
+                self.restore_show_state()
+                if self.config[Config.REMOTE_CONTROL_ADDRESS]:
+                    self.remote_server_switch(True)
+                if self.config[Config.OSC_LISTEN_ADDRESS]:
+                    self.osc_switch(True)
+                if self.config[Config.TIMECODE_OUTPUT_ADDRESS]:
+                    self.timecode_output_switch(True)
+                self.start_replication()
             self.grid.Bind(wx.grid.EVT_GRID_CELL_CHANGED, self.on_grid_cell_changed)
             self.grid.Bind(wx.grid.EVT_GRID_SELECT_CELL, select_row)
             self.grid.Bind(wx.grid.EVT_GRID_RANGE_SELECT, select_row)
@@ -457,6 +673,7 @@ class MainWindow(wx.Frame):
 
     def grid_set_shape(self, new_rows, new_cols, readonly=False):
         current_rows, current_cols = self.grid.GetNumberRows(), self.grid.GetNumberCols()
+        self.timeline_invalidate()
         if current_rows > 0:
             self.grid.DeleteRows(0, current_rows, False)
         self.grid.AppendRows(new_rows)
@@ -501,6 +718,10 @@ class MainWindow(wx.Frame):
     def player_status(self, text):
         self.status_bar.SetStatusText(text, 2)
 
+    def on_media_engine_restart(self, reason):
+        """ Called from the engine reader thread, the players got an error event before """
+        wx.CallAfter(self.status, reason)
+
     def set_player_status(self, text):  # For lambdas
         self.status_bar.SetStatusText(text, 2)
 
@@ -518,11 +739,53 @@ class MainWindow(wx.Frame):
     # -------------------------------------------------- Actions --------------------------------------------------
 
     def on_close(self, e=None):
+        if self.journal:
+            self.journal.stop()
+        self.remote_server_switch(False)
+        self.osc_switch(False)
+        self.timecode_output_switch(False)
+        self.replication_timer.Stop()
+        if self.replication_primary:
+            self.replication_primary.stop()
+        if self.standby:
+            self.standby.stop()
+        if self.primary_watch:
+            self.primary_watch.stop()
+        self.cues.stop()
+        self.cue_runner.stop()
+        self.media_level.stop()
+        self.timeline_timer.Stop()
+        if self.timeline:
+            self.timeline.stop()
+        self.mirror.stop()
+        if self.artnet_sender:
+            self.artnet_sender.stop()
+        if self.cue_osc_sock:
+            self.cue_osc_sock.close()
+        if self.stall_watchdog:
+            self.stall_watchdog.stop()
+        if self.stalls_win:
+            self.stalls_win.Destroy()
+        if self.input_recorder:
+            self.input_recorder.close()
+        self.bg_player.close_index()
+        if self.thumbnails:
+            self.thumbnails.stop()
+        if self.waveforms:
+            self.waveforms.stop()
+        if self.c2_search:
+            self.c2_search.close()
+        if self.staging:
+            self.staging.stop()
+        if self.zad_pack:
+            self.zad_pack.close()
         self.destroy_proj_win()
         self.on_text_win_close()
         self.on_timecode_win_close()
         self.player.stop()
         self.vlc_instance.release()
+        if self.media_engine:
+            self.media_engine.close()
         if e:
             e.Skip()
         else:
@@ -554,7 +817,6 @@ class MainWindow(wx.Frame):
                     self.on_close()
 
     def on_proj_win_close(self, e):
-        self.proj_win.countdown_panel.timer.Stop()
         self.proj_win.Destroy()
         self.proj_win = None
 
@@ -566,7 +828,13 @@ class MainWindow(wx.Frame):
     def ensure_proj_win(self, e=None):
         no_window = not self.proj_win
         if no_window:
-            self.proj_win = ProjectorWindow(self, self.config[Config.PROJECTOR_SCREEN])
+            outputs = [{'screen': self.config[Config.PROJECTOR_SCREEN],
+                        'scaling': self.config[Config.PROJECTOR_SCALING]}] + list(self.config[Config.PROJECTOR_OUTPUTS])
+            if len(outputs) > 1 and self.media_engine:
+                self.logger.log("[Media Engine] Video goes to the main projector output only")
+            elif len(outputs) > 1 and not self.video_tap:
+                self.video_tap = VideoFrameTap(self.player)  # One decode drawn by all outputs
+            self.proj_win = ProjectorGroup(self, outputs, self.video_tap)
 
             self.vid_btn.Bind(wx.EVT_TOGGLEBUTTON, self.switch_to_vid)
             self.zad_btn.Bind(wx.EVT_TOGGLEBUTTON, self.show_zad)
@@ -615,6 +883,8 @@ class MainWindow(wx.Frame):
         self.proj_win.switch_to_video()
 
     def set_vlc_video_panel(self):
+        if self.video_tap:  # VLC renders into memory
+            return True
         handle = self.proj_win.video_panel.GetHandle()
         if not handle:
             return False
@@ -646,7 +916,8 @@ class MainWindow(wx.Frame):
                 file_path = [f[1] for f in self.data[num]['files'].items() if f[0] in FileTypes.img_extensions][0]
                 if any([file_path.endswith(e) for e in FileTypes.video_extensions]):
                     self.switch_to_vid()
-                    self.player.set_media(self.vlc_instance.media_new(file_path))
+                    self.player.set_media(self.vlc_instance.media_new(self.staged(file_path),
+                                                                      *self.media_options('zad')))
                     while not self.set_vlc_video_panel():
                         pass
                     self.player.audio_set_mute(False)
@@ -673,8 +944,7 @@ class MainWindow(wx.Frame):
             return
         if self.config[Config.BG_ZAD_PATH] and not no_show:
             self.switch_to_zad()
-            self.proj_win.load_zad(path.make_abs(self.config[Config.BG_ZAD_PATH],
-                                                 path.fest_file), True)
+            self.proj_win.load_zad(path.make_abs(self.config[Config.BG_ZAD_PATH], path.fest_file), True)
             self.image_status("Background")
         else:
             self.switch_to_blackout()
@@ -686,16 +956,365 @@ class MainWindow(wx.Frame):
         self.clear_zad()
 
     def emergency_stop(self, e=None):
+        self.cue_runner.disarm()
         self.clear_zad()
         self.stop_async(fade_out=False)
 
-        bg_fade_state = self.bg_player.fade_in_out
-        self.bg_player.fade_in_out = False
-        self.background_set_pause(paused=True)
-        self.bg_player.fade_in_out = bg_fade_state
+        self.cues.preempt()  # Fades and track switches in flight end now, whatever they were doing
+        self.background_set_pause(paused=True, fade=False)
 
         self.status("EMERGENCY STOP !!!")
 
+    # -------------------------------------------------- Remote Control --------------------------------------------------
+
+    REMOTE_ACTIONS = ['show_zad', 'play_async', 'stop_async', 'end_show', 'emergency_stop', 'clear_zad',
+                      'play_pause_bg', 'select']
+
+    def remote_action(self, action, arg=None):
+        """ Runs on the GUI thread, the same as the Fire menu items """
+        if action == 'select':
+            if arg is not None and str(arg).strip():
+                self.select_num(str(arg).strip())
+        elif action == 'play_pause_bg':
+            self.play_pause_bg_end_show()
+        else:
+            getattr(self, action)()
+
+    def select_num(self, num):
+        num_col = self.grid_cols.index(Columns.NUM)
+        for row in range(self.grid.GetNumberRows()):
+            cell = self.grid.GetCellValue(row, num_col)
+            if cell == num or cell.isdigit() and num.isdigit() and int(cell) == int(num):  # 5 selects 005
+                self.grid.SetGridCursor(row, 0)
+                self.grid.SelectRow(row)
+                self.grid_align_viewpoint()
+                return True
+        self.status(_("№%s not found") % num)
+        return False
+
+    # --- Input Trace ---
+
+    def record_input(self, action, arg=None):
+        if self.input_recorder:
+            self.input_recorder.record(action, arg)
+
+    def recorded(self, action, handler):
+        """ Menu / accelerator handler that records the input first """
+        def on_menu(e):
+            self.record_input(action)
+            handler(e)
+        return on_menu
+
+    def replay_input(self, action, arg=None):
+        """ A recorded input, the way the operator gave it. Returns False if it can not be replayed. """
+        if action == 'select':
+            return self.select_num(arg)
+        elif action == 'search':
+            self.enter_search()
+            self.search_box.SetValue(arg)  # EVT_TEXT searches
+        elif action == 'quit_search':
+            self.quit_search()
+        elif action == 'edit':
+            if not self.select_num(arg['num']):
+                return False
+            row, col = self.grid.GetGridCursorRow(), self.grid_cols.index(arg['col'])
+            self.grid.SetCellValue(row, col, arg['value'])
+            self.on_grid_cell_changed(wx.grid.GridEvent(self.grid.GetId(), wx.grid.wxEVT_GRID_CELL_CHANGED,
+                                                        self.grid, row, col))
+        elif action == 'no_show':
+            self.clear_zad(None, True)
+        elif action == 'bg_selected':
+            self.background_play(from_grid=True)
+        elif action == 'bg_next':
+            self.background_play()  # Without an event it plays the next track, as Shift+F4
+        elif action in {'emergency_stop', 'show_zad', 'clear_zad', 'play_async', 'stop_async', 'end_show',
+                        'play_pause_bg_end_show'}:
+            getattr(self, action)()
+        else:
+            return False
+        return True
+
+    def remote_state(self):
+        row = self.grid.GetGridCursorRow()
+        length, time_ms = self.player.get_length(), self.player.get_time()
+        bg_track = self.bg_player.playlist[self.bg_player.current_track_i]['title'] \
+            if self.bg_player.playlist and self.bg_player.current_track_i >= 0 else None
+        return {'selected': self.get_num(row) if self.grid_cols and row >= 0 else None,
+                'item': self.num_in_player,
+                'player': self.player_state_parse(self.player.get_state()),
+                'time': time_ms // 1000 if self.is_playing else None,
+                'remaining': (length - time_ms) // 1000 if self.is_playing else None,
+                'zad': self.status_bar.GetStatusText(1),
+                'bg_track': bg_track,
+                'bg_player': self.player_state_parse(self.bg_player.player.get_state())}
+
+    def publish_remote_state(self, e=None):
+        state = self.remote_state()
+        if self.remote_server:
+            self.remote_server.publish(state)
+        if self.osc_listener:
+            self.osc_listener.publish({'item': state['item'], 'player': state['player'],
+                                       'selected': state['selected']})
+
+    def update_state_publish_timer(self):
+        if self.remote_server or self.osc_listener:
+            if not self.state_publish_timer.IsRunning():
+                self.state_publish_timer.Start(200)
+        else:
+            self.state_publish_timer.Stop()
+
+    def remote_server_switch(self, enable):
+        if enable and not self.remote_server:
+            address = self.config[Config.REMOTE_CONTROL_ADDRESS] or "127.0.0.1:8765"
+            host, port = address.rsplit(':', 1)
+            server = RemoteControlServer(host, int(port),
+                                         lambda action, arg: wx.CallAfter(self.remote_action, action, arg),
+                                         self.REMOTE_ACTIONS, self.config[Config.REMOTE_CONTROL_TOKEN], self.logger,
+                                         arg_actions=['select'])
+            try:
+                server.start()
+            except OSError as e:
+                self.logger.log("[Remote] Can't listen on %s: %s" % (address, e))
+                self.status(_("Remote control failed, watch the log"))
+                enable = False
+            else:
+                self.remote_server = server
+                self.status(_("Remote control on http://%s:%d") % (host, server.port))
+        elif not enable and self.remote_server:
+            self.remote_server.stop()
+            self.remote_server = None
+        self.remote_server_item.Check(enable)
+        self.update_state_publish_timer()
+
+    OSC_ADDRESSES = {b'/fest/go': 'play_async',
+                     b'/fest/zad': 'show_zad',
+                     b'/fest/stop': 'stop_async',
+                     b'/fest/end': 'end_show',
+                     b'/fest/panic': 'emergency_stop',
+                     b'/fest/clear': 'clear_zad',
+                     b'/fest/bg/toggle': 'play_pause_bg',
+                     b'/fest/select': 'select'}
+
+    def osc_action(self, action, address, args, received_ns):
+        arg = args[0] if args else None
+        if action == 'select' and isinstance(arg, float):  # Faders and most controllers send floats only
+            arg = int(arg)
+        self.remote_action(action, arg)
+        if self.osc_listener:
+            self.osc_listener.executed(address, received_ns)
+
+    def osc_switch(self, enable):
+        if enable and not self.osc_listener:
+            address = self.config[Config.OSC_LISTEN_ADDRESS] or "127.0.0.1:53000"
+            handlers = {osc_address: lambda args, received_ns, a=action, addr=osc_address.decode():
+                        wx.CallAfter(self.osc_action, a, addr, args, received_ns)
+                        for osc_address, action in self.OSC_ADDRESSES.items()}
+            try:
+                listener = OscListener(address, handlers, self.config[Config.OSC_FEEDBACK_ADDRESS], self.logger)
+                listener.start()
+            except (OSError, ValueError) as e:
+                self.logger.log("[OSC] Can't listen on %s: %s" % (address, e))
+                self.status(_("OSC input failed, watch the log"))
+                enable = False
+            else:
+                self.osc_listener = listener
+                self.status(_("OSC input on %s:%d") % listener.listen_address)
+        elif not enable and self.osc_listener:
+            self.osc_listener.stop()
+            self.osc_listener = None
+        self.osc_item.Check(enable)
+        self.update_state_publish_timer()
+
+    def timecode_output_switch(self, enable):
+        if enable and not self.timecode_sender:
+            address = self.config[Config.TIMECODE_OUTPUT_ADDRESS] or "127.0.0.1:5005"
+            try:
+                sender = TimecodeSender(address, self.playback_clock, int(self.config[Config.TIMECODE_OUTPUT_FPS]),
+                                        self.config[Config.TIMECODE_OUTPUT_FORMAT], self.logger)
+                sender.set_item(self.num_in_player if self.is_playing else None)
+                sender.start()
+            except (OSError, ValueError) as e:
+                self.logger.log("[Timecode] Can't send to %s: %s" % (address, e))
+                self.status(_("Timecode output failed, watch the log"))
+                enable = False
+            else:
+                self.timecode_sender = sender
+                self.status(_("Timecode output to %s:%d") % sender.address)
+        elif not enable and self.timecode_sender:
+            self.timecode_sender.stop()
+            self.timecode_sender = None
+        self.timecode_item.Check(enable)
+
+    # --- Hot standby ---
+
+    def start_replication(self):
+        role, address = self.config[Config.REPLICATION_ROLE], self.config[Config.REPLICATION_ADDRESS]
+        if role == 'primary':
+            if not self.journal or not self.journal.running:
+                self.logger.log("[Replication] The primary streams the show journal, it needs a .fest file")
+                return
+            primary = ReplicationPrimary(address or "0.0.0.0:8766", self.journal, self.logger)
+            try:
+                primary.start()
+            except OSError as e:
+                self.logger.log("[Replication] Can't listen on %s: %s" % (address, e))
+                self.status(_("Replication failed, watch the log"))
+                return
+            self.replication_primary = primary
+            self.replication_timer.Start(250)
+        elif role == 'standby':
+            if not address:
+                self.logger.log("[Replication] No primary address for the standby")
+                return
+            self.standby = ReplicationStandby(address, lambda records: wx.CallAfter(self.replica_apply, records),
+                                              lambda playback: wx.CallAfter(self.replica_arm, playback),
+                                              lambda reason: wx.CallAfter(self.on_primary_lost, reason),
+                                              self.logger, float(self.config[Config.REPLICATION_TIMEOUT_S]))
+            self.standby.start()
+            self.take_over_item.Enable(True)
+            self.status(_("STANDBY: following the primary %s") % address)
+
+    def publish_playback(self, e=None):
+        bg_player = self.bg_player.player
+        loaded = self.player.get_state() in {vlc.State.Playing, vlc.State.Paused}
+        self.replication_primary.set_playback(self.num_in_player if loaded else '', self.player.get_time(),
+                                              self.player.get_state() == vlc.State.Playing,
+                                              self.bg_rel_path(self.bg_player.current_track_path),
+                                              bg_player.get_time(), bg_player.get_state() == vlc.State.Playing)
+
+    def replica_apply(self, records):
+        """ The journal records of the primary, applied to the grid. The standby has no journal running, it starts
+            recording when it takes over. """
+        if not self.standby or not self.grid_cols:
+            return
+        for record in records:
+            op = record['o']
+            if op == 'snap':
+                state = record['state']
+                if state.cols != self.state_cols:
+                    self.logger.log("[Replication] The primary has other columns (%s), not followed" %
+                                    ", ".join(state.cols))
+                    self.replica_stale = True
+                    continue
+                if self.in_search:
+                    self.replica_stale = True
+                    continue
+                self.replica_stale = False
+                self.grid_apply_state(state)
+                self.apply_bg_state(state.bg)
+                continue
+            if self.replica_stale or self.in_search:
+                self.replica_stale = True
+                continue
+            row = record.get('r')
+            if op in ('row', 'ins', 'del'):
+                self.timeline_invalidate()
+            if op in ('row', 'ins'):
+                if op == 'ins':
+                    self.grid.InsertRows(row, 1)
+                for col, value in zip(self.state_col_indexes(), record['v']):
+                    self.grid.SetCellValue(row, col, value)
+                for col in range(self.grid.GetNumberCols()):
+                    self.grid.SetCellBackgroundColour(row, col, wx.Colour(*record['c']))
+                    self.set_cell_readonly(row, col, self.row_type(row) == 'dup')
+                self.refresh_staging_row(row)
+            elif op == 'del':
+                self.grid.DeleteRows(row)
+            elif op == 'cur' and 0 <= row < self.grid.GetNumberRows():
+                self.grid.SetGridCursor(row, 0)
+                self.grid.SelectRow(row)
+                self.grid_align_viewpoint()
+            elif op == 'bg':
+                self.apply_bg_state({'track': record['i'], 'marks': record['m']})
+        self.grid.ForceRefresh()
+
+    def replica_arm(self, playback):
+        """ The item and the bg track of the primary are read ahead, so a failover starts them from the cache """
+        paths = [self.bg_local_path(playback.bg_path)] if playback.bg_path else []
+        if playback.num in self.data:
+            paths += [self.staged(file_path) for ext, file_path in self.data[playback.num]['files'].items()
+                      if ext != 'm3u']
+        if paths:
+            self.ensure_proj_win()
+            threading.Thread(target=self.read_ahead, args=(paths,), name="StandbyReadAhead", daemon=True).start()
+
+    def bg_rel_path(self, file_path):
+        """ The other machine has the bg library somewhere else: the tracks are named relative to the folder """
+        if not file_path or not self.bg_tracks_dir:
+            return file_path or ''
+        try:
+            rel_path = os.path.relpath(file_path, self.bg_tracks_dir)
+        except ValueError:  # Another drive
+            return file_path
+        return file_path if rel_path.startswith(os.pardir) else rel_path.replace(os.sep, '/')
+
+    def bg_local_path(self, rel_path):
+        if not self.bg_tracks_dir or os.path.isabs(rel_path):
+            return rel_path
+        return os.path.join(self.bg_tracks_dir, *rel_path.split('/'))
+
+    @staticmethod
+    def read_ahead(paths, limit=64 * 1024 * 1024):
+        for file_path in paths:
+            try:
+                with open(file_path, 'rb', buffering=0) as f:
+                    while f.tell() < limit and f.read(1024 * 1024):
+                        pass
+            except OSError:
+                pass
+
+    def on_primary_lost(self, reason):
+        if not self.standby:
+            return
+        if self.config[Config.REPLICATION_AUTO_FAILOVER]:
+            self.take_over(reason=reason)
+        else:
+            self.status(_("PRIMARY LOST (%s)! Main > Take Over From Primary") % reason)
+            wx.Bell()
+
+    def take_over(self, e=None, reason="manual"):
+        """ Becomes the primary: the item and the bg track go on from where the primary was """
+        if not self.standby:
+            return
+        num, pos_ms, playing, bg_path, bg_pos_ms, bg_playing = self.standby.position()
+        self.standby.stop()
+        self.standby = None
+        self.take_over_item.Enable(False)
+        self.primary_watch = PrimaryWatch(self.config[Config.REPLICATION_ADDRESS],
+                                          lambda: wx.CallAfter(self.on_old_primary_back), self.logger,
+                                          float(self.config[Config.REPLICATION_TIMEOUT_S]))
+        self.primary_watch.start()
+        if self.journal:  # From here on this machine records the show
+            self.journal.start(self.grid_show_state())
+            self.journal_bg()
+        self.logger.log("[Replication] Taking over (%s): item %s at %.1fs%s, bg %s at %.1fs%s" %
+                        (reason, num or '-', pos_ms / 1000, '' if playing else ' (stopped)', bg_path or '-',
+                         bg_pos_ms / 1000, '' if bg_playing else ' (stopped)'))
+        if bg_playing and self.bg_player.playlist:
+            paths = [self.bg_rel_path(track['path']) for track in self.bg_player.playlist]
+            if bg_path in paths:
+                self.bg_player.current_track_i = paths.index(bg_path)
+                self.cues.submit('bg', cue_scheduler.GO, 'take over', self.bg_player.play_sync, bg_pos_ms)
+                self.bg_player_timer_start(self.bg_player.timer_update_ms)
+            else:
+                self.logger.log("[Replication] The bg track %s is not in our playlist, not resumed" % bg_path)
+        if playing and num in self.data:
+            num_col = self.grid_cols.index(Columns.NUM)
+            rows = [row for row in range(self.grid.GetNumberRows()) if self.grid.GetCellValue(row, num_col) == num]
+            if rows:
+                self.grid.SetGridCursor(rows[0], 0)
+                self.grid.SelectRow(rows[0])
+                self.play_async(start_ms=pos_ms)
+        self.status(_("TOOK OVER from the primary (%s)") % reason)
+
+    def on_old_primary_back(self):
+        """ Both machines may be playing the show now: nothing can stop the other one from here """
+        msg = _("THE OLD PRIMARY %s IS BACK! Stop it or cut its outputs, two machines run the show") % \
+            self.config[Config.REPLICATION_ADDRESS]
+        self.status(msg)
+        wx.Bell()
+        wx.MessageBox(msg, _("Replication"), wx.OK | wx.ICON_WARNING, self)
+
     # -------------------------------------------------- Data --------------------------------------------------
 
     def load_files(self, e=None):
@@ -730,7 +1349,11 @@ class MainWindow(wx.Frame):
 
         # Making columns from filename_re groups
         self.grid_cols = [r if r != 'num' else Columns.NUM
-                          for r in group_names if r[0] != '_'] + [Columns.FILES, Columns.NOTES]
+                          for r in group_names if r[0] != '_'] + \
+                         ([Columns.THUMB] if self.config[Config.GRID_THUMBNAILS] else []) + \
+                         ([Columns.STAGING] if self.config[Config.STAGING_DIR] else []) + \
+                         ([Columns.START, Columns.SLIP] if self.config[Config.TIMELINE_MODE] else []) + \
+                         [Columns.FILES, Columns.NOTES]
 
         all_files = [[os.path.join(d, path) for path in os.listdir(d)] for d in self.files_dirs]
         all_files = [item for sublist in all_files for item in sublist]  # Flatten
@@ -785,10 +1408,19 @@ class MainWindow(wx.Frame):
                 self.set_cell_readonly(i, j)
             i += 1
 
+        self.start_thumbnails()
+        self.start_waveforms()
+        self.start_c2_search()
+        self.start_staging()
+        if self.fest_file_path and not self.zad_pack:
+            self.zad_pack = ZadPack(os.path.splitext(self.fest_file_path)[0] + '.zadpack', self.logger)
+        self.load_timed_cues()
+        self.start_timeline()
         self.grid.AutoSizeColumns()
         self.status("Loaded %d items" % i)
 
         self.add_countdown_row(False, 0, self.config[Config.COUNTDOWN_OPENING_TEXT])
+        self.check_zad_images()
 
         self.SetLabel("%s: %s" % (Strings.APP_NAME, self.fest_file_path))
 
@@ -796,11 +1428,44 @@ class MainWindow(wx.Frame):
 
         self.grid_autosize_notes_col()
 
+    def check_zad_images(self):
+        """ Warns ahead of the show about backdrops too big to decode quickly or within the memory budget """
+        budget = self.config[Config.IMAGE_MEMORY_BUDGET] * 1024 * 1024
+        screens = [wx.Display(i).GetGeometry().GetSize() for i in range(wx.Display.GetCount())]
+        target = max(s[0] for s in screens), max(s[1] for s in screens)
+        images = [(num, file_path) for num, item in sorted(self.data.items())
+                  for ext, file_path in item['files'].items() if ext in FileTypes.img_extensions]
+        if self.config[Config.BG_ZAD_PATH]:
+            images.append((_('background'), path.make_abs(self.config[Config.BG_ZAD_PATH], path.fest_file)))
+        for num, file_path in images:
+            plan = decode_plan(file_path, target, jpeg_draft=PilImage is not None)
+            if not plan:
+                continue
+            fmt, w, h, size = plan
+            if size > budget:
+                self.logger.log(_("[WARNING] ZAD %s (%s) needs %dMB to decode, over the %dMB budget: it will not "
+                                  "be shown") % (num, file_path, size >> 20, budget >> 20))
+            elif w * h > 4 * target[0] * target[1]:
+                self.logger.log(_("[WARNING] ZAD %s (%s) is decoded at %dx%d for %dx%d screens, it will be slow "
+                                  "to show") % (num, file_path, w, h, target[0], target[1]))
+
     # --- Duplication from notes ---
 
     def on_grid_cell_changed(self, e):
+        self.record_input('edit', {'num': self.get_num(e.Row), 'col': self.grid.GetColLabelValue(e.Col),
+                                   'value': self.grid.GetCellValue(e.Row, e.Col)})
         self.grid.Unbind(wx.grid.EVT_GRID_CELL_CHANGED)
 
+        self.journal_row(e.Row)
+        self.timeline_invalidate()
+
+        if self.grid.GetColLabelValue(e.Col) == Columns.START:
+            try:
+                parse_start(self.grid.GetCellValue(e.Row, e.Col))
+            except ValueError as ex:
+                self.status(str(ex))
+            self.timeline_rearm()
+
         if self.grid.GetColLabelValue(e.Col) == Columns.NOTES:
             note = self.grid.GetCellValue(e.Row, e.Col)
             match = re.search('>(\d{3}(\w)?)([^\w].*)?', note)  # ">234" or ">305a" or ">152a maybe"
@@ -823,14 +1488,18 @@ class MainWindow(wx.Frame):
                         i += 1
                     new_row = bisect.bisect(nums, row[Columns.NUM]['val'])  # determining row insertion point
                     self.grid.InsertRows(new_row, 1)
+                    inserted = True
                 else:
                     new_row = nums.index(new_num)  # Updating
+                    inserted = False
 
                 for cell in row.values():
                     self.grid.SetCellValue(new_row, cell['col'], cell['val'])
                     self.grid.SetCellBackgroundColour(new_row, cell['col'], Colors.DUP_ROW)
                     self.set_cell_readonly(new_row, cell['col'], True)
 
+                self.journal_row(new_row, inserted)
+
         self.grid.Bind(wx.grid.EVT_GRID_CELL_CHANGED, self.on_grid_cell_changed)
 
     def row_type(self, row):
@@ -857,10 +1526,14 @@ class MainWindow(wx.Frame):
         row = self.grid.GetGridCursorRow()
         if self.row_type(row) != 'track':  # Extra check, this method is very dangerous.
             self.grid.DeleteRows(row)
+            self.timeline_invalidate()
+            if self.journal and not self.in_search:
+                self.journal.delete_row(row)
 
     def set_cell_readonly(self, row, col, force_readonly=False):
         editable = self.row_type(row) == 'countdown' and col == self.grid_cols.index(Columns.NAME) or \
-                   col == self.grid_cols.index(Columns.NOTES)
+                   col == self.grid_cols.index(Columns.NOTES) or \
+                   Columns.START in self.grid_cols and col == self.grid_cols.index(Columns.START)
         self.grid.SetReadOnly(row, col, not editable or force_readonly)
 
     # --- Countdown timer ---
@@ -871,6 +1544,7 @@ class MainWindow(wx.Frame):
         row_pos = base_row + 1 if below_current_row else base_row
 
         self.grid.InsertRows(row_pos, 1)
+        self.timeline_invalidate()
         self.grid.SetCellValue(row_pos, self.grid_cols.index(Columns.NUM), Strings.COUNTDOWN_ROW_TEXT_SHORT)
         self.grid.SetCellValue(row_pos, self.grid_cols.index(Columns.FILES), Strings.COUNTDOWN_ROW_TEXT_FULL)
         self.grid.SetCellValue(row_pos, self.grid_cols.index(Columns.NAME), message)
@@ -880,6 +1554,7 @@ class MainWindow(wx.Frame):
             self.grid.SetCellBackgroundColour(row_pos, col, Colors.COUNTDOWN_ROW)
             self.set_cell_readonly(row_pos, col)
 
+        self.journal_row(row_pos, True)
         self.grid.SelectRow(row_pos)
 
     # --- Replacer ---
@@ -893,10 +1568,772 @@ class MainWindow(wx.Frame):
                                 "File\n'%s'\n\n"
                                 "copied in place of\n'%s'") % (dlg.bkp_path, dlg.tgt_file, dlg.src_file))
 
+    # --- Thumbnails ---
+
+    def start_thumbnails(self):
+        """ Nothing is rendered here: the grid asks for the thumbnails of the rows it paints """
+        if Columns.THUMB not in self.grid_cols or not self.fest_file_path:
+            return
+        if not self.thumbnails:
+            self.thumbnails = ThumbnailCache(os.path.splitext(self.fest_file_path)[0] + '.thumbs',
+                                             ThumbnailRenderer(), self.on_thumbnail_ready, logger=self.logger)
+        self.thumbnail_sources = {num: self.thumbnail_source(num) for num in self.data}
+        attr = wx.grid.GridCellAttr()
+        attr.SetRenderer(ThumbnailCellRenderer(self.row_thumbnail))
+        attr.SetReadOnly(True)
+        self.grid.SetColAttr(self.grid_cols.index(Columns.THUMB), attr)
+        self.grid.SetDefaultRowSize(THUMB_SIZE[1] + 2, True)
+
+    def thumbnail_source(self, num):
+        """ A still ZAD, then a video ZAD, then the video of the item """
+        files = self.data[num]['files'] if num in self.data else {}
+        for exts in (FileTypes.img_extensions - {'zad.mp4'}, {'zad.mp4'}, FileTypes.video_extensions - {'m3u'}):
+            for ext, file_path in sorted(files.items()):
+                if ext in exts:
+                    return file_path
+        return None
+
+    def row_thumbnail(self, row, size=THUMB_SIZE):
+        src = self.thumbnail_sources.get(self.get_num(row)) if self.thumbnails else None
+        thumb = self.thumbnails.request(src, size) if src else None
+        if not thumb:
+            return None
+        if thumb not in self.thumbnail_bitmaps:
+            self.thumbnail_bitmaps[thumb] = wx.Bitmap(thumb, wx.BITMAP_TYPE_PNG)
+            while len(self.thumbnail_bitmaps) > 512:
+                self.thumbnail_bitmaps.popitem(last=False)
+        self.thumbnail_bitmaps.move_to_end(thumb)
+        return self.thumbnail_bitmaps[thumb]
+
+    def on_thumbnail_ready(self, src):
+        """ Called from the thumbnail workers, repaints are coalesced """
+        if not self.thumbnail_refresh_pending:
+            self.thumbnail_refresh_pending = True
+            wx.CallAfter(wx.CallLater, 150, self.refresh_thumbnails)
+
+    def refresh_thumbnails(self):
+        self.thumbnail_refresh_pending = False
+        self.grid.ForceRefresh()
+        self.update_preview()
+
+    # --- Waveforms ---
+
+    def start_waveforms(self):
+        """ The peaks of every item are computed in the background, to be ready when the item is played """
+        if not self.fest_file_path or not WaveformCache.available():
+            return
+        if not self.waveforms:
+            self.waveforms = WaveformCache(os.path.splitext(self.fest_file_path)[0] + '.waveforms',
+                                           self.on_waveform_ready, logger=self.logger)
+        for num in self.data:
+            try:
+                file_path, sound_only, is_stream = self.item_media(num)
+            except IndexError:
+                continue
+            if not is_stream:
+                self.waveforms.request(file_path)
+
+    def waveform_peaks(self, src):
+        """ Memory-mapped peaks of the file, None (and computed in the background) if not ready """
+        return self.waveforms.peaks(src) if self.waveforms and src else None
+
+    def main_levels(self):
+        """ For the media level: (peaks, position, gain) of the item playing, None when silent """
+        if self.time_bar.peaks is None or self.player.get_state() != vlc.State.Playing:
+            return None
+        self.playback_clock.sample()
+        return self.time_bar.peaks, self.playback_clock.now_ms(), self.player.audio_get_volume() / 100.0
+
+    def bg_levels(self):
+        player = self.bg_player.player
+        src = self.bg_player.current_track_path
+        if not src or not self.waveforms or player.get_state() != vlc.State.Playing:
+            return None
+        if src != self.bg_level_src or self.bg_level_peaks is None:  # Until they are computed
+            self.bg_level_src, self.bg_level_peaks = src, self.waveforms.peaks(src, compute=False)
+        return self.bg_level_peaks, player.get_time(), player.audio_get_volume() / 100.0
+
+    def on_waveform_ready(self, src):
+        """ Called from a pool thread """
+        def show():
+            if src == self.time_bar_src:
+                self.time_bar.set_peaks(self.waveforms.peaks(src, compute=False))
+            if self.bg_player.window and src == self.bg_player.current_track_path:
+                self.bg_player.window.waveform.set_peaks(self.waveforms.peaks(src, compute=False))
+            if None in self.item_lengths.values():  # Read again with the next refresh of the slips
+                self.item_lengths = {num: length for num, length in self.item_lengths.items() if length is not None}
+                self.timeline_invalidate()
+
+        wx.CallAfter(show)
+
+    # --- Timeline ---
+
+    def start_timeline(self):
+        if not self.config[Config.TIMELINE_MODE] or self.timeline:
+            return
+        self.timeline = TimelineScheduler(lambda key, action: wx.CallAfter(self.timeline_fire, key, action),
+                                          self.logger)
+        self.timeline.start()
+        self.timeline_rearm()
+        self.timeline_timer.Start(1000)
+
+    def timeline_invalidate(self):
+        """ The grid rows changed: their keys, starts and lengths are read again by the next refresh """
+        self.timeline_rows_cache = None
+        self.slip_texts = {}
+
+    def timeline_rows(self):
+        """ [(row, key, (seconds of the day, action) or None, length s or None)], invalid start times count as none.
+            Read from the grid once after it changed. The key identifies the row while rows are inserted around
+            it: the number, the time of a countdown or the item it follows. """
+        if self.timeline_rows_cache is not None:
+            return self.timeline_rows_cache
+        num_col, start_col = self.grid_cols.index(Columns.NUM), self.grid_cols.index(Columns.START)
+        rows, seen, after = [], collections.Counter(), "start"
+        for row in range(self.grid.GetNumberRows()):
+            text = self.grid.GetCellValue(row, start_col)
+            try:
+                start = parse_start(text)
+            except ValueError:
+                start = None
+            num = self.grid.GetCellValue(row, num_col)
+            if self.row_type(row) != 'countdown':
+                key = after = num
+            elif text.strip():
+                key = "%s %s" % (num, text.strip())
+            else:
+                key = "%s after %s" % (num, after)
+                seen[key] += 1
+                if seen[key] > 1:
+                    key += " (%d)" % seen[key]
+            rows.append((row, key, start, self.row_length(row)))
+        self.timeline_rows_cache = rows
+        return rows
+
+    def timeline_rearm(self):
+        if not self.timeline or self.in_search:
+            return
+        now = time.time()
+        self.timeline.set_entries([(key, occurrence(start[0], now),
+                                    start[1] or ('countdown' if self.row_type(row) == 'countdown' else 'zad'))
+                                   for row, key, start, length in self.timeline_rows() if start])
+        self.refresh_slips()
+
+    def timeline_fire(self, key, action):
+        self.logger.log("[Timeline] %s: %s" % (key, action))
+        if action == 'bgstop':
+            self.background_set_pause(paused=True)
+            return
+        if self.is_playing:  # Never cut an act
+            self.status(_("Timeline: %s is due, an item is playing") % key)
+            return
+        rows = [] if self.in_search else [row for row, row_key, start, length in self.timeline_rows()
+                                          if row_key == key]
+        if not rows:
+            self.status(_("Timeline: %s is due, not in the grid") % key)
+            return
+        self.grid.SetGridCursor(rows[0], 0)
+        self.grid.SelectRow(rows[0])
+        self.grid_align_viewpoint()
+        if action == 'zad':
+            self.show_zad()
+        else:  # 'countdown' or 'play', the countdown rows are launched by play_async
+            self.play_async()
+
+    def timeline_mark_started(self, row):
+        if not self.timeline or self.in_search:
+            return
+        self.timeline_last = self.timeline_rows()[row][1]
+        self.timeline_started[self.timeline_last] = time.time()
+        self.refresh_slips()
+
+    def item_length(self, num):
+        """ Seconds, from the player or the waveform peaks, None while unknown (until a waveform is ready) """
+        if num not in self.item_lengths and self.waveforms and num in self.data:
+            try:
+                peaks = self.waveforms.peaks(self.item_media(num)[0], compute=False)
+            except IndexError:
+                peaks = None
+            self.item_lengths[num] = len(peaks) * BUCKET_MS / 1000.0 if peaks is not None else None
+        return self.item_lengths.get(num)
+
+    def row_length(self, row):
+        if self.row_type(row) != 'countdown':
+            return self.item_length(self.get_num(row))
+        match = re.match(r'^\s*(\d+)m\s*$', self.grid.GetCellValue(row, self.grid_cols.index(Columns.NOTES)))
+        return int(match.group(1)) * 60 if match else None
+
+    def refresh_slips(self, e=None):
+        """ Real slip of the rows started, projected slip of the next ones. Only changed cells are set.
+            Every second (`e` from the timer) only the rows from the one started last are projected again, and
+            only once it has run past its end: until then the projection does not depend on the time. """
+        if not self.timeline or self.in_search:
+            return
+        if self.timeline_rows_cache is None:  # The grid changed, the schedule follows it
+            self.timeline_rearm()
+            return
+        now = time.time()
+        gap = self.config[Config.TIMELINE_GAP_S]
+        rows = self.timeline_rows()
+        progress = next((i for i, (row, key, start, length) in enumerate(rows) if key == self.timeline_last), -1)
+        first = 0
+        if e and progress >= 0:
+            started, length = self.timeline_started.get(self.timeline_last), rows[progress][3]
+            if started is not None and now < started + (length or 0) + gap:
+                return
+            first = progress
+        slips = project_slips([{'scheduled': occurrence(start[0], now) if start else None, 'duration': length,
+                                'started': self.timeline_started.get(key)}
+                               for row, key, start, length in rows[first:]], progress - first, now, gap)
+        slip_col = self.grid_cols.index(Columns.SLIP)
+        for (row, key, start, length), slip in zip(rows[first:], slips):
+            text = format_slip(slip) if slip is not None else ""
+            if self.slip_texts.get(row) != text:
+                self.slip_texts[row] = text
+                self.grid.SetCellValue(row, slip_col, text)
+
+    # --- Media staging ---
+
+    def start_staging(self):
+        """ The media are mirrored to the local staging folder in the background, in the order of the program """
+        if not self.config[Config.STAGING_DIR] or not self.fest_file_path:
+            return
+        if not self.staging:
+            try:
+                self.staging = MediaStaging(path.make_abs(self.config[Config.STAGING_DIR], path.fest_file),
+                                            self.on_staging_change, self.config[Config.STAGING_MAX_MB_S],
+                                            logger=self.logger)
+            except OSError as e:
+                self.logger.log("[Staging] Disabled: %s" % e)
+                return
+        sources = []
+        self.staging_rows, self.staging_files = {}, {}
+        for num, item in sorted(self.data.items()):
+            for ext, file_path in sorted(item['files'].items()):
+                if ext != 'm3u':  # The stream is not here anyway
+                    self.staging_rows[file_path] = num
+                    self.staging_files.setdefault(num, []).append(file_path)
+                    sources.append(file_path)
+        if self.config[Config.BG_ZAD_PATH]:
+            sources.append(path.make_abs(self.config[Config.BG_ZAD_PATH], path.fest_file))
+        self.staging.stage(sources)
+        self.refresh_staging()
+
+    def staged(self, file_path):
+        """ The path to open: the valid local copy or the original """
+        return self.staging.resolve(file_path) if self.staging else file_path
+
+    def on_staging_change(self, src):
+        """ Called from the staging thread, updates are coalesced """
+        if src in self.staging_rows and not self.staging_refresh_pending:
+            self.staging_refresh_pending = True
+            wx.CallAfter(wx.CallLater, 500, self.refresh_staging)
+
+    def staging_cell(self, num):
+        states = [self.staging.state(file_path) for file_path in self.staging_files.get(num, [])]
+        if not states:
+            return ""
+        if any(state == media_staging.FAILED for state, fraction in states):
+            return _("FAILED")
+        copying = [fraction for state, fraction in states if state == media_staging.COPYING]
+        if copying:
+            return "%d%%" % (min(copying) * 100)
+        if all(state == media_staging.STAGED for state, fraction in states):
+            return _("local")
+        return _("queued")
+
+    def refresh_staging(self):
+        self.staging_refresh_pending = False
+        if not self.staging or Columns.STAGING not in self.grid_cols:
+            return
+        cells = {num: self.staging_cell(num) for num in self.staging_files}  # Once per item, not per row
+        col = self.grid_cols.index(Columns.STAGING)
+        for row in range(self.grid.GetNumberRows()):
+            num = self.get_num(row)
+            if num in cells and self.grid.GetCellValue(row, col) != cells[num]:
+                self.grid.SetCellValue(row, col, cells[num])
+
+    def refresh_staging_row(self, row):
+        if self.staging and Columns.STAGING in self.grid_cols and self.get_num(row) in self.staging_files:
+            self.grid.SetCellValue(row, self.grid_cols.index(Columns.STAGING), self.staging_cell(self.get_num(row)))
+
+    def mirror_switch(self, enable):
+        self.mirror.Show(enable)
+        if enable:
+            self.mirror.start()
+        else:
+            self.mirror.stop()
+        self.Layout()
+
+    def preview_pane_switch(self, enable):
+        self.preview_pane.Show(enable)
+        self.Layout()
+        self.update_preview()
+
+    def update_preview(self, row=None):
+        if not self.preview_pane.IsShown() or not self.grid_cols:
+            return
+        row = self.grid.GetGridCursorRow() if row is None else row
+        if not 0 <= row < self.grid.GetNumberRows():
+            return
+        num = self.get_num(row)
+        name = self.data[num].get(Columns.NAME, '') if num in self.data else ''
+        self.preview_pane.set(self.row_thumbnail(row, PREVIEW_SIZE), "%s %s" % (num, name))
+
+    def refresh_item(self, num):
+        """ Re-reads the item's files from disk after they were changed in place """
+        files = self.data[num]['files']
+        for ext, file_path in list(files.items()):
+            if not os.path.isfile(file_path):
+                self.logger.log("[WARNING] File %s of №%s disappeared" % (file_path, num))
+                del files[ext]
+        if self.thumbnails:
+            for file_path in files.values():
+                self.thumbnails.forget(file_path)
+            self.thumbnail_sources[num] = self.thumbnail_source(num)
+        files_col, num_col = self.grid_cols.index(Columns.FILES), self.grid_cols.index(Columns.NUM)
+        for row in range(self.grid.GetNumberRows()):
+            if self.grid.GetCellValue(row, num_col) == num:
+                self.grid.SetCellValue(row, files_col, ", ".join(sorted(files.keys())))
+        self.status(_("Item №%s refreshed") % num)
+
+    # --- Show state journal ---
+
+    DERIVED_COLUMNS = (Columns.THUMB, Columns.STAGING, Columns.SLIP)  # Computed on this machine, not show state
+
+    @property
+    def state_cols(self):
+        """ The columns of the show state: what the operator entered ('start' times too), not the derived ones """
+        return [col for col in self.grid_cols if col not in self.DERIVED_COLUMNS]
+
+    def state_col_indexes(self):
+        return [i for i, col in enumerate(self.grid_cols) if col not in self.DERIVED_COLUMNS]
+
+    def grid_row_state(self, row):
+        color = self.grid.GetCellBackgroundColour(row, 0)
+        return [self.grid.GetCellValue(row, col) for col in self.state_col_indexes()], \
+               [color.Red(), color.Green(), color.Blue()]
+
+    def journal_row(self, row, inserted=False):
+        if not self.journal or self.in_search:  # Search results have their own row numbers
+            return
+        cols, color = self.grid_row_state(row)
+        if inserted:
+            self.journal.insert_row(row, cols, color)
+        else:
+            self.journal.set_row(row, cols, color)
+
+    def journal_cursor(self, row):
+        if self.journal and not self.in_search:
+            self.journal.set_cursor(row)
+
+    def journal_bg(self):
+        """ Can be called from the player threads """
+        if self.journal and self.bg_player.playlist:
+            self.journal.set_bg(self.bg_player.current_track_i,
+                                {t['path']: list(t['color']) for t in self.bg_player.playlist if t['color']})
+
+    def grid_track_nums(self, rows):
+        """ Of rows in the show state layout """
+        num_col, notes_col = self.state_cols.index(Columns.NUM), self.state_cols.index(Columns.NOTES)
+        return sorted(r[num_col] for r in rows
+                      if r[num_col] != Strings.COUNTDOWN_ROW_TEXT_SHORT and not r[notes_col].startswith('<'))
+
+    def grid_show_state(self):
+        rows = [self.grid_row_state(row) for row in range(self.grid.GetNumberRows())]
+        return ShowState(self.state_cols, [{'cols': cols, 'color': color} for cols, color in rows],
+                         self.grid.GetGridCursorRow())
+
+    def restore_show_state(self):
+        """ Restores the grid from the journal and starts recording """
+        if self.replay and self.initial_state and self.grid_cols:
+            state = ShowState.from_dict(self.initial_state)
+            if state.cols == self.state_cols:
+                self.grid_apply_state(state)
+                self.restored_state = state
+                self.restore_bg_state()
+                self.timeline_rearm()
+            else:
+                self.logger.log("[Replay] Columns changed since the recording, the show starts fresh")
+        if not self.journal or not self.grid_cols:
+            return
+        if self.config[Config.REPLICATION_ROLE] == 'standby':  # Follows the primary, journals once it took over
+            return
+        state = self.journal.load()
+        current_rows = [self.grid_row_state(row) for row in range(self.grid.GetNumberRows())]
+
+        if state and state.cols != self.state_cols:
+            self.logger.log("[Journal] Columns changed since the last session (%s), saved state ignored" %
+                            ", ".join(state.cols))
+            state = None
+        elif state and self.grid_track_nums(r['cols'] for r in state.rows) != \
+                self.grid_track_nums(cols for cols, color in current_rows):
+            self.logger.log("[Journal] Items changed since the last session, saved state ignored")
+            state = None
+
+        if state:
+            self.grid_apply_state(state)
+            self.restored_state = state
+            self.restore_bg_state()
+            self.timeline_rearm()
+
+            self.status(_("Show state restored"))
+        else:
+            state = self.grid_show_state()
+        if self.input_recorder:
+            self.input_recorder.record_state(state.to_dict())
+        self.journal.start(state)
+
+    def grid_apply_state(self, state):
+        """ The derived columns are computed again here """
+        default_bg = self.grid.GetDefaultCellBackgroundColour()
+        indexes = self.state_col_indexes()
+
+        def grid_row(values):
+            cols = [''] * len(self.grid_cols)
+            for i, value in zip(indexes, values):
+                cols[i] = value
+            return cols
+
+        self.grid_set_data([{'cols': grid_row(r['cols']), 'color': wx.Colour(*r['color'])} for r in state.rows],
+                           default_bg)
+        for row in range(self.grid.GetNumberRows()):
+            if self.row_type(row) == 'dup':
+                [self.set_cell_readonly(row, col, True) for col in range(self.grid.GetNumberCols())]
+        self.refresh_staging()
+        self.refresh_slips()
+        self.grid.ForceRefresh()
+
+        if 0 <= state.cursor < self.grid.GetNumberRows():
+            self.grid.SetGridCursor(state.cursor, 0)
+            self.grid.SelectRow(state.cursor)
+            wx.CallAfter(self.grid_align_viewpoint)
+
+    def restore_bg_state(self):
+        """ The background playlist is indexed asynchronously, so it is called again once it is listed """
+        if not self.restored_state or not self.bg_player.playlist_listed:
+            return
+        bg, self.restored_state = self.restored_state.bg, None
+        self.apply_bg_state(bg)
+
+    def apply_bg_state(self, bg):
+        if not self.bg_player.playlist:
+            return
+        marks = bg['marks']
+        for track in self.bg_player.playlist:
+            if track['path'] in marks:
+                track['color'] = tuple(marks[track['path']])
+        if 0 <= bg['track'] < len(self.bg_player.playlist):
+            self.bg_player.current_track_i = bg['track']
+        if self.bg_player.window:
+            self.bg_player.load_playlist_to_list()
+
+    def discard_show_state(self, e=None):
+        if not self.journal:
+            return
+        with wx.MessageDialog(self, _("Forget played/skipped marks, notes and added rows saved for this fest?\n"
+                                      "The current session will not be recorded anymore."),
+                              _("Discard Saved Show State"), wx.YES_NO | wx.ICON_WARNING) as dialog:
+            if dialog.ShowModal() == wx.ID_YES:
+                self.journal.discard()
+                self.status(_("Saved show state discarded"))
+
+    # --- Show pack ---
+
+    def build_zad_pack_async(self, e=None):
+        """ Every still ZAD rendered at the size of each projector output, the projector window must exist """
+        if not self.zad_pack or self.zad_pack_building:
+            return
+        if self.ensure_proj_win():  # Just created: the outputs get their final size first
+            wx.CallLater(1000, self.build_zad_pack_async)
+            return
+        outputs = [(tuple(w.images_panel.GetSize()), w.scaling) for w in self.proj_win.windows]
+        sources = sorted({file_path for item in self.data.values() for ext, file_path in item['files'].items()
+                          if ext in FileTypes.img_extensions - {'zad.mp4'}})
+        if self.config[Config.BG_ZAD_PATH]:
+            sources.append(path.make_abs(self.config[Config.BG_ZAD_PATH], path.fest_file))
+        jobs = list(dict.fromkeys((src, size, policy) for src in sources for size, policy in outputs))
+        self.zad_pack_building = True
+        self.status(_("Building the show pack..."))
+        threading.Thread(target=self.build_zad_pack_sync, args=(jobs,), daemon=True).start()
+
+    def build_zad_pack_sync(self, jobs):
+        budget = self.config[Config.IMAGE_MEMORY_BUDGET] * 1024 * 1024
+
+        def render(src, size, policy):  # wx.Image, not wx.Bitmap: fine off the GUI thread
+            image = load_image(self.staged(src), size, budget, self.logger)
+            if not image:
+                return None
+            image = scale_image(image, size, policy)
+            return image.GetWidth(), image.GetHeight(), image.GetData()
+
+        start = time.time()
+        try:
+            rendered = self.zad_pack.build(jobs, render)
+        except OSError as e:
+            self.logger.log("[ZAD Pack] Build failed: %s" % e)
+            msg = _("Show pack build failed, watch the log")
+        else:
+            msg = _("Show pack: %d frames, %d rendered in %.1fs") % (len(self.zad_pack.entries), rendered,
+                                                                     time.time() - start)
+            self.logger.log("[ZAD Pack] " + msg)
+
+        def ui_upd():
+            self.zad_pack_building = False
+            self.status(msg)
+
+        wx.CallAfter(ui_upd)
+
+    # --- Timed cues ---
+
+    def load_timed_cues(self, e=None):
+        if not self.fest_file_path:
+            return
+        try:
+            self.timed_cues = load_cue_tracks(os.path.splitext(self.fest_file_path)[0] + '.cues.json')
+        except (OSError, ValueError, KeyError) as ex:
+            self.logger.log("[Timed Cues] Can't load: %s" % ex)
+            self.status(_("Timed cues failed to load, watch the log"))
+            return
+        uses_dmx = any(cue.action == 'dmx' for cues in self.timed_cues.values() for cue in cues)
+        if uses_dmx and not self.artnet_sender:
+            if not self.config[Config.ARTNET_OUTPUT_ADDRESS]:
+                self.logger.log("[Timed Cues] DMX cues without an Art-Net output address")
+            else:
+                try:
+                    sender = ArtNetSender(self.config[Config.ARTNET_OUTPUT_ADDRESS],
+                                          int(self.config[Config.ARTNET_UNIVERSE]), self.logger)
+                    sender.start()
+                except (OSError, ValueError) as ex:
+                    self.logger.log("[Art-Net] Can't send to %s: %s" % (self.config[Config.ARTNET_OUTPUT_ADDRESS], ex))
+                else:
+                    self.artnet_sender = sender
+        if self.timed_cues:
+            self.logger.log("[Timed Cues] %d cues for %d items" % (sum(len(c) for c in self.timed_cues.values()),
+                                                                  len(self.timed_cues)))
+
+    def fire_timed_cue(self, item, cue):
+        """ Called from the cue runner thread at the cue time. The network cues go out from here, the projector
+            ones through the GUI loop. """
+        self.logger.log("[Timed Cues] %s%s: %s" % ('№', item, cue))
+        if cue.action == 'dmx':
+            scene = self.config[Config.DMX_SCENES].get(cue.arg)
+            if scene is None or not self.artnet_sender:
+                self.logger.log("[Timed Cues] No DMX scene '%s' or no Art-Net output" % cue.arg)
+                return
+            self.artnet_sender.set_scene(scene, float(cue.fields.get('fade', 0)) * 1000)
+        elif cue.action == 'osc':
+            address = cue.fields.get('to') or self.config[Config.OSC_FEEDBACK_ADDRESS]
+            if not address:
+                self.logger.log("[Timed Cues] No address to send OSC to")
+                return
+            if not self.cue_osc_sock:
+                self.cue_osc_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.cue_osc_sock.sendto(encode_message(cue.arg, *cue.fields.get('args', [])), parse_address(address))
+        elif cue.action == 'zad':
+            wx.CallAfter(self.show_cue_zad, cue.arg)
+        elif cue.action == 'blackout':
+            wx.CallAfter(lambda: self.clear_zad(no_show=True, status="Timed Cue Blackout"))
+
+    def show_cue_zad(self, arg):
+        """ The still ZAD of item `arg`, or an image file (relative to the .fest file) """
+        if arg in self.data:
+            images = [file_path for ext, file_path in sorted(self.data[arg]['files'].items())
+                      if ext in FileTypes.img_extensions - {'zad.mp4'}]
+            file_path = images[0] if images else None
+        else:
+            file_path = path.make_abs(arg, path.fest_file)
+        if not file_path or not os.path.isfile(file_path):
+            self.logger.log("[Timed Cues] No ZAD image for '%s'" % arg)
+            return
+
+        def load():
+            self.switch_to_zad()
+            self.proj_win.load_zad(file_path, True)
+            self.image_status("Timed Cue ZAD %s" % arg)
+
+        if self.ensure_proj_win():
+            wx.CallAfter(load)
+        else:
+            load()
+
+    # --- Audio output profiles ---
+
+    def vlc_args(self, section):
+        """ vlc.Instance() arguments of a player ('main' or 'bg') by the audio profile """
+        args = [audio_profiles.instance_args(self.audio_profile, section)]
+        if section == 'main':
+            args.append(self.config[Config.VLC_ARGUMENTS])
+        return " ".join(a for a in args if a)
+
+    def media_options(self, section):
+        return audio_profiles.media_options(self.audio_profile, section)
+
+    def set_audio_device(self, player, section):
+        device = audio_profiles.audio_device(self.audio_profile, section)
+        if device:
+            player.audio_output_device_set(None, device)
+
+    def calibrate_audio_async(self, e=None):
+        if self.is_playing or self.bg_player.player.get_state() in {vlc.State.Playing, vlc.State.Paused}:
+            self.status(_("Stop the players to calibrate the audio output"))
+            return
+        self.status(_("Calibrating audio output profiles..."))
+        threading.Thread(target=self.calibrate_audio_sync, daemon=True).start()
+
+    def calibrate_audio_sync(self, runs=5, timeout=5.0):
+        """ play()-to-Playing and play()-to-clock-running latencies of the main player for every profile,
+            measured with a silent file on the output of this machine """
+        tmp_dir = tempfile.mkdtemp()
+        tone = os.path.join(tmp_dir, 'calibration.wav')
+        audio_profiles.write_test_tone(tone)
+        results, lines = {}, []
+        try:
+            for name, profile in sorted(audio_profiles.all_profiles(self.config[Config.AUDIO_PROFILES]).items()):
+                try:
+                    to_playing, to_clock = self.calibrate_profile(profile, tone, runs, timeout)
+                except Exception as e:  # A broken profile must not end the calibration of the others
+                    results[name] = [None] * runs
+                    line = "%s: FAILED (%s)" % (name, e)
+                else:
+                    results[name] = to_clock
+                    ok = [(p, c) for p, c in zip(to_playing, to_clock) if c is not None]
+                    line = "%s: %s" % (name, "to Playing %.0f ms, audio clock running %.0f ms (median), %d of %d ok" %
+                                       (statistics.median(p for p, c in ok), statistics.median(c for p, c in ok),
+                                        len(ok), runs) if ok else "FAILED")
+                self.logger.log("[Audio Calibration] " + line)
+                lines.append(line)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        best = audio_profiles.recommend(results)
+        msg = "\n".join(lines) + "\n\n" + (_("Recommended: %s") % best if best else _("No profile worked"))
+        if best:
+            msg += "\n" + _("Current: %s") % (self.config[Config.AUDIO_PROFILE] or _("VLC defaults"))
+
+        def ui_upd():
+            self.status(_("Recommended audio output profile: %s") % best if best else _("Audio calibration failed"))
+            wx.MessageBox(msg, _("Audio Output Calibration"), wx.OK | wx.ICON_INFORMATION, self)
+
+        wx.CallAfter(ui_upd)
+
+    def calibrate_profile(self, profile, tone, runs, timeout):
+        """ ([ms to Playing or None], [ms to the clock running or None]) of the runs """
+        args = " ".join(a for a in (audio_profiles.instance_args(profile, 'main'), self.config[Config.VLC_ARGUMENTS])
+                        if a)
+        instance = vlc.Instance(args)
+        if instance is None:  # libvlc refused the arguments
+            raise ValueError("VLC can not start with '%s'" % args)
+        player = instance.media_player_new()
+        try:
+            device = audio_profiles.audio_device(profile, 'main')
+            if device:
+                player.audio_output_device_set(None, device)
+            to_playing, to_clock = [], []
+            for i in range(runs):
+                player.set_media(instance.media_new(tone, *audio_profiles.media_options(profile, 'main')))
+                start = time.perf_counter()
+                playing = None
+                if player.play() == 0:
+                    while time.perf_counter() - start < timeout:
+                        if playing is None and player.get_state() == vlc.State.Playing:
+                            playing = (time.perf_counter() - start) * 1000
+                        if playing is not None and player.get_time() > 0:
+                            break
+                        time.sleep(0.001)
+                clock = (time.perf_counter() - start) * 1000 if playing is not None and \
+                    player.get_time() > 0 else None
+                player.stop()
+                to_playing.append(playing)
+                to_clock.append(clock)
+        finally:
+            player.release()
+            instance.release()
+        return to_playing, to_clock
+
+    # --- Media manifest ---
+
+    def media_roots(self):
+        return self.files_dirs + [path.make_abs(self.config[Config.BG_TRACKS_DIR], path.fest_file),
+                                  path.make_abs(self.config[Config.BG_ZAD_PATH], path.fest_file)]
+
+    def media_manifest_async(self, verify, quick=False):
+        if not self.fest_file_path:
+            return
+        manifest = MediaManifest(os.path.splitext(self.fest_file_path)[0] + '.manifest.json')
+        if verify and not manifest.exists:
+            wx.MessageBox(_("No manifest found, build it first."), _("Media Manifest"), wx.OK | wx.ICON_WARNING, self)
+            return
+        self.status(_("Quick check of media...") if quick else
+                    _("Verifying media...") if verify else _("Building media manifest..."))
+        threading.Thread(target=self.media_manifest_sync, args=(manifest, verify, self.media_roots(), quick)).start()
+
+    def media_manifest_sync(self, manifest, verify, roots, quick=False):
+        start = time.time()
+        try:
+            if verify:
+                report = manifest.verify(roots, quick)
+            else:
+                hashed = manifest.build(roots)
+        except Exception as e:  # Also BrokenProcessPool when a hashing process dies
+            self.logger.log("[Manifest] Failed: %r" % e)
+            wx.CallAfter(lambda: self.status(_("Media manifest failed, watch the log")))
+            return
+        elapsed = time.time() - start
+
+        if not verify:
+            msg = "%d files in manifest, %d hashed in %.1fs" % (len(manifest.files), hashed, elapsed)
+            self.logger.log("[Manifest] " + msg)
+            wx.CallAfter(lambda: self.status(msg))
+            return
+
+        for kind in ('missing', 'added', 'changed'):
+            for file_path in report[kind]:
+                self.logger.log("[Manifest] %s: %s" % (kind.upper(), file_path))
+        msg = (_("Quick check, size and date only. Missing: %d, added: %d, changed: %d (checked in %.1fs)") if quick
+               else _("Missing: %d, added: %d, changed: %d (checked in %.1fs)")) % \
+            (len(report['missing']), len(report['added']), len(report['changed']), elapsed)
+        self.logger.log("[Manifest] " + msg)
+
+        def ui_upd():
+            self.status(msg)
+            problems = report['missing'] or report['changed']
+            wx.MessageBox(msg + ("\n\n" + _("Watch the log for the list of files.") if any(report.values()) else ""),
+                          _("Media Manifest"), wx.OK | (wx.ICON_ERROR if problems else wx.ICON_INFORMATION), self)
+        wx.CallAfter(ui_upd)
+
     # --- Search ---
 
+    def start_c2_search(self):
+        """ The Cosplay2 data is indexed in the background and re-indexed when the database changes """
+        if not self.fest_file_path or not self.config.get(Config.C2_DATABASE_PATH):
+            return
+        db_path = path.make_abs(self.config[Config.C2_DATABASE_PATH], path.fest_file)
+        if not os.path.isfile(db_path):
+            return
+        if self.c2_search and self.c2_search.source_path != db_path:
+            self.c2_search.close()
+            self.c2_search = None
+        if not self.c2_search:
+            try:
+                self.c2_search = C2SearchIndex(os.path.splitext(self.fest_file_path)[0] + '.c2search.sqlite', db_path,
+                                               self.logger)
+            except sqlite3.Error as e:  # No FTS5 in this SQLite build
+                self.logger.log("[C2 Search] Disabled: %s" % e)
+                return
+        self.c2_search.update_async()
+
+    def item_req_id(self, num):
+        """ Cosplay2 request number of the item from its file name, None if the regex has no such group """
+        row_data = self.data.get(num, {})
+        if Columns.C2_REQUEST_ID in row_data:
+            return row_data[Columns.C2_REQUEST_ID]
+        return row_data.get('_' + Columns.C2_REQUEST_ID)
+
     def enter_search(self, e=None):
         if self.search_box.GetValue() == _('Find'):
+            if self.c2_search:
+                self.c2_search.update_async()
             self.search_box.Clear()
             self.search_box.SetForegroundColour(wx.SystemSettings.GetColour(wx.SYS_COLOUR_WINDOWTEXT))
             self.in_search = True
@@ -909,7 +2346,8 @@ class MainWindow(wx.Frame):
     def grid_push(self):
         self.grid_default_bg_color = self.grid.GetDefaultCellBackgroundColour()
         self.full_grid_data = [{'cols': [self.grid.GetCellValue(row, col) for col in range(self.grid.GetNumberCols())],
-                                'color': self.grid.GetCellBackgroundColour(row, 0)}
+                                'color': self.grid.GetCellBackgroundColour(row, 0),
+                                'req_id': self.item_req_id(self.get_num(row)) if self.grid_cols else None}
                                for row in range(self.grid.GetNumberRows())]
 
     def grid_pop(self):
@@ -934,11 +2372,14 @@ class MainWindow(wx.Frame):
         string = self.search_box.GetValue()
         if string == _('Find') or not self.in_search or not string:
             return
+        self.record_input('search', string)
+
+        c2_hits = self.c2_search.search(string) if self.c2_search else set()  # Data not shown in the grid
 
         def match(row):
             """Returns True if any cell in a row matches"""
             return functools.reduce(lambda a, b: a or b, [self.search_box.GetValue().lower() in cell.lower()
-                                                          for cell in row['cols']])
+                                                          for cell in row['cols']]) or row['req_id'] in c2_hits
 
         filtered_grid_data = list(filter(match, self.full_grid_data))
         found = bool(filtered_grid_data)
@@ -955,6 +2396,7 @@ class MainWindow(wx.Frame):
 
     def quit_search(self, e=None):
         if self.in_search:
+            self.record_input('quit_search')
             self.in_search = False
             self.paint_search_box(False)
 
@@ -979,7 +2421,7 @@ class MainWindow(wx.Frame):
 
     # -------------------------------------------------- Player --------------------------------------------------
 
-    def play_async(self, e=None):
+    def play_async(self, e=None, start_ms=0):
         num = self.get_num(self.grid.GetGridCursorRow())
         if self.is_playing and self.num_in_player == num:
             self.status(_("ALREADY PLAYING! Hit Esc to restart!"))
@@ -994,23 +2436,25 @@ class MainWindow(wx.Frame):
                 self.status(_("Invalid countdown row"))
             else:
                 self.status("Countdown started!")
+                self.timeline_mark_started(self.grid.GetGridCursorRow())
             return
         try:
-            files = self.data[num]['files'].items()  # (ext, path)
-            is_stream = any([file[0] == 'm3u' for file in files])
-            video_files = [file[1] for file in files if file[0] in FileTypes.video_extensions]
-
-            if video_files and not self.prefer_audio.IsChecked():
-                file_path = open(video_files[0], 'r').read() if is_stream else video_files[0]
-                sound_only = False
-            else:
-                audio_files = [file[1] for file in files if file[0] in FileTypes.audio_extensions]
-                file_path, sound_only = (audio_files[0], True) if audio_files else (video_files[0], False)
+            file_path, sound_only, is_stream = self.item_media(num)
         except IndexError:
             self.player_status = _(u'Nothing to play for %s%s') % ('№', num)
             return
+        self.time_bar_src = None if is_stream else file_path
+        if is_stream:
+            file_path = open(file_path, 'r').read()
+        else:
+            file_path = self.staged(file_path)
         self.play_pause_bg(play=False)
-        self.player.set_media(self.vlc_instance.media_new(file_path))
+        options = self.media_options('main') + ([':start-time=%.3f' % (start_ms / 1000)] if start_ms else [])
+        self.player.set_media(self.vlc_instance.media_new(file_path, *options))
+        self.time_bar.set_peaks(self.waveform_peaks(self.time_bar_src))
+        self.player_generation += 1
+        self.item_end_handled = False
+        self.cue_runner.disarm()  # The next item arms its own when it starts
 
         if not sound_only:
             self.ensure_proj_win()
@@ -1019,21 +2463,62 @@ class MainWindow(wx.Frame):
             self.show_zad()
 
         self.num_in_player = num
-        self.current_playing_row = self.grid.GetGridCursorRow()
-        [self.grid.SetCellBackgroundColour(self.current_playing_row, col, Colors.ROW_PLAYING_NOW)
+        if self.timecode_sender:
+            self.timecode_sender.set_item(num)
+        row = self.current_playing_row = self.grid.GetGridCursorRow()
+        color = self.grid.GetCellBackgroundColour(row, 0)
+        [self.grid.SetCellBackgroundColour(row, col, Colors.ROW_PLAYING_NOW)
          for col in range(self.grid.GetNumberCols())]
+        self.journal_row(row)
+        self.timeline_mark_started(row)
         wx.CallAfter(self.grid.ForceRefresh)
+        generation = self.player_generation
 
-        def delayed_run():
-            threading.Thread(target=self.play_sync, args=(self.vol_control.GetValue(), sound_only)).start()
-            self.player_time_update_timer.Start(self.player_time_update_interval_ms)
+        def delayed_run():  # A new GO replaces the one still starting
+            self.cues.submit('main', cue_scheduler.GO, 'play %s' % num, self.play_sync, self.vol_control.GetValue(),
+                             sound_only, deadline_s=5, supersede=True,
+                             on_failed=lambda outcome: wx.CallAfter(self.play_failed, num, row, color, generation,
+                                                                    outcome))
 
         wx.CallAfter(delayed_run)  # because set_vlc_video_panel() needs some time...
 
+    def item_media(self, num):
+        """ (file_path, sound_only, is_stream) the player takes for the item, IndexError if there is nothing """
+        files = self.data[num]['files'].items()  # (ext, path)
+        is_stream = any([file[0] == 'm3u' for file in files])
+        video_files = [file[1] for file in files if file[0] in FileTypes.video_extensions]
+
+        if video_files and not self.prefer_audio.IsChecked():
+            return video_files[0], False, is_stream
+        audio_files = [file[1] for file in files if file[0] in FileTypes.audio_extensions]
+        return (audio_files[0], True, False) if audio_files else (video_files[0], False, is_stream)
+
+    def play_failed(self, num, row, color, generation, outcome):
+        """ The GO did not start the item: the row and the player go back to the state before it """
+        current = generation == self.player_generation  # Or replaced by a newer GO, which keeps its own state
+        if row < self.grid.GetNumberRows() and self.grid.GetCellBackgroundColour(row, 0) == Colors.ROW_PLAYING_NOW \
+                and (current or row != self.current_playing_row):
+            [self.grid.SetCellBackgroundColour(row, col, color) for col in range(self.grid.GetNumberCols())]
+            self.journal_row(row)
+            self.grid.ForceRefresh()
+        if current and self.num_in_player == num:
+            self.item_end_handled = True  # Not an end of the item
+            self.player.stop()
+            self.num_in_player = None
+            self.current_playing_row = None
+            self.update_position_timers()
+        self.status(_("GO for №%s %s, not played") % (num, outcome))
+
+    PLAY_START_TIMEOUT_S = 10
+
     def play_sync(self, target_vol, sound_only):
+        start = time.time()
         if not sound_only:
             while not self.set_vlc_video_panel():
+                if time.time() - start > self.PLAY_START_TIMEOUT_S:
+                    raise TimeoutError("no video panel")
                 self.logger.log("Trying to get video panel handler...")
+                cue_scheduler.sleep(0.005)
 
         if self.player.play() != 0:  # [Play] button is pushed here!
             wx.CallAfter(lambda: self.set_player_status(_('Playback FAILED !!!')))
@@ -1043,11 +2528,19 @@ class MainWindow(wx.Frame):
         start = time.time()
         while state != vlc.State.Playing:
             state = self.player.get_state()
+            if state == vlc.State.Error:  # Handled by on_player_end
+                self.logger.log("Playback did not start: %s" % self.player_state_parse(state))
+                return
+            if time.time() - start > self.PLAY_START_TIMEOUT_S:  # The GO fails, play_failed rolls it back
+                raise TimeoutError("still %s after %ds" % (self.player_state_parse(state), self.PLAY_START_TIMEOUT_S))
             status = "%s [%.3fs]" % (self.player_state_parse(state), (time.time() - start))
             wx.CallAfter(lambda: self.set_player_status(status))
             self.logger.log(status)
-            time.sleep(0.007)
+            cue_scheduler.sleep(0.007)
         self.logger.log("Started playback in %.0fms" % ((time.time() - start) * 1000))
+        self.playback_clock.start(self.player.get_time())
+        wx.CallAfter(self.update_position_timers)  # Now that it is playing
+        self.cue_runner.arm(self.num_in_player, self.timed_cues.get(self.num_in_player, []))
 
         if not sound_only:
             wx.CallAfter(lambda: self.proj_win.Layout())
@@ -1063,7 +2556,7 @@ class MainWindow(wx.Frame):
             status = "Trying to unmute... [%.3fs]" % (time.time() - start)
             wx.CallAfter(lambda: self.set_player_status(status))
             self.logger.log(status)
-            time.sleep(0.001)
+            cue_scheduler.sleep(0.001)
         if status[0] == 'T':
             self.logger.log("Unmuted in %.0fms" % ((time.time() - start) * 1000))
 
@@ -1079,17 +2572,21 @@ class MainWindow(wx.Frame):
             return
 
         self.fade_out_btn.Enable(False)
+        self.cue_runner.disarm()  # Also when fading: the act is over
 
         if self.current_playing_row is not None:
             [self.grid.SetCellBackgroundColour(self.current_playing_row, col, Colors.ROW_SKIPPED)
              for col in range(self.grid.GetNumberCols())]
+            self.journal_row(self.current_playing_row)
             wx.CallAfter(self.grid.ForceRefresh)
 
         if fade_out:
-            threading.Thread(target=self.fade_out_stop_sync,
-                             args=(self.fade_out_btn.GetLabel(),)).start()
+            self.cues.submit('main', cue_scheduler.STOP, 'fade out', self.fade_out_stop_sync,
+                             self.fade_out_btn.GetLabel())
         else:
+            self.cues.preempt(['main'])  # A fade in flight ends here
             self.player.stop()
+            self.playback_clock.stop()
             self.time_bar.SetRange(1)
             self.time_bar.SetValue(0)
             self.player_status = self.player_state_parse(self.player.get_state())
@@ -1097,8 +2594,14 @@ class MainWindow(wx.Frame):
             self.set_timecode('stop')
 
     def fade_out_stop_sync(self, fade_out_btn_label):
-        for i in range(self.player.audio_get_volume(), 0, -1):
-            self.set_vol(vol=i)
+        if self.media_engine:  # The engine times the steps, stalls of this process do not stretch the fade
+            self.player.fade_volume(0, self.fade_out_delays_ms / float(1000))
+            fade_steps = iter(lambda: self.player.audio_get_volume() if self.player.fading else 0, 0)
+        else:
+            fade_steps = range(self.player.audio_get_volume(), 0, -1)
+        for i in fade_steps:
+            if not self.media_engine:
+                self.set_vol(vol=i)
             vol_msg = 'Vol: %d' % self.player.audio_get_volume()
 
             def ui_upd():
@@ -1107,8 +2610,13 @@ class MainWindow(wx.Frame):
 
             wx.CallAfter(ui_upd)
 
-            time.sleep(self.fade_out_delays_ms / float(1000))
-        self.player.stop()
+            try:
+                cue_scheduler.sleep(self.fade_out_delays_ms / float(1000))
+            except cue_scheduler.Cancelled:  # Stopped at once by the emergency stop
+                wx.CallAfter(self.fade_out_btn.SetLabel, fade_out_btn_label)
+                raise
+        self.player.stop()  # The timecode keeps running during the fade, as the media does
+        self.playback_clock.stop()
 
         def ui_upd():
             self.fade_out_btn.SetLabel(fade_out_btn_label)
@@ -1155,6 +2663,10 @@ class MainWindow(wx.Frame):
                 self.time_bar.SetRange(track_length)
                 self.time_bar.SetValue(track_time)
 
+            if track_length > 0 and self.item_lengths.get(self.num_in_player) is None:
+                self.item_lengths[self.num_in_player] = track_length / 1000.0
+                self.timeline_invalidate()
+
             time_elapsed = '%02d:%02d' % divmod(track_time / 1000, 60)
             time_remaining = '-%02d:%02d' % divmod(track_length / 1000 - track_time / 1000, 60)
             self.time_label.SetLabel(time_elapsed)
@@ -1164,29 +2676,73 @@ class MainWindow(wx.Frame):
                                             self.player.audio_get_volume(), time_remaining)
             if 'Fading' not in self.player_status:
                 self.player_status = status
-        else:  # Not playing
-            self.time_bar.SetRange(1)
-            self.time_bar.SetValue(0)
-            self.time_label.SetLabel('Stop')
-            self.set_timecode('stop')
-            self.player_status = self.player_state_parse(self.player.get_state())
-            self.switch_to_zad()
+        else:  # The end comes as a VLC event, this is only a fallback
+            self.on_player_end(vlc.EventType.MediaPlayerStopped, self.player_generation)
 
-            if self.grid.GetCellBackgroundColour(self.current_playing_row, 0) != Colors.ROW_SKIPPED:
-                [self.grid.SetCellBackgroundColour(self.current_playing_row, col, Colors.ROW_PLAYED_TO_END)
-                 for col in range(self.grid.GetNumberCols())]
-                wx.CallAfter(self.grid.ForceRefresh)
+    def on_player_end(self, event_type, generation):
+        """ End of item: VLC event (EndReached, Stopped, EncounteredError) forwarded to the GUI thread """
+        if generation != self.player_generation or self.item_end_handled or self.is_playing:
+            return
+        self.item_end_handled = True
+        self.player_time_update_timer.Stop()
+        self.cue_runner.disarm()
+        error = event_type == vlc.EventType.MediaPlayerEncounteredError
+
+        self.time_bar.SetRange(1)
+        self.time_bar.SetValue(0)
+        self.time_label.SetLabel('Stop')
+        self.set_timecode('stop')
+        self.playback_clock.stop()
+        self.player_status = _('Playback ERROR !!!') if error else self.player_state_parse(self.player.get_state())
+        self.switch_to_zad()
+        if error:
+            self.logger.log("VLC error while playing %s%s" % ('№', self.num_in_player))
+
+        if self.current_playing_row is None or self.current_playing_row >= self.grid.GetNumberRows():
+            return
+        if error:
+            [self.grid.SetCellBackgroundColour(self.current_playing_row, col, Colors.ROW_SKIPPED)
+             for col in range(self.grid.GetNumberCols())]
+            self.journal_row(self.current_playing_row)
+            self.grid.ForceRefresh()
+        elif self.grid.GetCellBackgroundColour(self.current_playing_row, 0) != Colors.ROW_SKIPPED:
+            [self.grid.SetCellBackgroundColour(self.current_playing_row, col, Colors.ROW_PLAYED_TO_END)
+             for col in range(self.grid.GetNumberCols())]
+            self.journal_row(self.current_playing_row)
+            self.grid.ForceRefresh()
 
-                row = self.grid.GetGridCursorRow()
-                if row < self.grid.GetNumberRows() - 1 and row == self.current_playing_row:
-                    self.current_playing_row += 1
-                    self.grid.SetGridCursor(self.current_playing_row, 0)
-                    self.grid.SelectRow(self.current_playing_row)
+            row = self.grid.GetGridCursorRow()
+            if row < self.grid.GetNumberRows() - 1 and row == self.current_playing_row:
+                self.current_playing_row += 1
+                self.grid.SetGridCursor(self.current_playing_row, 0)
+                self.grid.SelectRow(self.current_playing_row)
 
-            self.grid.MakeCellVisible(self.current_playing_row, 0)
-            self.grid.SetFocus()
+        self.grid.MakeCellVisible(self.current_playing_row, 0)
+        self.grid.SetFocus()
+
+    def position_visible(self):
+        return not self.IsIconized() or bool(self.timecode_win)
+
+    def bg_position_visible(self):
+        return not self.IsIconized() or bool(self.bg_player.window and not self.bg_player.window.IsIconized())
+
+    def update_position_timers(self, e=None):
+        """ The time displays are polled only while someone can see them """
+        if e:
+            e.Skip()
+        if self.is_playing and self.position_visible():
+            if not self.player_time_update_timer.IsRunning():
+                self.player_time_update_timer.Start(self.player_time_update_interval_ms)
+                self.player_time_update()
+        else:
             self.player_time_update_timer.Stop()
 
+        if self.bg_player.player.get_state() in range(1, 4) and self.bg_position_visible():
+            if not self.bg_player_timer.IsRunning():
+                self.bg_player_timer.Start(self.bg_player.timer_update_ms)
+        else:
+            self.bg_player_timer.Stop()
+
     # -------------------------------------------- Background Music Player --------------------------------------------
 
     def on_bg_load_files(self, e=None):
@@ -1212,17 +2768,20 @@ class MainWindow(wx.Frame):
 
     def background_play(self, e=None, from_grid=False):
         if not self.bg_player.playlist:
-            self.bg_player_status = "Forced playlist loading..."
-            self.on_bg_load_files()
+            if self.bg_player.playlist is None:
+                self.bg_player_status = "Forced playlist loading..."
+                self.on_bg_load_files()
+            self.bg_player.play_when_listed = True  # Plays the first track as soon as the library is listed
+            return
 
         if e and isinstance(e.EventObject, wx.Menu):  # From menu - always play next
             self.bg_player.switch_track_async(False)
         else:
             self.bg_player.switch_track_async(from_grid)
 
-    def background_set_pause(self, e=None, paused=None):
+    def background_set_pause(self, e=None, paused=None, fade=None):
         value = bool(e.Int) if e else paused
-        self.bg_player.pause_async(value)
+        self.bg_player.pause_async(value, fade)
         if not e or isinstance(e.EventObject, wx.ToggleButton):
             self.bg_pause_switch.Check(value)
         if self.bg_player.window:
@@ -1240,7 +2799,7 @@ class MainWindow(wx.Frame):
             self.bg_player.window.vol_slider.SetValue(value)
 
     def bg_player_timer_start(self, val):
-        if val:
+        if val and self.bg_position_visible():
             self.bg_player_timer.Start(val)
         else:
             self.bg_player_timer.Stop()
@@ -1253,6 +2812,8 @@ class MainWindow(wx.Frame):
         if self.bg_player.window:
             self.bg_player.window.time_slider.SetRange(0, length)
             self.bg_player.window.time_slider.SetValue(pos)
+            self.bg_player.window.waveform.SetRange(length)
+            self.bg_player.window.waveform.SetValue(pos)
             self.bg_player.window.time_label.SetLabel(time_remaining)
             if seeking_time:
                 self.bg_player.window.time_label.SetBackgroundColour(Colors.ROW_PLAYING_NOW)
@@ -1273,11 +2834,25 @@ class MainWindow(wx.Frame):
             self.bg_player_timer.Stop()
             if player_state != vlc.State.Paused and self.bg_player.window:
                 self.bg_player.window.time_slider.SetValue(0)
-            if player_state == vlc.State.Ended:
-                self.background_play()
+                self.bg_player.window.waveform.SetValue(0)
 
-    def on_bg_seek(self, e):
-        self.bg_player.player.set_time(e.Int)
+    def on_bg_player_end(self, event_type, track_i):
+        """ VLC event of the background player forwarded to the GUI thread, auto-advances the playlist """
+        if track_i != self.bg_player.current_track_i:  # The track was switched by hand
+            return
+        self.on_background_timer()
+        if event_type == vlc.EventType.MediaPlayerEncounteredError:
+            self.bg_player.errors_in_row += 1
+            self.logger.log("[BG] VLC error while playing %s" % self.bg_player.playlist[track_i]['path'])
+            if self.bg_player.errors_in_row >= 3:
+                self.bg_player_status = "Playback FAILED !!!"
+                return
+            self.background_play()
+        elif event_type == vlc.EventType.MediaPlayerEndReached:
+            self.background_play()
+
+    def on_bg_seek(self, e=None, ms=None):
+        self.bg_player.player.set_time(e.Int if e else ms)
         self.bg_player_timer_start(self.bg_player.timer_update_ms)
 
     def play_pause_bg(self, e=None, play=None):
@@ -1342,6 +2917,25 @@ class MainWindow(wx.Frame):
             self.logger.log("\tself.text_win.list:\n%s" % str(self.text_win.list))
             self.text_win.clear(_("Item not found in the database. Watch the log."))
 
+    # -------------------------------------------------- UI Stalls --------------------------------------------------
+
+    def on_stall(self, stall):
+        """ The watchdog saw the main loop blocked, called on the GUI thread once it runs again """
+        self.stalls.append(stall)
+        self.logger.log("[Stall] %s <- %s" % (stall, " <- ".join(reversed(stall.stack[-6:-1]))))
+        if self.stalls_win:
+            self.stalls_win.reload()
+
+    def stalls_win_show(self, e=None):
+        if not self.stalls_win:
+            self.stalls_win = StallsWindow(self, _('UI Stalls'), self.stalls, self.on_stalls_win_close)
+        self.stalls_win.Show()
+        self.stalls_win.Raise()
+
+    def on_stalls_win_close(self, e=None):
+        self.stalls_win.Destroy()
+        self.stalls_win = None
+
     # -------------------------------------------------- Timecode Window --------------------------------------------------
 
     def timecode_win_show(self, e):
@@ -1350,6 +2944,7 @@ class MainWindow(wx.Frame):
             self.timecode_win.Show()
             self.status("Timecode Window Created")
             self.timecode_win.set_text("timecode")
+            self.update_position_timers()
         else:
             self.on_timecode_win_close()
 
@@ -1358,6 +2953,7 @@ class MainWindow(wx.Frame):
             self.timecode_win.Destroy()
             self.timecode_win = None
             self.status("Timecode Window Destroyed")
+            self.update_position_timers()
         else:
             self.status("WARNING: Timecode Window Not Found")
         self.timecode_win_show_item.Check(False)
@@ -1368,6 +2964,7 @@ class MainWindow(wx.Frame):
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Process pools in the frozen build
     app = wx.App(False if len(sys.argv) > 1 and sys.argv[1] == '-v' else True)
     frame = MainWindow(None, Strings.APP_NAME)
     app.MainLoop()
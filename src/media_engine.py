@@ -0,0 +1,433 @@
+# Optional out-of-process media engine: the VLC players run in a child process, so GUI stalls (grid rebuilds,
+# modal dialogs, the GIL) can not delay fades or playback, and a crash on either side does not take the other one
+# down. The GUI talks to it over a multiprocessing pipe: commands are posted without waiting for the engine,
+# only the calls that need a result wait for it, and a state stream comes back every few ms.
+# RemoteInstance / RemotePlayer mimic the part of the python-vlc API the players use, so the code stays the same.
+
+import itertools
+import sys
+import threading
+import time
+
+import vlc
+
+from os_tools import process_context
+
+PLAYER_EVENTS = (vlc.EventType.MediaPlayerEndReached, vlc.EventType.MediaPlayerStopped,
+                 vlc.EventType.MediaPlayerEncounteredError)
+VOLUME_RETRY_S = 0.005
+VOLUME_GIVE_UP_S = 10
+STICKY_CALLS = {'set_hwnd', 'set_xwindow', 'video_set_deinterlace', 'audio_set_volume', 'audio_set_mute',
+                'audio_output_device_set'}
+
+
+# ------------------------------------------------ Engine process ------------------------------------------------
+
+def engine_main(conn, vlc_args, state_interval):
+    """ Runs in the engine process until the GUI says 'quit' or goes away """
+    instances = {}  # VLC arguments -> vlc.Instance, players with different audio profiles need their own
+    players = {}
+    player_instances = {}
+    fades = {}  # name -> [target, step_delay, next_step_at]
+    volumes = {}  # name -> [volume, retry_at, give_up_at], until the audio output takes it
+    send_lock = threading.Lock()
+
+    def send(msg):
+        with send_lock:
+            conn.send(msg)
+
+    def snapshot():
+        return {name: (p.get_state().value, p.get_time(), p.get_length(), p.audio_get_volume(), name in fades)
+                for name, p in players.items()}
+
+    def new_player(name, args):
+        args = vlc_args if args is None else args
+        if args not in instances:
+            instances[args] = vlc.Instance(args)
+        player_instances[name] = instances[args]
+        players[name] = player = instances[args].media_player_new()
+        events = player.event_manager()
+        for event_type in PLAYER_EVENTS:  # On a VLC thread, only forwarded
+            events.event_attach(event_type, lambda e, n=name: send(('event', n, e.type.value)))
+
+    def execute(name, method, args):
+        if method == 'new':
+            return new_player(name, *args)
+        player = players[name]
+        if method != 'fade_volume':
+            fades.pop(name, None)  # Any other volume or playback change ends the fade
+        if method in ('fade_volume', 'audio_set_volume'):
+            volumes.pop(name, None)
+        if method == 'set_media':
+            mrl, options = args
+            return player.set_media(player_instances[name].media_new(mrl, *options))
+        if method == 'fade_volume':
+            target, step_delay = args
+            fades[name] = [target, step_delay, time.monotonic()]
+            return None
+        if method == 'audio_set_volume':
+            result = player.audio_set_volume(*args)
+            if player.audio_get_volume() != args[0]:  # No audio output yet: libvlc drops the volume
+                now = time.monotonic()
+                volumes[name] = [args[0], now + VOLUME_RETRY_S, now + VOLUME_GIVE_UP_S]
+            return result
+        return getattr(player, method)(*args)
+
+    def take_snapshot(call_id, player, args):
+        """ On its own thread: the PNG encode does not hold up the fades and the posted commands """
+        try:
+            result, error = player.video_take_snapshot(*args), None
+        except Exception as e:
+            result, error = None, repr(e)
+        try:
+            send(('reply', call_id, result, error, {}))  # The players' state belongs to the command loop
+        except (EOFError, OSError):
+            pass
+
+    def fade_steps():
+        now = time.monotonic()
+        for name, fade in list(fades.items()):
+            target, step_delay, next_step_at = fade
+            if now < next_step_at:
+                continue
+            player = players[name]
+            volume = player.audio_get_volume()
+            if volume == target or volume < 0:
+                del fades[name]
+                continue
+            player.audio_set_volume(volume + (1 if target > volume else -1))
+            fade[2] = max(next_step_at + step_delay, now)  # Late steps are not made up in a burst
+
+    def volume_retries():
+        now = time.monotonic()
+        for name, pending in list(volumes.items()):
+            volume, retry_at, give_up_at = pending
+            if now < retry_at:
+                continue
+            player = players[name]
+            if player.audio_get_volume() == volume or now > give_up_at:
+                del volumes[name]
+                send(('state', snapshot()))
+                continue
+            player.audio_set_volume(volume)
+            pending[1] = now + VOLUME_RETRY_S
+
+    def run(call_id, name, method, args):
+        try:
+            result = execute(name, method, args)
+        except Exception as e:
+            send(('reply', call_id, None, repr(e), snapshot()))
+        else:
+            if call_id is not None:
+                send(('reply', call_id, result, None, snapshot()))
+            elif method == 'play' and result == -1:  # Nobody waits for the result, same as a VLC error
+                send(('event', name, vlc.EventType.MediaPlayerEncounteredError.value))
+            else:
+                send(('state', snapshot()))
+
+    last_state = 0
+    try:
+        while True:
+            now = time.monotonic()
+            timeout = state_interval - (now - last_state)
+            if fades or volumes:
+                timeout = min([timeout] + [fade[2] - now for fade in fades.values()] +
+                              [pending[1] - now for pending in volumes.values()])
+            if conn.poll(max(0, timeout)):
+                call_id, name, method, args = conn.recv()
+                if method == 'quit':
+                    break
+                if method == 'video_take_snapshot' and name in players:
+                    threading.Thread(target=take_snapshot, args=(call_id, players[name], args), name="Snapshot",
+                                     daemon=True).start()
+                else:
+                    run(call_id, name, method, args)
+            fade_steps()
+            volume_retries()
+            if time.monotonic() - last_state >= state_interval:
+                last_state = time.monotonic()
+                send(('state', snapshot()))
+    except (EOFError, OSError):  # The GUI process is gone
+        pass
+    finally:
+        for player in players.values():
+            player.stop()
+            player.release()
+        for instance in instances.values():
+            instance.release()
+
+
+# ------------------------------------------------ GUI side ------------------------------------------------
+
+class _Event(object):
+    def __init__(self, event_type):
+        self.type = vlc.EventType(event_type)
+
+
+class RemoteMedia(object):
+    def __init__(self, mrl, options):
+        self.mrl, self.options = mrl, options
+
+
+class RemotePlayer(object):
+    """ Getters return the last state from the stream and never wait for the engine """
+    def __init__(self, engine, name, vlc_args=None):
+        self.engine = engine
+        self.name = name
+        self.vlc_args = vlc_args
+        self.callbacks = {}  # event type -> [callback]
+        self.sticky = {}  # Calls replayed after an engine restart
+        self.state = (vlc.State.NothingSpecial.value, -1, -1, 0, False)
+        self._volume_sent = (None, 0)  # (volume, monotonic time), until the state stream has it
+
+    def _call(self, method, *args):
+        """ Waits for the result, only for the calls that need it """
+        return self.engine.call(self.name, method, args)
+
+    def _post(self, method, *args):
+        """ Commands from the GUI thread do not wait for the engine, its state stream follows them """
+        if method == 'fade_volume':
+            self._volume_sent = (None, 0)
+        if method in STICKY_CALLS:
+            self.sticky[method] = args
+        self.engine.post(self.name, method, args)
+
+    # --- State ---
+
+    def get_state(self):
+        return vlc.State(self.state[0])
+
+    def get_time(self):
+        return self.state[1]
+
+    def get_length(self):
+        return self.state[2]
+
+    def audio_get_volume(self):
+        return self.state[3]
+
+    @property
+    def fading(self):
+        return self.state[4]
+
+    # --- Commands ---
+
+    def set_media(self, media):
+        self._post('set_media', media.mrl, media.options)
+
+    def play(self):
+        """ 0 when posted, a failure comes back as MediaPlayerEncounteredError """
+        self._post('play')
+        return 0
+
+    def stop(self):
+        self._post('stop')
+
+    def set_pause(self, paused):
+        self._post('set_pause', int(paused))
+
+    def set_time(self, ms):
+        self._post('set_time', int(ms))
+
+    def audio_set_volume(self, volume):
+        """ The engine sets it again until the audio output takes it, audio_get_volume() tells when it did. A
+            volume still on its way is not sent again for a while, so polling callers do not flood the pipe. """
+        volume, now = int(volume), time.monotonic()
+        if volume != self._volume_sent[0] or self.state[3] == volume or now - self._volume_sent[1] > 0.5:
+            self._post('audio_set_volume', volume)
+            self._volume_sent = (volume, now)
+        return 0
+
+    def audio_set_mute(self, mute):
+        self._post('audio_set_mute', bool(mute))
+
+    def fade_volume(self, target, step_delay):
+        """ One volume step per `step_delay` seconds up to the target, timed by the engine """
+        self._post('fade_volume', int(target), float(step_delay))
+
+    def audio_output_device_set(self, module, device):
+        self._post('audio_output_device_set', module, device)
+
+    def video_take_snapshot(self, num, file_path, width, height):
+        result = self._call('video_take_snapshot', num, file_path, width, height)
+        return -1 if result is None else result
+
+    def video_set_deinterlace(self, mode):
+        self._post('video_set_deinterlace', mode)
+
+    def set_hwnd(self, handle):
+        self._post('set_hwnd', int(handle))
+
+    def set_xwindow(self, handle):
+        self._post('set_xwindow', int(handle))
+
+    def set_nsobject(self, handle):
+        self.engine.log("macOS views can not be shared with another process, no video")
+
+    def event_manager(self):
+        return self
+
+    def event_attach(self, event_type, callback):
+        self.callbacks.setdefault(event_type.value, []).append(callback)
+
+    def release(self):
+        pass
+
+    def fire(self, event_type):
+        for callback in self.callbacks.get(event_type, []):
+            callback(_Event(event_type))
+
+
+class RemoteInstance(object):
+    def __init__(self, engine, vlc_args=None):
+        self.engine = engine
+        self.vlc_args = vlc_args
+
+    def media_new(self, mrl, *options):
+        return RemoteMedia(mrl, options)
+
+    def media_player_new(self):
+        return self.engine.new_player(self.vlc_args)
+
+    def release(self):
+        pass
+
+
+class MediaEngine(object):
+    def __init__(self, vlc_args, logger=None, on_restart=None, state_interval=0.02, call_timeout=3.0,
+                 max_restarts=5):
+        """ `on_restart(reason)` is called from the reader thread after the engine was restarted """
+        self.vlc_args = vlc_args
+        self.logger = logger
+        self.on_restart = on_restart
+        self.state_interval = state_interval
+        self.call_timeout = call_timeout
+        self.max_restarts = max_restarts
+        self.players = {}
+        self._ids = itertools.count()
+        self._calls = {}  # id -> [threading.Event, result]
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._restarts = []
+        self._closing = False
+        self._process = self._conn = None
+        self._start()
+
+    def log(self, msg):
+        if self.logger:
+            self.logger.log("[Media Engine] " + msg)
+
+    def instance(self, vlc_args=None):
+        """ `vlc_args` of the players made by it, the ones of the engine by default """
+        return RemoteInstance(self, vlc_args)
+
+    def _start(self):
+        context = process_context()
+        gui_conn, engine_conn = context.Pipe()
+        self._process = context.Process(target=engine_main, name="MediaEngine", daemon=True,
+                                        args=(engine_conn, self.vlc_args, self.state_interval))
+        self._process.start()
+        engine_conn.close()
+        self._conn = gui_conn
+        threading.Thread(target=self._read, args=(gui_conn, self._process), name="MediaEngineReader",
+                         daemon=True).start()
+        for name, player in self.players.items():
+            self._send(name, 'new', (player.vlc_args,))
+            for method, args in player.sticky.items():
+                self._send(name, method, args)
+
+    def _send(self, name, method, args, call_id=None):
+        with self._send_lock:
+            try:
+                self._conn.send((call_id, name, method, args))
+            except (OSError, ValueError):  # Engine gone, the reader restarts it
+                return False
+        return True
+
+    def new_player(self, vlc_args=None):
+        name = 'player%d' % len(self.players)
+        self.players[name] = player = RemotePlayer(self, name, vlc_args)
+        self.post(name, 'new', (vlc_args,))
+        return player
+
+    def post(self, name, method, args):
+        """ Sends a command without waiting, a dead engine is restarted by the reader """
+        self._send(name, method, args)
+
+    def call(self, name, method, args):
+        """ Result of the call, None if the engine failed or did not answer in time. Blocks the caller. """
+        call_id = next(self._ids)
+        slot = [threading.Event(), None]
+        with self._lock:
+            self._calls[call_id] = slot
+        try:
+            if not self._send(name, method, args, call_id):
+                return None
+            if not slot[0].wait(self.call_timeout):
+                self.log("No answer to %s.%s in %.1fs, restarting" % (name, method, self.call_timeout))
+                self._process.kill()  # The reader sees the pipe closing
+                return None
+            return slot[1]
+        finally:
+            with self._lock:
+                self._calls.pop(call_id, None)
+
+    def _read(self, conn, process):
+        try:
+            while True:
+                msg = conn.recv()
+                if msg[0] == 'state':
+                    self._update_state(msg[1])
+                elif msg[0] == 'reply':
+                    call_id, result, error, state = msg[1:]
+                    self._update_state(state)  # Before the caller wakes up: no stale getters after a call
+                    if error:
+                        self.log("Call failed: %s" % error)
+                    with self._lock:
+                        slot = self._calls.get(call_id)
+                    if slot:
+                        slot[1] = result
+                        slot[0].set()
+                elif msg[0] == 'event':
+                    self.players[msg[1]].fire(msg[2])
+        except (EOFError, OSError):
+            pass
+        process.join(1)
+        if not self._closing:
+            self._lost(process.exitcode)
+
+    def _update_state(self, state):
+        for name, player_state in state.items():
+            if name in self.players:
+                self.players[name].state = player_state
+
+    def _lost(self, exitcode):
+        with self._lock:
+            for slot in self._calls.values():
+                slot[0].set()  # Waiting calls return None
+        now = time.monotonic()
+        self._restarts = [t for t in self._restarts if now - t < 60] + [now]
+        for player in self.players.values():
+            player.state = (vlc.State.Error.value, -1, -1, 0, False)
+            player.fire(vlc.EventType.MediaPlayerEncounteredError.value)
+        if len(self._restarts) > self.max_restarts:
+            self.log("Engine exited with code %s, too many restarts in a minute, giving up" % exitcode)
+            reason = "Media engine failed"
+        else:
+            self.log("Engine exited with code %s, restarting" % exitcode)
+            self._start()
+            reason = "Media engine restarted"
+        if self.on_restart:
+            self.on_restart(reason)
+
+    def close(self):
+        self._closing = True
+        self._send(None, 'quit', ())
+        self._process.join(3)
+        if self._process.is_alive():
+            self._process.kill()
+        self._conn.close()
+
+
+def supported():
+    return not sys.platform == "darwin"  # The video goes into a window handle of the GUI process
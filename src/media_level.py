@@ -0,0 +1,112 @@
+# Level of the media the players are on: peak and rms of the waveform peaks at the play position, times the
+# player volume. This is not a meter of the audio output: libvlc has no tap that leaves its output alone (the
+# audio callbacks and amem replace the output module, with our buffering and its latency and dropouts), so a
+# fade, a muted or a missing device, or an output that failed do not show here. The peaks are the decoded audio
+# already (10 ms min/max buckets), the position is the one of the PlaybackClock, so a frame only reduces a few
+# buckets with NumPy. The time spent computing and painting is measured and shown in the tooltip.
+
+import math
+import time
+
+import wx
+
+from waveform import BUCKET_MS, window_levels
+
+FPS = 25
+FLOOR_DB = -60.0
+RMS_MS = 300
+RELEASE_DB_S = 20.0  # Fall back of the peak bar
+HOLD_S = 1.5
+COLORS = ((-18.0, wx.Colour(60, 180, 60)), (-6.0, wx.Colour(220, 200, 40)), (0.0, wx.Colour(220, 50, 40)))
+
+
+def to_db(level):
+    return max(FLOOR_DB, 20 * math.log10(level)) if level > 0 else FLOOR_DB
+
+
+class MediaLevel(wx.Panel):
+    def __init__(self, parent, sources, size=wx.DefaultSize):
+        """ `sources`: [(label, callable)], one bar each. The callable gives (peaks, position ms, gain) of the
+            player, or None when it is not playing. """
+        wx.Panel.__init__(self, parent, size=size)
+        self.SetBackgroundStyle(wx.BG_STYLE_PAINT)
+        self.sources = sources
+        self.levels = [[FLOOR_DB, FLOOR_DB, FLOOR_DB, 0.0] for _ in sources]  # Peak, rms, hold, hold until
+        self._drawn = None
+        self._busy_s, self._frames, self._since = 0.0, 0, time.perf_counter()
+        self.timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.on_tick, self.timer)
+        self.Bind(wx.EVT_PAINT, self.on_paint)
+
+    def start(self):
+        self.timer.Start(1000 // FPS)
+
+    def stop(self):
+        self.timer.Stop()
+
+    def on_tick(self, e):
+        start = time.perf_counter()
+        now = time.monotonic()
+        for (label, source), levels in zip(self.sources, self.levels):
+            current = source()
+            peak = rms = FLOOR_DB
+            if current and current[0] is not None and current[1] is not None:
+                peaks, pos_ms, gain = current
+                end = int(pos_ms) // BUCKET_MS + 1
+                peak = to_db(window_levels(peaks, end, 1000 // FPS // BUCKET_MS + 1)[0] * gain)  # Since last frame
+                rms = to_db(window_levels(peaks, end, RMS_MS // BUCKET_MS)[1] * gain)
+            levels[0] = max(peak, levels[0] - RELEASE_DB_S / FPS)
+            levels[1] = rms
+            if levels[0] >= levels[2] or now > levels[3]:
+                levels[2], levels[3] = levels[0], now + HOLD_S
+        if self._drawn != self.drawn_state() and self.IsShownOnScreen():
+            self.Refresh(False)
+        self.measure(start)
+
+    def drawn_state(self):
+        return [(round(peak), round(rms), round(hold)) for peak, rms, hold, until in self.levels]
+
+    def measure(self, start):
+        """ Per frame: the tick and the paint it caused """
+        self._busy_s += time.perf_counter() - start
+        self._frames += 1
+        elapsed = time.perf_counter() - self._since
+        if elapsed >= 1:
+            self.SetToolTip(_("Media level at the play position, from the waveform, not the audio output. "
+                              "%.2f%% of a CPU, %.0f us per frame") %
+                            (100 * self._busy_s / elapsed, 1e6 * self._busy_s / self._frames))
+            self._busy_s, self._frames, self._since = 0.0, 0, time.perf_counter()
+
+    @staticmethod
+    def db_x(db, x0, w):
+        return x0 + int(w * (db - FLOOR_DB) / -FLOOR_DB)
+
+    def on_paint(self, e):
+        start = time.perf_counter()
+        dc = wx.AutoBufferedPaintDC(self)
+        dc.SetBackground(wx.Brush(wx.Colour(30, 30, 30)))
+        dc.Clear()
+        self._drawn = self.drawn_state()
+        w, h = self.GetClientSize()
+        row_h = h // max(1, len(self.sources))
+        dc.SetFont(wx.Font(wx.FontInfo(7)))
+        dc.SetTextForeground(wx.Colour(200, 200, 200))
+        label_w = max(dc.GetTextExtent(label)[0] for label, source in self.sources) + 4
+        bar_w = w - label_w - 2
+        dc.SetPen(wx.TRANSPARENT_PEN)
+        for i, ((label, source), (peak, rms, hold, until)) in enumerate(zip(self.sources, self.levels)):
+            y = i * row_h
+            dc.DrawText(label, 2, y + (row_h - dc.GetTextExtent(label)[1]) // 2)
+            low = FLOOR_DB
+            for limit, color in COLORS:  # Rms solid, peak dimmed beyond it
+                for level, k in ((peak, 0.5), (rms, 1.0)):
+                    top = min(level, limit)
+                    if top > low:
+                        dc.SetBrush(wx.Brush(wx.Colour(*(int(c * k) for c in color.Get(False)))))
+                        x0, x1 = self.db_x(low, label_w, bar_w), self.db_x(top, label_w, bar_w)
+                        dc.DrawRectangle(x0, y + 2, x1 - x0, row_h - 4)
+                low = limit
+            if hold > FLOOR_DB:
+                dc.SetBrush(wx.Brush(wx.WHITE))
+                dc.DrawRectangle(self.db_x(hold, label_w, bar_w) - 1, y + 2, 2, row_h - 4)
+        self._busy_s += time.perf_counter() - start
@@ -0,0 +1,142 @@
+# Content-hash manifest of the show media, saved next to the .fest file.
+# Hashing runs in a process pool, files with unchanged size and mtime are never re-hashed.
+
+import hashlib
+import json
+import mmap
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from os_tools import process_context
+
+MANIFEST_VERSION = 1
+
+
+def hash_file(file_path, chunk_size=16 * 1024 * 1024):
+    """ BLAKE2b of a file, hashed straight from a memory map without copying it into read buffers """
+    h = hashlib.blake2b()
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return h.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m, memoryview(m) as view:
+            for offset in range(0, size, chunk_size):
+                h.update(view[offset:offset + chunk_size])
+    return h.hexdigest()
+
+
+def list_files(roots):
+    """ {abs_path: (size, mtime_ns)} for all files in the roots. A root may be a single file. """
+    files = {}
+    for root in roots:
+        if not root:
+            continue
+        if os.path.isfile(root):
+            st = os.stat(root)
+            files[os.path.abspath(root)] = (st.st_size, st.st_mtime_ns)
+            continue
+        for folder, dirs, names in os.walk(root):
+            dirs[:] = [d for d in dirs if not d.startswith('.') and not d.endswith('_backup')]
+            for name in names:
+                if name.startswith('.'):  # Hidden and partially copied files
+                    continue
+                file_path = os.path.abspath(os.path.join(folder, name))
+                st = os.stat(file_path)
+                files[file_path] = (st.st_size, st.st_mtime_ns)
+    return files
+
+
+class MediaManifest(object):
+    def __init__(self, manifest_path, workers=None):
+        self.manifest_path = manifest_path
+        self.base_dir = os.path.dirname(os.path.abspath(manifest_path))
+        self.workers = workers
+        self.files = {}  # {key: {'size': int, 'mtime_ns': int, 'blake2b': str}}
+        self.created = None
+
+    def _key(self, file_path):
+        """ Paths are stored relative to the .fest file, so the manifest survives moving the whole fest folder """
+        try:
+            rel = os.path.relpath(file_path, self.base_dir)
+        except ValueError:  # Another drive on Windows
+            return file_path.replace('\\', '/')
+        return rel.replace('\\', '/')
+
+    def _abs(self, key):
+        return os.path.normpath(os.path.join(self.base_dir, key))
+
+    @property
+    def exists(self):
+        return os.path.isfile(self.manifest_path)
+
+    def load(self):
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != MANIFEST_VERSION:
+            raise ValueError("Unsupported manifest version %s" % data.get('version'))
+        self.files = data['files']
+        self.created = data.get('created')
+
+    def save(self):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'created': self.created, 'files': self.files}, f,
+                      ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _hash_many(self, paths):
+        if not paths:
+            return {}
+        if len(paths) == 1:
+            return {paths[0]: hash_file(paths[0])}
+        with ProcessPoolExecutor(self.workers, mp_context=process_context()) as pool:
+            return dict(zip(paths, pool.map(hash_file, paths)))
+
+    def build(self, roots):
+        """ Hashes new and modified files, reuses the rest from the existing manifest. Returns hashed files count. """
+        if self.exists and not self.files:
+            try:
+                self.load()
+            except (ValueError, KeyError):
+                self.files = {}
+        current = list_files(roots)
+        files, to_hash = {}, []
+        for file_path, (size, mtime_ns) in current.items():
+            key = self._key(file_path)
+            old = self.files.get(key)
+            if old and old['size'] == size and old['mtime_ns'] == mtime_ns:
+                files[key] = old
+            else:
+                to_hash.append(file_path)
+        for file_path, digest in self._hash_many(to_hash).items():
+            size, mtime_ns = current[file_path]
+            files[self._key(file_path)] = {'size': size, 'mtime_ns': mtime_ns, 'blake2b': digest}
+        self.files = files
+        self.created = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.save()
+        return len(to_hash)
+
+    def verify(self, roots, quick=False):
+        """ Returns {'missing': [...], 'added': [...], 'changed': [...]} with absolute paths.
+        Every file of the right size is re-hashed. A quick check trusts the files with the manifest's size and
+        mtime and re-hashes only the touched ones, so it does not catch silent corruption. """
+        if not self.files:
+            self.load()
+        current = {self._key(p): v for p, v in list_files(roots).items()}
+        report = {'missing': sorted(self._abs(k) for k in self.files.keys() - current.keys()),
+                  'added': sorted(self._abs(k) for k in current.keys() - self.files.keys()),
+                  'changed': []}
+        suspicious = []
+        for key in self.files.keys() & current.keys():
+            size, mtime_ns = current[key]
+            expected = self.files[key]
+            if size != expected['size']:
+                report['changed'].append(self._abs(key))
+            elif not quick or mtime_ns != expected['mtime_ns']:
+                suspicious.append(self._abs(key))
+        for file_path, digest in self._hash_many(suspicious).items():
+            if digest != self.files[self._key(file_path)]['blake2b']:
+                report['changed'].append(file_path)
+        report['changed'].sort()
+        return report
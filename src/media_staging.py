@@ -0,0 +1,169 @@
+# Local staging of the show media: every referenced file is mirrored to a cache folder on a local disk by a
+# background thread, read sequentially in large chunks under a bandwidth limit (the share is busy during the show).
+# A copy is played only while its size and mtime match the original, otherwise the original path is used.
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+STAGED = 'staged'
+COPYING = 'copying'
+PENDING = 'pending'
+FAILED = 'failed'
+
+
+class MediaStaging(object):
+    def __init__(self, cache_dir, on_change=None, max_mb_per_s=0, chunk_mb=8, rescan_s=60, logger=None):
+        """ `on_change(src)` is called from the staging thread whenever the state of a file changes """
+        self.cache_dir = cache_dir
+        self.on_change = on_change
+        self.max_bytes_per_s = max_mb_per_s * 1024 * 1024
+        self.chunk_size = chunk_mb * 1024 * 1024
+        self.rescan_s = rescan_s
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._sources = []
+        self._states = {}  # src -> (state, copied fraction)
+        self._wake = threading.Event()
+        self._running = True
+        self._stopped = threading.Event()
+        os.makedirs(cache_dir, exist_ok=True)
+        for name in os.listdir(cache_dir):  # Interrupted copies
+            if name.endswith('.part'):
+                os.remove(os.path.join(cache_dir, name))
+        self._thread = threading.Thread(target=self._run, name="MediaStaging", daemon=True)
+        self._thread.start()
+
+    def log(self, msg):
+        if self.logger:
+            self.logger.log("[Staging] " + msg)
+
+    def cache_path(self, src):
+        src = os.path.abspath(src)
+        key = hashlib.blake2b(src.encode('utf-8'), digest_size=8).hexdigest()
+        return os.path.join(self.cache_dir, "%s_%s" % (key, os.path.basename(src)))
+
+    @staticmethod
+    def _same(st, local_st):
+        # 2 s: FAT and SMB mtime resolution
+        return st.st_size == local_st.st_size and abs(st.st_mtime - local_st.st_mtime) < 2
+
+    def local_path(self, src):
+        """ The local copy if it is valid, else None. If the original is unreachable (the share is gone),
+            a copy verified earlier is still used. """
+        dst = self.cache_path(src)
+        try:
+            local_st = os.stat(dst)
+        except OSError:
+            return None
+        try:
+            st = os.stat(src)
+        except OSError:
+            return dst if self.state(src)[0] == STAGED else None
+        return dst if self._same(st, local_st) else None
+
+    def resolve(self, src):
+        """ What to open: the local copy or the original """
+        return self.local_path(src) or src
+
+    def state(self, src):
+        """ (state, copied fraction), state is None for files that are not staged """
+        with self._lock:
+            return self._states.get(src, (None, 0.0))
+
+    def _set(self, src, state, fraction=0.0):
+        with self._lock:
+            changed = self._states.get(src) != (state, fraction)
+            self._states[src] = state, fraction
+        if changed and self.on_change:
+            self.on_change(src)
+
+    def stage(self, sources):
+        """ Replaces the list of files to mirror, in order of priority """
+        sources = list(dict.fromkeys(sources))
+        with self._lock:
+            self._sources = sources
+            self._states = {src: self._states.get(src, (PENDING, 0.0)) for src in sources}
+        self._wake.set()
+
+    def stop(self):
+        self._running = False
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join()
+
+    def _run(self):
+        while self._running:
+            self._wake.clear()
+            with self._lock:
+                sources = list(self._sources)
+            for src in sources:
+                if not self._running or self._wake.is_set():  # Stopped or a new list
+                    break
+                self._refresh(src)
+            else:
+                self._wake.wait(self.rescan_s)
+
+    def _refresh(self, src):
+        try:
+            st = os.stat(src)
+        except OSError:
+            if self.state(src)[0] != STAGED:  # Keep playing a verified copy while the share is away
+                self._set(src, FAILED)
+            return
+        dst = self.cache_path(src)
+        try:
+            if self._same(st, os.stat(dst)):
+                self._set(src, STAGED, 1.0)
+                return
+        except OSError:
+            pass
+        self._set(src, PENDING)
+        try:
+            if shutil.disk_usage(self.cache_dir).free < st.st_size + self.chunk_size:
+                raise OSError("not enough space in %s" % self.cache_dir)
+            self._copy(src, st, dst)
+        except OSError as e:
+            self.log("Failed to stage %s: %s" % (src, e))
+            self._set(src, FAILED)
+
+    def _copy(self, src, st, dst):
+        """ Sequential chunked copy into a temporary file, swapped in when complete and unchanged meanwhile """
+        tmp = dst + '.part'
+        buf = bytearray(self.chunk_size)
+        view = memoryview(buf)
+        copied = 0
+        start = time.monotonic()
+        self._set(src, COPYING)
+        try:
+            with open(src, 'rb', buffering=0) as fin, open(tmp, 'wb') as fout:
+                while self._running:
+                    n = fin.readinto(buf)
+                    if not n:
+                        break
+                    fout.write(view[:n])
+                    copied += n
+                    self._set(src, COPYING, round(copied / max(1, st.st_size), 2))
+                    if self.max_bytes_per_s:
+                        ahead = copied / self.max_bytes_per_s - (time.monotonic() - start)
+                        if ahead > 0:
+                            self._stopped.wait(ahead)
+            if not self._running:
+                raise InterruptedError()
+            if not self._same(st, os.stat(src)):  # Replaced while copying, the next pass takes it again
+                raise InterruptedError()
+            os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+            os.replace(tmp, dst)
+        except InterruptedError:
+            os.remove(tmp)
+            self._set(src, PENDING)
+            return
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.log("%s staged, %.1f MB in %.1f s" % (os.path.basename(src), copied / 1024 / 1024,
+                                                   time.monotonic() - start))
+        self._set(src, STAGED, 1.0)
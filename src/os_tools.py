@@ -3,6 +3,7 @@
 # All path translations are performed on start (change settings, read config, etc)
 
 
+import multiprocessing
 import os
 import sys
 from pathlib import Path, PureWindowsPath
@@ -63,3 +64,9 @@ class PathTools(object):
         return True
 
 path = PathTools()
+
+
+def process_context():
+    """ For the worker processes: spawned, not forked. A fork of the GUI process copies its threads' locks and
+    the VLC state. """
+    return multiprocessing.get_context('spawn')
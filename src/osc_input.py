@@ -0,0 +1,194 @@
+# OSC over UDP for show controllers (QLab, stage manager button boxes).
+# The listener thread receives into a preallocated buffer and looks the address up in a dict of handlers.
+# Handlers get the arguments and the receive timestamp (time.perf_counter_ns) to measure the cue latency.
+
+import collections
+import socket
+import struct
+import threading
+import time
+
+_INT = struct.Struct('>i')
+_FLOAT = struct.Struct('>f')
+_INT64 = struct.Struct('>q')
+_DOUBLE = struct.Struct('>d')
+
+
+def _string_end(data, start):
+    """ Returns (end of a null-terminated OSC string, start of the next 4-byte aligned field) """
+    end = start
+    while data[end]:
+        end += 1
+    return end, (end + 4) & ~3
+
+
+def parse_packet(data, on_message):
+    """ Calls `on_message(address, args)` for a message or for each message of a (nested) bundle.
+    `data` is a bytes-like object, a memoryview of the receive buffer is not copied. """
+    if bytes(data[:8]) == b'#bundle\0':
+        pos = 16  # The time tag is ignored: cues run as soon as they come
+        while pos + 4 <= len(data):
+            size, = _INT.unpack_from(data, pos)
+            parse_packet(data[pos + 4:pos + 4 + size], on_message)
+            pos += 4 + size
+        return
+
+    end, pos = _string_end(data, 0)
+    address = bytes(data[:end])
+    args = []
+    if pos < len(data) and data[pos] == 0x2C:  # ','
+        tags_end, tags_next = _string_end(data, pos)
+        tags = bytes(data[pos + 1:tags_end])
+        pos = tags_next
+        for tag in tags:
+            if tag == 0x69:  # i
+                args.append(_INT.unpack_from(data, pos)[0])
+                pos += 4
+            elif tag == 0x66:  # f
+                args.append(_FLOAT.unpack_from(data, pos)[0])
+                pos += 4
+            elif tag == 0x73:  # s
+                end, next_pos = _string_end(data, pos)
+                args.append(bytes(data[pos:end]).decode('utf-8', 'replace'))
+                pos = next_pos
+            elif tag == 0x68:  # h
+                args.append(_INT64.unpack_from(data, pos)[0])
+                pos += 8
+            elif tag == 0x64:  # d
+                args.append(_DOUBLE.unpack_from(data, pos)[0])
+                pos += 8
+            elif tag in (0x54, 0x46, 0x4E):  # T, F, N
+                args.append({0x54: True, 0x46: False, 0x4E: None}[tag])
+            else:
+                break  # Blobs and exotic types are not used for cues
+    on_message(address, args)
+
+
+def encode_message(address, *args):
+    def pad(b):
+        return b + b'\0' * (4 - len(b) % 4)
+
+    tags, payload = ',', b''
+    for arg in args:
+        if isinstance(arg, bool):
+            tags += 'T' if arg else 'F'
+        elif isinstance(arg, int):
+            tags += 'i'
+            payload += _INT.pack(arg)
+        elif isinstance(arg, float):
+            tags += 'f'
+            payload += _FLOAT.pack(arg)
+        elif arg is None:
+            tags += 'N'
+        else:
+            tags += 's'
+            payload += pad(str(arg).encode('utf-8'))
+    return pad(address.encode('utf-8')) + pad(tags.encode('ascii')) + payload
+
+
+def parse_address(address):
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+
+class OscListener(object):
+    def __init__(self, listen_address, handlers, feedback_address='', logger=None, buffer_size=65536):
+        """ `handlers`: {b'/fest/go': callable(args, received_ns)}, called from the listener thread """
+        self.listen_address = parse_address(listen_address)
+        self.feedback_address = parse_address(feedback_address) if feedback_address else None
+        self.handlers = handlers
+        self.logger = logger
+
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._sock = None
+        self._thread = None
+        self._running = False
+        self._received_ns = 0
+        self._feedback_state = {}
+
+        self.latencies_ms = collections.deque(maxlen=1000)  # Received-to-executed of the last cues
+
+    def _log(self, msg):
+        if self.logger:
+            self.logger.log("[OSC] " + msg)
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self._sock.bind(self.listen_address)
+        except OSError:
+            self._sock.close()
+            self._sock = None
+            raise
+        self.listen_address = self._sock.getsockname()
+        self._sock.settimeout(0.2)  # To notice stop()
+        self._running = True
+        self._thread = threading.Thread(target=self._listen, name="OscListener", daemon=True)
+        self._thread.start()
+        self._log("Listening on %s:%d" % self.listen_address)
+
+    def stop(self):
+        if self._thread:
+            self._running = False
+            self._thread.join()
+            self._thread = None
+            self._sock.close()
+            self._sock = None
+            self._log(self.latency_summary())
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def _listen(self):
+        view = self._view
+        while self._running:
+            try:
+                size, sender = self._sock.recvfrom_into(self._buffer)
+            except socket.timeout:
+                continue
+            except OSError as e:
+                self._log("Receive failed: %s" % e)
+                continue
+            self._received_ns = time.perf_counter_ns()
+            try:
+                parse_packet(view[:size], self._dispatch)
+            except (IndexError, struct.error, ValueError) as e:
+                self._log("Malformed packet from %s: %s" % (sender, e))
+
+    def _dispatch(self, address, args):
+        handler = self.handlers.get(address)
+        if handler:
+            handler(args, self._received_ns)
+        else:
+            self._log("Unknown address %s %s" % (address.decode('utf-8', 'replace'), args))
+
+    def executed(self, address, received_ns):
+        """ Call when the cue has been executed (on the GUI thread) """
+        latency = (time.perf_counter_ns() - received_ns) / 1e6
+        self.latencies_ms.append(latency)
+        self._log("%s executed in %.2fms" % (address, latency))
+
+    def latency_summary(self):
+        if not self.latencies_ms:
+            return "No cues received"
+        s = sorted(self.latencies_ms)
+        return "%d cues, latency min %.2fms, median %.2fms, max %.2fms" % \
+               (len(s), s[0], s[len(s) // 2], s[-1])
+
+    # ------------------------------------------------ Feedback ------------------------------------------------
+
+    def publish(self, state):
+        """ Sends /fest/<key> <value> for the changed keys of the state """
+        if not self.feedback_address or not self._sock:
+            return
+        for key, value in state.items():
+            if self._feedback_state.get(key, ()) != value:
+                try:
+                    self._sock.sendto(encode_message('/fest/' + key, value), self.feedback_address)
+                except OSError as e:
+                    self._log("Feedback to %s:%d failed: %s" % (self.feedback_address + (e,)))
+                    return
+        self._feedback_state = dict(state)
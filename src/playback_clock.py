@@ -0,0 +1,78 @@
+# Smooth media time for timecode. VLC's get_time() advances in coarse steps (tens to hundreds of ms depending
+# on the output module), so between the steps the position is extrapolated with the monotonic clock.
+# Each new VLC value corrects the drift by slewing the speed a little, or by a jump after a seek or a stall.
+
+import threading
+import time
+
+
+class PlaybackClock(object):
+    def __init__(self, get_time, is_advancing=None, now=time.monotonic, gain=1.0, max_slew=0.05, snap_ms=250):
+        """ `get_time()` is the player time in ms, `is_advancing()` is False while paused or buffering """
+        self._get_time = get_time
+        self._is_advancing = is_advancing
+        self._now = now
+        self.gain = gain  # Share of the error corrected per second
+        self.max_slew = max_slew
+        self.snap_ms = snap_ms
+
+        self._lock = threading.Lock()
+        self._media0 = None  # None when stopped
+        self._mono0 = 0
+        self._speed = 1.0
+        self._last_raw = None
+        self.running = False
+        self.error_ms = 0.0  # Last measured difference between VLC and the clock
+
+    def start(self, media_ms=0):
+        with self._lock:
+            self._media0, self._mono0, self._speed = max(media_ms, 0), self._now(), 1.0
+            self._last_raw = None
+            self.running = True
+
+    def stop(self):
+        with self._lock:
+            self._media0 = None
+            self.running = False
+
+    @property
+    def stopped(self):
+        return self._media0 is None
+
+    def _position(self, now):
+        if not self.running:
+            return self._media0
+        return self._media0 + (now - self._mono0) * 1000 * self._speed
+
+    def now_ms(self):
+        """ Interpolated position in ms, None when stopped. Held while paused. """
+        with self._lock:
+            return None if self._media0 is None else self._position(self._now())
+
+    def sample(self):
+        """ Feeds a new player time, to be called at least as often as the timecode is sent """
+        raw = self._get_time()
+        advancing = self._is_advancing() if self._is_advancing else True
+        with self._lock:
+            if self._media0 is None:
+                return
+            now = self._now()
+            if not advancing:
+                if self.running:  # Hold the position while paused or buffering
+                    self._media0, self.running = self._position(now), False
+                return
+            if raw is None or raw < 0 or raw == self._last_raw:
+                return
+            self._last_raw = raw
+
+            if not self.running:
+                self._media0, self._mono0, self._speed, self.running = raw, now, 1.0, True
+                return
+            predicted = self._position(now)
+            self.error_ms = raw - predicted
+            if abs(self.error_ms) > self.snap_ms:  # Seek or stall: jump
+                self._media0, self._speed = raw, 1.0
+            else:  # Speeding up or slowing down keeps the clock monotonic
+                self._media0 = predicted
+                self._speed = 1 + max(-self.max_slew, min(self.max_slew, self.error_ms * self.gain / 1000))
+            self._mono0 = now
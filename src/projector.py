@@ -1,11 +1,195 @@
+import collections
+import contextlib
+import os
+
 import wx
 from datetime import *
 from constants import Config, Colors, wxWidgetsConstants
+from image_info import decode_plan
+
+try:
+    from PIL import Image as PilImage  # Optional: decodes JPEG directly at a reduced size
+except ImportError:
+    PilImage = None
+
+SCALING_POLICIES = ('fit', 'fill', 'stretch', 'none')
+
+
+def scale_image(img, size, policy):
+    """ fit: letterbox, fill: crop to the whole area, stretch: ignore the aspect, none: original size """
+    w, h = img.GetWidth(), img.GetHeight()
+    max_w, max_h = size
+    if policy == 'none' or not w or not h or not max_w or not max_h:
+        return img
+    if policy == 'stretch':
+        return img.Scale(max_w, max_h, wx.IMAGE_QUALITY_HIGH)
+    ratio = (max if policy == 'fill' else min)(max_w / float(w), max_h / float(h))
+    img = img.Scale(int(w * ratio), int(h * ratio), wx.IMAGE_QUALITY_HIGH)
+    if policy == 'fill':
+        img = img.GetSubImage(wx.Rect((img.GetWidth() - max_w) // 2, (img.GetHeight() - max_h) // 2, max_w, max_h))
+    return img
+
+
+def load_image(file_path, target, budget_bytes, logger=None):
+    """ Decodes as small as the format allows for the target size (None: full size).
+    Returns None instead of decoding an image over the memory budget. """
+    plan = decode_plan(file_path, target, jpeg_draft=PilImage is not None)
+    if plan and plan[3] > budget_bytes:
+        if logger:
+            logger.log("[ZAD] %s needs %dMB to decode (%dx%d), over the %dMB budget, not shown" %
+                       (file_path, plan[3] >> 20, plan[1], plan[2], budget_bytes >> 20))
+        return None
+    if PilImage and plan and plan[0] == 'jpeg' and target:
+        with PilImage.open(file_path) as pil:
+            pil.draft('RGB', tuple(target))
+            pil = pil.convert('RGB')
+            return wx.Image(pil.width, pil.height, pil.tobytes())
+    return wx.Image(file_path, wx.BITMAP_TYPE_ANY)
+
+
+def scaled_rect(w, h, size, policy):
+    """ Where to draw a w*h frame in the area, for the same policies """
+    max_w, max_h = size
+    if policy == 'stretch' or not w or not h:
+        return 0, 0, max_w, max_h
+    if policy == 'none':
+        return (max_w - w) // 2, 0, w, h
+    ratio = (max if policy == 'fill' else min)(max_w / float(w), max_h / float(h))
+    new_w, new_h = int(w * ratio), int(h * ratio)
+    return (max_w - new_w) // 2, (max_h - new_h) // 2, new_w, new_h
+
+
+class ScaledImageCache(object):
+    """ Shared by all outputs: each image is decoded once and scaled once per output size and policy.
+    The decoded images kept are limited to twice the per-image budget. """
+    def __init__(self, budget_bytes, logger=None):
+        self.budget_bytes = budget_bytes
+        self.logger = logger
+        self.images = collections.OrderedDict()  # (path, mtime, decode size) -> wx.Image or None if over the budget
+        self.bitmaps = {}  # (path, mtime, decode size, size, policy) -> wx.Bitmap
+
+    def bitmap(self, file_path, size, policy, decode_size=None):
+        """ `decode_size`: the largest output, the image is decoded once for all of them. None if not loadable. """
+        target = tuple(decode_size) if decode_size and policy != 'none' else None  # 'none' shows the full size
+        try:
+            image_key = (file_path, os.stat(file_path).st_mtime_ns, target)
+        except OSError as e:
+            if self.logger:
+                self.logger.log("[ZAD] Can't open %s: %s" % (file_path, e))
+            return None
+        key = image_key + (tuple(size), policy)
+        if key not in self.bitmaps:
+            if image_key not in self.images:
+                self.images[image_key] = load_image(file_path, target, self.budget_bytes, self.logger)
+                self._evict()
+            image = self.images[image_key]
+            self.bitmaps[key] = wx.Bitmap(scale_image(image, size, policy)) if image else None
+        self.images.move_to_end(image_key)
+        return self.bitmaps[key]
+
+    def _evict(self):
+        total = sum(img.GetWidth() * img.GetHeight() * 4 for img in self.images.values() if img)
+        while total > self.budget_bytes * 2 and len(self.images) > 1:
+            evicted, img = self.images.popitem(last=False)
+            total -= img.GetWidth() * img.GetHeight() * 4 if img else 0
+            self.bitmaps = {k: v for k, v in self.bitmaps.items() if k[:3] != evicted}
+
+
+class ProjectorGroup(object):
+    """ The projector outputs (main projector, side screens, stage monitor) switched together.
+    The first one is the primary: it drives the countdown end and gets the native VLC video window
+    when it is the only output. With several outputs the video comes from one VideoFrameTap. """
+    def __init__(self, main_window, outputs, video_tap=None):
+        self.main_window = main_window
+        self.cache = ScaledImageCache(main_window.config[Config.IMAGE_MEMORY_BUDGET] * 1024 * 1024,
+                                      main_window.logger)
+        self.windows = [ProjectorWindow(main_window, o.get('screen'), o.get('scaling', 'fit'), i == 0)
+                        for i, o in enumerate(outputs)]
+        self.video_tap = video_tap
+        if video_tap:
+            video_tap.on_frame = self.show_frame
+            for window in self.windows:
+                window.video_panel.Bind(wx.EVT_PAINT, window.on_video_paint)
+
+    @property
+    def primary(self):
+        return self.windows[0]
+
+    @property
+    def video_panel(self):
+        return self.primary.video_panel
+
+    @contextlib.contextmanager
+    def _frozen(self):
+        """ All outputs are repainted together after the change, nothing is decoded in between """
+        for window in self.windows:
+            window.Freeze()
+        try:
+            yield
+        finally:
+            for window in self.windows:
+                window.Thaw()
+
+    def _switch(self, method, *args):
+        with self._frozen():
+            return [getattr(window, method)(*args) for window in self.windows]
+
+    def Show(self):
+        for window in self.windows:
+            window.Show()
+
+    def Layout(self):
+        for window in self.windows:
+            window.Layout()
+
+    def Close(self, force=False):
+        self.primary.Close(force)
+
+    def Destroy(self):
+        if self.video_tap:
+            self.video_tap.on_frame = None
+        for window in self.windows:
+            window.countdown_panel.timer.Stop()
+            window.Destroy()
+        self.windows = []
+
+    def switch_to_video(self, e=None):
+        self._switch('switch_to_video')
+
+    def switch_to_images(self, e=None):
+        self._switch('switch_to_images')
+
+    def load_zad(self, file_path, fit=True):
+        sizes = [w.images_panel.GetSize() for w in self.windows]
+        decode_size = max(s[0] for s in sizes), max(s[1] for s in sizes)
+        pack = self.main_window.zad_pack
+        bitmaps = []
+        for window, size in zip(self.windows, sizes):
+            policy = window.scaling if fit else 'none'
+            bitmap = pack.frame(file_path, size, policy, wx.Bitmap.FromBuffer) if pack else None  # No decoding
+            bitmaps.append(bitmap or self.cache.bitmap(self.main_window.staged(file_path), size, policy,
+                                                       decode_size))
+        with self._frozen():
+            for window, bitmap in zip(self.windows, bitmaps):
+                window.set_zad_bitmap(bitmap)
+
+    def no_show(self):
+        self._switch('no_show')
+
+    def launch_timer(self, time, text):
+        return all(self._switch('launch_timer', time, text))
+
+    def show_frame(self):
+        for window in self.windows:
+            if window.video_panel.IsShown():
+                window.video_panel.Refresh(False)
 
 
 class ProjectorWindow(wx.Frame):
-    def __init__(self, parent, screen=None):
+    def __init__(self, parent, screen=None, scaling='fit', primary=True):
         self.main_window = parent
+        self.scaling = scaling if scaling in SCALING_POLICIES else 'fit'
+        self.primary = primary
 
         run_windowed = wx.Display.GetCount() <= screen or wx.Display.GetCount() < 2
         if screen is None or run_windowed:
@@ -31,7 +215,7 @@ class ProjectorWindow(wx.Frame):
                 wx.Image.SetDefaultLoadFlags(wx.Image.GetDefaultLoadFlags() & ~wxWidgetsConstants.wxImageLoad_Verbose)
 
                 self.SetBackgroundColour(wx.BLACK)
-                self.drawable_bitmap = wx.Bitmap(wx.Image(self.proj_window.w, self.proj_window.h))
+                self.drawable_bitmap = None  # Black
                 self.SetBackgroundStyle(wx.BG_STYLE_ERASE)
 
                 self.Bind(wx.EVT_SIZE, self.on_size)
@@ -51,8 +235,9 @@ class ProjectorWindow(wx.Frame):
                 if not w or not h:
                     return
                 dc.Clear()
-                drw_w = self.drawable_bitmap.GetWidth()
-                dc.DrawBitmap(self.drawable_bitmap, w//2 - drw_w//2, 0)
+                if self.drawable_bitmap:
+                    drw_w = self.drawable_bitmap.GetWidth()
+                    dc.DrawBitmap(self.drawable_bitmap, w//2 - drw_w//2, 0)
 
         self.images_panel = ImagesPanel(self)
 
@@ -123,8 +308,12 @@ class ProjectorWindow(wx.Frame):
                 self.time_left = self.time_end - datetime.now()
 
                 if self.time_left < timedelta(seconds=1):
+                    if not self.proj_window.primary:
+                        self.timer.Stop()  # The primary output ends the countdown for all of them
+                        return
+
                     def ui_upd():
-                        self.proj_window.switch_to_images()
+                        self.main_window.proj_win.switch_to_images()
                         self.main_window.clear_zad(status=u"Poehali !!!")
                     wx.CallAfter(ui_upd)
                     return
@@ -134,7 +323,8 @@ class ProjectorWindow(wx.Frame):
                 def ui_upd():
                     self.countdown_text.SetLabel(string_time[:string_time.find('.')])
                     self.Layout()
-                    self.main_window.image_status("Countdown: %s" % string_time)
+                    if self.proj_window.primary:
+                        self.main_window.image_status("Countdown: %s" % string_time)
                 wx.CallAfter(ui_upd)
 
         self.countdown_panel = CountdownPanel(self)
@@ -152,17 +342,22 @@ class ProjectorWindow(wx.Frame):
 
         self.Bind(wx.EVT_CLOSE, self.main_window.on_proj_win_close)
 
-    def load_zad(self, file_path, fit=True):
-        img = wx.Image(file_path, wx.BITMAP_TYPE_ANY)
-        if fit:
-            w, h = img.GetWidth(), img.GetHeight()
-            max_w, max_h = self.images_panel.GetSize()
-            target_ratio = min(max_w / float(w), max_h / float(h))
-            new_w, new_h = [int(x * target_ratio) for x in (w, h)]
-            img = img.Scale(new_w, new_h, wx.IMAGE_QUALITY_HIGH)
-        self.images_panel.drawable_bitmap = wx.Bitmap(img)
+    def set_zad_bitmap(self, bitmap):
+        self.images_panel.drawable_bitmap = bitmap
         self.images_panel.Refresh()
 
+    def on_video_paint(self, e):
+        """ Only with a VideoFrameTap, otherwise VLC draws into the panel itself """
+        dc = wx.PaintDC(self.video_panel)
+        tap = self.main_window.video_tap
+        if not tap or not tap.bitmap:
+            return
+        w, h = self.video_panel.GetClientSize()
+        x, y, draw_w, draw_h = scaled_rect(tap.bitmap.GetWidth(), tap.bitmap.GetHeight(), (w, h), self.scaling)
+        gc = wx.GraphicsContext.Create(dc)
+        gc.SetInterpolationQuality(wx.INTERPOLATION_FAST)
+        gc.DrawBitmap(tap.bitmap, x, y, draw_w, draw_h)
+
     def switch_to_video(self, e=None):
         if self.countdown_panel.IsShown():
             self.countdown_panel.timer.Stop()
@@ -200,8 +395,7 @@ class ProjectorWindow(wx.Frame):
         return True
 
     def no_show(self):
-        self.images_panel.drawable_bitmap = \
-            wx.Bitmap(wx.Image(*self.images_panel.drawable_bitmap.GetSize()))
+        self.images_panel.drawable_bitmap = None
         self.images_panel.Refresh()
 
 
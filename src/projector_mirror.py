@@ -0,0 +1,131 @@
+#!python3
+# -*- coding: utf-8 -*-
+# Confidence monitor of the primary projector output in the operator window, small and at a few frames per
+# second. It draws from the buffers that exist anyway: the scaled ZAD bitmap, the VideoFrameTap bitmap (several
+# outputs) and the countdown labels. When VLC draws into the projector window natively, small snapshots are
+# taken on a worker thread instead: memory rendering would put the projector video behind the GUI loop.
+
+import os
+import shutil
+import tempfile
+import threading
+
+import wx
+
+from projector import scaled_rect
+
+MIRROR_SIZE = (320, 180)
+FPS = 5
+
+
+class ProjectorMirror(wx.Panel):
+    def __init__(self, parent, main_window):
+        wx.Panel.__init__(self, parent, size=MIRROR_SIZE)
+        self.SetMinSize(MIRROR_SIZE)
+        self.SetBackgroundStyle(wx.BG_STYLE_PAINT)
+        self.main_window = main_window
+        self.snapshot = None  # wx.Bitmap, the last native video snapshot
+        self._snapshot_dir = None
+        self._snapshot_busy = False
+        self._snapshot_generation = 0  # Snapshots taken before stop() are dropped
+        self._shown = None  # (kind, content) painted last
+        self.timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.on_tick, self.timer)
+        self.Bind(wx.EVT_PAINT, self.on_paint)
+
+    def start(self):
+        self.timer.Start(1000 // FPS)
+
+    def stop(self):
+        self.timer.Stop()
+        self.snapshot = None
+        self._snapshot_busy = False
+        self._snapshot_generation += 1
+        if self._snapshot_dir:
+            shutil.rmtree(self._snapshot_dir, ignore_errors=True)
+            self._snapshot_dir = None
+
+    def source(self):
+        """ (kind, content) on the primary output: 'none', 'countdown' (labels), 'image' (the scaled ZAD bitmap),
+            'tap' (the video frame bitmap) or 'video' (the last snapshot) """
+        proj_win = self.main_window.proj_win
+        if not proj_win or not proj_win.windows:
+            return 'none', None
+        window = proj_win.primary
+        if window.countdown_panel.IsShown():
+            panel = window.countdown_panel
+            return 'countdown', (panel.info_text.GetLabel(), panel.countdown_text.GetLabel(),
+                                 panel.time_text.GetLabel())
+        if window.video_panel.IsShown():
+            tap = self.main_window.video_tap
+            return ('tap', tap.bitmap) if tap else ('video', self.snapshot)
+        return 'image', window.images_panel.drawable_bitmap
+
+    def on_tick(self, e):
+        if not self.IsShownOnScreen():
+            return
+        kind, content = self.source()
+        if kind != 'video':
+            self.snapshot = None  # Not shown with the next video
+        if kind == 'video' and not self._snapshot_busy and self.main_window.is_playing:
+            self._snapshot_busy = True
+            if not self._snapshot_dir:
+                self._snapshot_dir = tempfile.mkdtemp(prefix='fest_mirror_')
+            threading.Thread(target=self._take_snapshot, name="MirrorSnapshot", daemon=True,
+                             args=(os.path.join(self._snapshot_dir, 'mirror.png'),
+                                   self._snapshot_generation)).start()
+        if kind == 'tap' or not self._shown or kind != self._shown[0] or \
+                (content != self._shown[1] if kind == 'countdown' else content is not self._shown[1]):
+            self._shown = kind, content
+            self.Refresh(False)
+
+    def _take_snapshot(self, file_path, generation):
+        """ VLC scales and encodes it on its own threads, the projector output is untouched """
+        ok = False
+        try:
+            ok = self.main_window.player.video_take_snapshot(0, file_path, MIRROR_SIZE[0], 0) == 0
+        finally:  # The next tick must be able to take another one whatever happened
+            wx.CallAfter(self._snapshot_taken, file_path if ok else None, generation)
+
+    def _snapshot_taken(self, file_path, generation):
+        if generation != self._snapshot_generation:  # Stopped meanwhile, the folder is gone
+            return
+        self._snapshot_busy = False
+        if file_path and os.path.isfile(file_path):
+            self.snapshot = wx.Bitmap(file_path, wx.BITMAP_TYPE_PNG)
+
+    def on_paint(self, e):
+        dc = wx.AutoBufferedPaintDC(self)
+        dc.SetBackground(wx.BLACK_BRUSH)
+        dc.Clear()
+        w, h = self.GetClientSize()
+        kind, content = self.source()
+        if kind == 'none':
+            dc.SetTextForeground(wx.Colour(128, 128, 128))
+            dc.DrawLabel(_("No projector window"), wx.Rect(0, 0, w, h), wx.ALIGN_CENTER)
+            return
+        if kind == 'countdown':
+            dc.SetTextForeground(wx.WHITE)
+            dc.DrawLabel("\n".join(content), wx.Rect(0, 0, w, h), wx.ALIGN_CENTER)
+            return
+        if not content or not content.IsOk():
+            return
+        bw, bh = content.GetWidth(), content.GetHeight()
+        window = self.main_window.proj_win.primary
+        if kind == 'video':  # The snapshot has the video aspect already
+            rect = scaled_rect(bw, bh, (w, h), 'fit')
+        else:  # Where the bitmap lands on the projector panel, scaled down to the mirror
+            panel = window.images_panel if kind == 'image' else window.video_panel
+            pw, ph = panel.GetClientSize()
+            if not pw or not ph:
+                return
+            if kind == 'image':
+                x, y, draw_w, draw_h = pw // 2 - bw // 2, 0, bw, bh
+            else:
+                x, y, draw_w, draw_h = scaled_rect(bw, bh, (pw, ph), window.scaling)
+            k = min(w / pw, h / ph)
+            ox, oy = (w - pw * k) / 2, (h - ph * k) / 2
+            rect = ox + x * k, oy + y * k, draw_w * k, draw_h * k
+        gc = wx.GraphicsContext.Create(dc)
+        gc.SetInterpolationQuality(wx.INTERPOLATION_FAST)
+        gc.DrawBitmap(content, *rect)
@@ -0,0 +1,250 @@
+# Optional remote control for stage managers: HTTP + WebSocket on an asyncio loop in its own thread.
+# Only the standard library is used. Actions are forwarded to `dispatch(action, arg)`, which is expected to
+# marshal them to the GUI thread. The state stream is diff-based: each change is encoded once for all clients.
+
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import threading
+from urllib.parse import urlsplit, parse_qs
+
+WS_MAGIC = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_BODY = 64 * 1024  # Requests and WebSocket messages, the remote page sends a few bytes
+_MISSING = object()
+
+INDEX_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><meta name="viewport" content="width=device-width">
+<title>Fest Engine Remote</title>
+<style>body{font-family:sans-serif;background:#222;color:#eee}button{font-size:1.5em;margin:.2em;padding:.5em}
+#stop{background:#c00;color:#fff}pre{font-size:1.2em}</style></head><body>
+<div id="buttons"></div><pre id="state">Connecting...</pre>
+<script>
+var token = new URLSearchParams(location.search).get('token') || '';
+var actions = %s, state = {};
+actions.forEach(function (a) {
+  var b = document.createElement('button'); b.textContent = a; if (a == 'emergency_stop') b.id = 'stop';
+  b.onclick = function () { ws.send(JSON.stringify({action: a})); };
+  document.getElementById('buttons').appendChild(b);
+});
+var ws = new WebSocket((location.protocol == 'https:' ? 'wss://' : 'ws://') + location.host + '/ws?token=' + token);
+ws.onmessage = function (m) {
+  Object.assign(state, JSON.parse(m.data));
+  document.getElementById('state').textContent = JSON.stringify(state, null, 1);
+};
+ws.onclose = function () { document.getElementById('state').textContent = 'Disconnected'; };
+</script></body></html>"""
+
+
+class RemoteControlServer(object):
+    def __init__(self, host, port, dispatch, actions, token='', logger=None, arg_actions=()):
+        """ `arg_actions`: the actions that are rejected without an argument """
+        self.host = host
+        self.port = port
+        self.dispatch = dispatch
+        self.actions = actions
+        self.arg_actions = set(arg_actions)
+        self.token = token
+        self.logger = logger
+
+        self.state = {}
+        self.clients = set()
+        self.loop = None
+        self._server = None
+        self._thread = None
+
+    def _log(self, msg):
+        if self.logger:
+            self.logger.log("[Remote] " + msg)
+
+    # ------------------------------------------------ Lifecycle ------------------------------------------------
+
+    def start(self):
+        """ Returns after the socket is bound, raises OSError if it can not be """
+        started = threading.Event()
+        error = []
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            try:
+                self._server = self.loop.run_until_complete(
+                    asyncio.start_server(self._on_connection, self.host, self.port))
+            except OSError as e:
+                error.append(e)
+                started.set()
+                self.loop.close()
+                return
+            self.port = self._server.sockets[0].getsockname()[1]
+            started.set()
+            self.loop.run_forever()
+
+            self._server.close()
+            for writer in list(self.clients):
+                writer.close()
+            self.loop.run_until_complete(self._server.wait_closed())
+            self.loop.close()
+
+        self._thread = threading.Thread(target=run, name="RemoteControlServer", daemon=True)
+        self._thread.start()
+        started.wait()
+        if error:
+            self._thread = None
+            raise error[0]
+        self._log("Listening on %s:%d" % (self.host, self.port))
+
+    def stop(self):
+        if self._thread:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            self._thread = None
+            self.clients = set()
+            self._log("Stopped")
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    # ------------------------------------------------ State push ------------------------------------------------
+
+    def publish(self, state):
+        """ Thread-safe. Only the keys that differ from the previous state are pushed. """
+        if self._thread:  # Through the loop even without clients, one may be connecting right now
+            self.loop.call_soon_threadsafe(self._publish, dict(state))
+        else:
+            self.state = dict(state)
+
+    def _publish(self, state):
+        diff = {k: v for k, v in state.items() if self.state.get(k, _MISSING) != v}
+        self.state = state
+        if not diff or not self.clients:
+            return
+        frame = ws_frame(json.dumps(diff, ensure_ascii=False).encode('utf-8'))
+        for writer in list(self.clients):
+            if writer.transport.get_write_buffer_size() > 1024 * 1024:  # Stuck client, do not hog the memory
+                writer.close()
+                self.clients.discard(writer)
+            else:
+                writer.write(frame)
+
+    # ------------------------------------------------ Protocol ------------------------------------------------
+
+    async def _on_connection(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, value = line.decode('latin-1').split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', 0))
+            if not 0 <= length <= MAX_BODY:
+                return self._respond(writer, 413, {'error': 'Request body too large'})
+            body = await reader.readexactly(length)
+
+            url = urlsplit(target)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if self.token and self.token not in (query.get('token'), headers.get('x-fest-token')):
+                return self._respond(writer, 403, {'error': 'Invalid token'})
+
+            if url.path == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+                await self._websocket(reader, writer, headers)
+            elif url.path == '/' and method == 'GET':
+                self._respond(writer, 200, INDEX_HTML % json.dumps(self.actions), 'text/html')
+            elif url.path == '/state' and method == 'GET':
+                self._respond(writer, 200, self.state)
+            elif url.path.startswith('/action/') and method == 'POST':
+                action = url.path[len('/action/'):]
+                arg = query.get('arg')
+                if body and not arg:
+                    arg = json.loads(body.decode('utf-8')).get('arg')
+                self._respond(writer, *self._run(action, arg))
+            else:
+                self._respond(writer, 404, {'error': 'Not found'})
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError) as e:
+            self._log("Bad request: %s" % e)
+        finally:
+            if writer not in self.clients:
+                writer.close()
+
+    def _run(self, action, arg):
+        if action not in self.actions:
+            return 404, {'error': 'Unknown action %s' % action}
+        if action in self.arg_actions and (arg is None or str(arg).strip() == ''):
+            return 400, {'error': 'Action %s needs an arg' % action}
+        self.dispatch(action, arg)
+        return 202, {'ok': True}
+
+    @staticmethod
+    def _respond(writer, code, body, content_type='application/json'):
+        if not isinstance(body, str):
+            body = json.dumps(body, ensure_ascii=False)
+        body = body.encode('utf-8')
+        reason = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+                  413: 'Payload Too Large'}[code]
+        writer.write(("HTTP/1.1 %d %s\r\nContent-Type: %s; charset=utf-8\r\nContent-Length: %d\r\n"
+                      "Connection: close\r\n\r\n" % (code, reason, content_type, len(body))).encode('latin-1') + body)
+
+    async def _websocket(self, reader, writer, headers):
+        accept = base64.b64encode(hashlib.sha1(headers['sec-websocket-key'].encode() + WS_MAGIC).digest())
+        writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+        writer.write(ws_frame(json.dumps(self.state, ensure_ascii=False).encode('utf-8')))
+        self.clients.add(writer)
+        self._log("Client connected: %s" % (writer.get_extra_info('peername'),))
+        try:
+            while True:
+                opcode, payload = await ws_read_frame(reader)
+                if opcode == 0x8:  # Close
+                    writer.write(ws_frame(b'', 0x8))
+                    break
+                elif opcode == 0x9:  # Ping
+                    writer.write(ws_frame(payload, 0xA))
+                elif opcode == 0x1:
+                    try:
+                        command = json.loads(payload.decode('utf-8'))
+                        code, result = self._run(command['action'], command.get('arg'))
+                    except (ValueError, KeyError, TypeError) as e:
+                        result = {'error': str(e)}
+                    if 'error' in result:
+                        writer.write(ws_frame(json.dumps(result).encode('utf-8')))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+
+def ws_frame(payload, opcode=0x1):
+    """ Unmasked server-to-client frame """
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+
+async def ws_read_frame(reader):
+    """ Returns (opcode, payload), fragmented messages are not expected from the remote page """
+    b1, b2 = await reader.readexactly(2)
+    length = b2 & 0x7F
+    if length == 126:
+        length, = struct.unpack('!H', await reader.readexactly(2))
+    elif length == 127:
+        length, = struct.unpack('!Q', await reader.readexactly(8))
+    if length > MAX_BODY:
+        raise ConnectionError("WebSocket message of %d bytes" % length)
+    mask = await reader.readexactly(4) if b2 & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return b1 & 0x0F, payload
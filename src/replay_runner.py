@@ -0,0 +1,164 @@
+#!python3
+# -*- coding: utf-8 -*-
+# Headless replay of a recorded operator input trace against the same session: VLC has dummy audio/video outputs,
+# on Linux a virtual display (Xvfb) is started when there is none. The show starts from the state recorded at
+# the beginning of the trace and the live show state journal is not touched. Reports the per-cue latency
+# distributions and the GUI event loop delays, and compares them with a stored baseline (exit code 1 on regressions).
+#
+#   python replay_runner.py Fest.traces/input-20180505-120000.jsonl --baseline baseline.json --report report.json
+
+import argparse
+import collections
+import importlib.machinery
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from input_trace import load_trace, summarize, compare
+
+DUMMY_VLC_ARGUMENTS = "--aout=dummy --vout=dummy --no-video-title-show"
+
+
+def start_virtual_display():
+    """ Xvfb process or None when a display exists or Xvfb is not installed """
+    if not sys.platform.startswith('linux') or os.environ.get('DISPLAY') or not shutil.which('Xvfb'):
+        return None
+    display = ':%d' % (90 + os.getpid() % 10)
+    xvfb = subprocess.Popen(['Xvfb', display, '-screen', '0', '1920x1080x24'],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ['DISPLAY'] = display
+    time.sleep(1)
+    return xvfb
+
+
+def load_main_module():
+    """ main.pyw is not importable by name outside of Windows """
+    main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.pyw')
+    loader = importlib.machinery.SourceFileLoader('fest_main', main_path)
+    spec = importlib.util.spec_from_loader('fest_main', loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+
+class ReplayRunner(object):
+    def __init__(self, wx, frame, events, speed=1.0, lag_interval_ms=10, settle_s=3.0):
+        self.wx = wx
+        self.frame = frame
+        self.events = events
+        self.speed = speed
+        self.lag_interval_ms = lag_interval_ms
+        self.settle_s = settle_s
+        self.dispatch_delays = []
+        self.handler_times = collections.defaultdict(list)
+        self.loop_lags = []
+        self.skipped = []
+        self.cue_trace = []
+        self.start = None
+        self.lag_timer = None
+        self._last_tick = None
+
+    def run(self):
+        """ Called once the session is loaded, the events are replayed on their recorded schedule """
+        self.start = time.monotonic()
+        self.lag_timer = self.wx.Timer()
+        self.lag_timer.Bind(self.wx.EVT_TIMER, self.on_lag_tick)
+        self._last_tick = time.monotonic()
+        self.lag_timer.Start(self.lag_interval_ms)
+        for i, event in enumerate(self.events):
+            self.wx.CallLater(max(1, int(event['t'] / self.speed)), self.dispatch, i)
+        last = self.events[-1]['t'] / self.speed if self.events else 0
+        self.wx.CallLater(int(last + self.settle_s * 1000), self.finish_when_idle)
+
+    def on_lag_tick(self, e):
+        now = time.monotonic()
+        self.loop_lags.append(max(0.0, (now - self._last_tick) * 1000 - self.lag_interval_ms))
+        self._last_tick = now
+
+    def dispatch(self, i):
+        event = self.events[i]
+        planned = self.start + event['t'] / self.speed / 1000.0
+        started = time.monotonic()
+        self.dispatch_delays.append((started - planned) * 1000)
+        if not self.frame.replay_input(event['action'], event.get('arg')):
+            self.skipped.append(event)
+        self.handler_times[event['action']].append((time.monotonic() - started) * 1000)
+
+    def finish_when_idle(self):
+        if any(self.frame.cues.busy(lane) for lane in ('main', 'bg')):
+            self.wx.CallLater(200, self.finish_when_idle)
+            return
+        self.lag_timer.Stop()
+        self.cue_trace = list(self.frame.cues.trace)  # The frame is gone after closing
+        self.frame.Close(True)
+
+    def report(self):
+        cues = collections.defaultdict(list)
+        for entry in self.cue_trace:
+            if entry['outcome'] == 'done':
+                kind = '%s/%s' % (entry['lane'], entry['name'].split(' ')[0])  # 'play 142' -> 'main/play'
+                cues[kind].append(entry['start_latency_ms'] + (entry['run_ms'] or 0))
+        return {'actions': {action: summarize(times) for action, times in self.handler_times.items()},
+                'cues': {kind: summarize(times) for kind, times in cues.items()},
+                'event_loop': {'dispatch_delay': summarize(self.dispatch_delays),
+                               'timer_lag': summarize(self.loop_lags)},
+                'skipped': len(self.skipped)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays an operator input trace and reports the latencies")
+    parser.add_argument('trace')
+    parser.add_argument('--session', help="The .fest file, by default the one recorded in the trace")
+    parser.add_argument('--speed', type=float, default=1.0, help="Replay speed factor")
+    parser.add_argument('--report', help="Writes the report JSON here")
+    parser.add_argument('--baseline', help="Compares with this report JSON")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    header, events = load_trace(args.trace)
+    session = os.path.abspath(args.session or header.get('session', ''))
+    if not os.path.isfile(session):
+        parser.error("Session %s not found" % session)
+
+    xvfb = start_virtual_display()
+    try:
+        import wx
+        fest_main = load_main_module()
+        app = wx.App(False)
+        frame = fest_main.MainWindow(None, "Replay", session=session, replay=True, initial_state=header.get('state'),
+                                     config_overrides={fest_main.Config.VLC_ARGUMENTS: DUMMY_VLC_ARGUMENTS,
+                                                       fest_main.Config.RECORD_INPUT: False,
+                                                       fest_main.Config.REMOTE_CONTROL_ADDRESS: "",
+                                                       fest_main.Config.OSC_LISTEN_ADDRESS: "",
+                                                       fest_main.Config.TIMECODE_OUTPUT_ADDRESS: "",
+                                                       fest_main.Config.ARTNET_OUTPUT_ADDRESS: "",
+                                                       fest_main.Config.REPLICATION_ROLE: ""})
+        runner = ReplayRunner(wx, frame, events, args.speed)
+        wx.CallLater(2000, runner.run)  # The session loads first
+        app.MainLoop()
+    finally:
+        if xvfb:
+            xvfb.terminate()
+
+    report = runner.report()
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if runner.skipped:
+        print("%d inputs could not be replayed" % len(runner.skipped))
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
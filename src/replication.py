@@ -0,0 +1,406 @@
+# Hot standby: the primary streams its live state over TCP to a standby FestEngine on another laptop. The grid
+# state comes from the show journal records (row colors, notes, dup and countdown rows, cursor, bg marks), the
+# playback (item, position, bg track and position) is sampled by the GUI and sent with every heartbeat.
+# Frames are compact binary deltas, with a full snapshot on connection and periodically, so a standby that
+# missed something converges. The standby follows the state and fails over on a manual command or when the
+# heartbeats stop.
+# Nothing here fences the old primary: lost heartbeats may only be a cut cable, and then both machines play the
+# show. Automatic failover is only safe when the primary is cut off for sure (its power or its outputs switched
+# with the failover); after a takeover the old primary is watched and its return is reported loudly.
+#
+# Frame: type (1 byte), payload length (4 bytes), payload. Types:
+#   S  snapshot, zlib-compressed JSON of ShowState.to_dict()
+#   R  row set / I row insert: seq, row, r, g, b, cols;  D  row delete: seq, row;  C  cursor: seq, row
+#   B  bg marks: seq, track, JSON marks;  P  playback (heartbeat);  Q  the primary stops on purpose
+
+import collections
+import copy
+import json
+import queue
+import socket
+import struct
+import threading
+import time
+import zlib
+
+from osc_input import parse_address
+from show_journal import ShowState
+
+FRAME = struct.Struct('<cI')
+ROW = struct.Struct('<IiBBB')
+SEQ_ROW = struct.Struct('<Ii')
+PLAYBACK = struct.Struct('<qBqB')
+STR_LEN = struct.Struct('<H')
+
+Playback = collections.namedtuple('Playback', 'num pos_ms playing bg_path bg_pos_ms bg_playing received')
+NO_PLAYBACK = Playback('', 0, False, '', 0, False, 0.0)
+
+
+def _pack_strings(strings):
+    out = [STR_LEN.pack(len(strings))]
+    for s in strings:
+        b = s.encode('utf-8')
+        out.append(STR_LEN.pack(len(b)) + b)
+    return b''.join(out)
+
+
+def _unpack_strings(data, offset=0):
+    (count,), offset = STR_LEN.unpack_from(data, offset), offset + STR_LEN.size
+    strings = []
+    for _ in range(count):
+        (length,), offset = STR_LEN.unpack_from(data, offset), offset + STR_LEN.size
+        strings.append(data[offset:offset + length].decode('utf-8'))
+        offset += length
+    return strings, offset
+
+
+def frame(kind, payload=b''):
+    return FRAME.pack(kind, len(payload)) + payload
+
+
+def encode_record(record):
+    """ A show journal record as a frame """
+    op = record['o']
+    if op in ('row', 'ins'):
+        return frame(b'R' if op == 'row' else b'I', ROW.pack(record['s'], record['r'], *record['c']) +
+                     _pack_strings(record['v']))
+    if op in ('del', 'cur'):
+        return frame(b'D' if op == 'del' else b'C', SEQ_ROW.pack(record['s'], record['r']))
+    if op == 'bg':
+        return frame(b'B', SEQ_ROW.pack(record['s'], record['i']) +
+                     json.dumps(record['m'], ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+    raise ValueError("Unknown record %r" % op)
+
+
+def encode_snapshot(state_dict):
+    return frame(b'S', zlib.compress(json.dumps(state_dict, ensure_ascii=False,
+                                                separators=(',', ':')).encode('utf-8')))
+
+
+def encode_playback(num, pos_ms, playing, bg_path, bg_pos_ms, bg_playing):
+    return frame(b'P', PLAYBACK.pack(int(pos_ms), playing, int(bg_pos_ms), bg_playing) +
+                 _pack_strings([num or '', bg_path or '']))
+
+
+def decode(kind, payload):
+    """ A journal record, {'o': 'snap', 'state': ShowState}, a Playback (without `received`) or None (bye) """
+    if kind in (b'R', b'I'):
+        seq, row, r, g, b = ROW.unpack_from(payload)
+        cols, _ = _unpack_strings(payload, ROW.size)
+        return {'o': 'row' if kind == b'R' else 'ins', 's': seq, 'r': row, 'v': cols, 'c': [r, g, b]}
+    if kind in (b'D', b'C'):
+        seq, row = SEQ_ROW.unpack(payload)
+        return {'o': 'del' if kind == b'D' else 'cur', 's': seq, 'r': row}
+    if kind == b'B':
+        seq, track = SEQ_ROW.unpack_from(payload)
+        return {'o': 'bg', 's': seq, 'i': track, 'm': json.loads(payload[SEQ_ROW.size:].decode('utf-8'))}
+    if kind == b'S':
+        return {'o': 'snap', 'state': ShowState.from_dict(json.loads(zlib.decompress(payload).decode('utf-8')))}
+    if kind == b'P':
+        pos_ms, playing, bg_pos_ms, bg_playing = PLAYBACK.unpack_from(payload)
+        (num, bg_path), _ = _unpack_strings(payload, PLAYBACK.size)
+        return Playback(num, pos_ms, bool(playing), bg_path, bg_pos_ms, bool(bg_playing), 0.0)
+    if kind == b'Q':
+        return None
+    raise ValueError("Unknown frame %r" % kind)
+
+
+class _Peer(object):
+    """ A standby connection: frames are queued and sent from its own thread, a slow one is dropped """
+
+    def __init__(self, sock, address, on_closed, max_queue=10000):
+        self.sock = sock
+        self.address = address
+        self.ready = False  # Gets records once its snapshot is queued
+        self._queue = queue.Queue(max_queue)
+        self._on_closed = on_closed
+        self._thread = threading.Thread(target=self._run, name="ReplicationPeer", daemon=True)
+        self._thread.start()
+
+    def send(self, data):
+        try:
+            self._queue.put_nowait(data)
+        except queue.Full:
+            self.close()
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _run(self):
+        try:
+            while True:
+                data = self._queue.get()
+                if data is None:
+                    break
+                self.sock.sendall(data)
+        except OSError:
+            pass
+        self.sock.close()
+        self._on_closed(self)
+
+
+class ReplicationPrimary(object):
+    def __init__(self, listen_address, journal, logger=None, heartbeat_s=0.25, snapshot_s=30):
+        self.listen_address = parse_address(listen_address)
+        self.journal = journal
+        self.logger = logger
+        self.heartbeat_s = heartbeat_s
+        self.snapshot_s = snapshot_s
+        self.port = None
+        self._lock = threading.Lock()
+        self._peers = set()
+        self._playback = encode_playback('', 0, False, '', 0, False)
+        self._sock = None
+        self._threads = []
+        self._stopped = threading.Event()
+
+    def _log(self, msg):
+        if self.logger:
+            self.logger.log("[Replication] " + msg)
+
+    def start(self):
+        """ Raises OSError if the address can not be bound """
+        self._sock = socket.create_server(self.listen_address)
+        self._sock.settimeout(0.5)  # To see the stop
+        self.port = self._sock.getsockname()[1]
+        self.journal.listeners.append(self._on_record)
+        self._threads = [threading.Thread(target=self._accept, name="ReplicationAccept", daemon=True),
+                         threading.Thread(target=self._heartbeat, name="ReplicationHeartbeat", daemon=True)]
+        [t.start() for t in self._threads]
+        self._log("Primary on %s:%d" % (self.listen_address[0], self.port))
+
+    def stop(self):
+        if not self._sock:
+            return
+        self._stopped.set()
+        self.journal.listeners.remove(self._on_record)
+        [t.join() for t in self._threads]
+        self._sock.close()
+        self._sock = None
+        with self._lock:
+            peers = list(self._peers)
+        for peer in peers:
+            peer.send(frame(b'Q'))
+            peer.send(None)
+
+    @property
+    def standbys(self):
+        with self._lock:
+            return len(self._peers)
+
+    def set_playback(self, num, pos_ms, playing, bg_path, bg_pos_ms, bg_playing):
+        """ From the GUI, sent with the next heartbeat """
+        self._playback = encode_playback(num, pos_ms, playing, bg_path, bg_pos_ms, bg_playing)
+
+    def _send_ready(self, data):
+        with self._lock:
+            peers = [peer for peer in self._peers if peer.ready]
+        for peer in peers:
+            peer.send(data)
+
+    def _on_record(self, record):
+        """ On the journal writer thread """
+        self._send_ready(encode_record(record))
+
+    def _snapshot(self, peer=None):
+        """ Queued on the journal writer thread, so it is in order with the records """
+        def send(state_dict):
+            data = encode_snapshot(state_dict)
+            if peer:
+                peer.send(data)
+                peer.ready = True
+            else:
+                self._send_ready(data)
+        self.journal.request_snapshot(send)
+
+    def _accept(self):
+        while not self._stopped.is_set():
+            try:
+                sock, address = self._sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            sock.settimeout(None)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            peer = _Peer(sock, address, self._on_peer_closed)
+            with self._lock:
+                self._peers.add(peer)
+            peer.send(self._playback)
+            self._snapshot(peer)
+            self._log("Standby %s:%d connected" % address)
+
+    def _on_peer_closed(self, peer):
+        with self._lock:
+            self._peers.discard(peer)
+        if not self._stopped.is_set():
+            self._log("Standby %s:%d disconnected" % peer.address)
+
+    def _heartbeat(self):
+        last_snapshot = time.monotonic()
+        while not self._stopped.wait(self.heartbeat_s):
+            self._send_ready(self._playback)
+            if time.monotonic() - last_snapshot >= self.snapshot_s:
+                self._snapshot()
+                last_snapshot = time.monotonic()
+
+
+class ReplicationStandby(object):
+    def __init__(self, primary_address, on_records, on_playback=None, on_lost=None, logger=None, timeout_s=2.0,
+                 retry_s=0.5):
+        """ Called from the standby thread: `on_records([record])` with the journal records and snapshots
+            ({'o': 'snap', 'state': ShowState}) to apply, `on_playback(playback)` when the item or the bg track
+            changes, `on_lost(reason)` once when the primary is gone without saying bye. """
+        self.primary_address = parse_address(primary_address)
+        self.on_records = on_records
+        self.on_playback = on_playback
+        self.on_lost = on_lost
+        self.logger = logger
+        self.timeout_s = timeout_s
+        self.retry_s = retry_s
+        self.state = None  # ShowState mirror
+        self.playback = NO_PLAYBACK
+        self.connected = False
+        self.lost = False
+        self._sock = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def _log(self, msg):
+        if self.logger:
+            self.logger.log("[Replication] " + msg)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="ReplicationStandby", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread:
+            self._stopped.set()
+            if self._sock:
+                try:
+                    self._sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            self._thread.join()
+            self._thread = None
+
+    def position(self):
+        """ (item num, position now, playing, bg path, bg position now, bg playing) of the primary """
+        p = self.playback
+        elapsed = (time.monotonic() - p.received) * 1000 if p.received else 0
+        return p.num, p.pos_ms + (elapsed if p.playing else 0), p.playing, \
+            p.bg_path, p.bg_pos_ms + (elapsed if p.bg_playing else 0), p.bg_playing
+
+    def _lose(self, reason):
+        if not self.lost and not self._stopped.is_set():
+            self.lost = True
+            self._log("Primary lost: %s" % reason)
+            if self.on_lost:
+                self.on_lost(reason)
+
+    def _recv(self, sock, n):
+        data = b''
+        while len(data) < n:
+            chunk = sock.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError("connection closed")
+            data += chunk
+        return data
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self._sock = socket.create_connection(self.primary_address, timeout=self.timeout_s)
+            except OSError:
+                self._stopped.wait(self.retry_s)
+                continue
+            self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.connected, self.lost = True, False
+            self._log("Following the primary %s:%d" % self.primary_address)
+            try:
+                self._follow(self._sock)
+            except socket.timeout:
+                self._lose("no heartbeat for %.1fs" % self.timeout_s)
+            except (OSError, ValueError, struct.error, zlib.error) as e:
+                self._lose(str(e))
+            self.connected = False
+            self._sock.close()
+            self._stopped.wait(self.retry_s)
+
+    def _follow(self, sock):
+        while not self._stopped.is_set():
+            kind, length = FRAME.unpack(self._recv(sock, FRAME.size))
+            message = decode(kind, self._recv(sock, length))
+            if message is None:
+                self._log("The primary stopped")
+                self.lost = True  # Not a failure: no failover
+                return
+            if isinstance(message, Playback):
+                previous, self.playback = self.playback, message._replace(received=time.monotonic())
+                if self.on_playback and (message.num, message.bg_path) != (previous.num, previous.bg_path):
+                    self.on_playback(self.playback)
+                continue
+            if message['o'] == 'snap':  # The callback gets its own copy
+                self.state = ShowState.from_dict(copy.deepcopy(message['state'].to_dict()))
+            elif not self.state or message['s'] <= self.state.seq:  # Already in the snapshot
+                continue
+            else:
+                try:
+                    self.state.apply(message)
+                except (IndexError, KeyError) as e:
+                    self._log("Out of sync (%s), waiting for the next snapshot" % e)
+                    self.state = None
+                    continue
+            self.on_records([message])
+
+
+class PrimaryWatch(object):
+    def __init__(self, primary_address, on_back, logger=None, timeout_s=2.0, retry_s=1.0):
+        """ After a takeover: `on_back()` is called from the watch thread every time the old primary answers
+            again. The connection is kept like a standby's, so the primary does not log one per retry. """
+        self.primary_address = parse_address(primary_address)
+        self.on_back = on_back
+        self.logger = logger
+        self.timeout_s = timeout_s
+        self.retry_s = retry_s
+        self._sock = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="PrimaryWatch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread:
+            self._stopped.set()
+            if self._sock:
+                try:
+                    self._sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self._sock = socket.create_connection(self.primary_address, timeout=self.timeout_s)
+            except OSError:
+                self._stopped.wait(self.retry_s)
+                continue
+            try:
+                if self._sock.recv(FRAME.size) and not self._stopped.is_set():  # It sends a snapshot first
+                    if self.logger:
+                        self.logger.log("[Replication] The old primary %s:%d is back" % self.primary_address)
+                    self.on_back()
+                    while not self._stopped.is_set() and self._sock.recv(64 * 1024):
+                        pass
+            except OSError:
+                pass
+            self._sock.close()
+            self._stopped.wait(self.retry_s)
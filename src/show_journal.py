@@ -0,0 +1,226 @@
+# Crash-safe journal of the operator's live state (row colors, notes, dup and countdown rows, cursor, bg track).
+# The state lives next to the .fest file as a snapshot plus an append-only journal of compact JSON records.
+# Recording only puts records into a queue, all the file work happens on a background thread.
+
+import json
+import os
+import queue
+import threading
+import time
+
+
+class ShowState(object):
+    """ In-memory model of the grid, the same shape as `MainWindow.full_grid_data` """
+
+    def __init__(self, cols=None, rows=None, cursor=0, bg=None):
+        self.cols = cols or []
+        self.rows = rows or []  # [{'cols': [...], 'color': [r, g, b]}, ...]
+        self.cursor = cursor
+        self.bg = bg or {'track': -1, 'marks': {}}  # marks: {path: [r, g, b]}
+        self.seq = 0
+
+    def apply(self, record):
+        op = record['o']
+        if op == 'row':
+            self.rows[record['r']] = {'cols': record['v'], 'color': record['c']}
+        elif op == 'ins':
+            self.rows.insert(record['r'], {'cols': record['v'], 'color': record['c']})
+        elif op == 'del':
+            del self.rows[record['r']]
+        elif op == 'cur':
+            self.cursor = record['r']
+        elif op == 'bg':
+            self.bg = {'track': record['i'], 'marks': record['m']}
+        self.seq = record['s']
+
+    def to_dict(self):
+        return {'seq': self.seq, 'cols': self.cols, 'rows': self.rows, 'cursor': self.cursor, 'bg': self.bg}
+
+    @classmethod
+    def from_dict(cls, d):
+        state = cls(d['cols'], d['rows'], d['cursor'], d['bg'])
+        state.seq = d['seq']
+        return state
+
+
+class ShowJournal(object):
+    def __init__(self, base_path, logger=None, fsync_interval=0.2, compact_interval=30, compact_records=2000):
+        self.snapshot_path = base_path + '.snapshot'
+        self.journal_path = base_path + '.journal'
+        self.logger = logger
+        self.fsync_interval = fsync_interval
+        self.compact_interval = compact_interval
+        self.compact_records = compact_records
+
+        self.state = None
+        self.listeners = []  # Called from the writer thread with each record
+        self._queue = queue.Queue()
+        self._thread = None
+        self._file = None
+        self._records_since_compact = 0
+        self._last_compact = 0
+
+    def _log(self, msg):
+        if self.logger:
+            self.logger.log("[Journal] " + msg)
+
+    # ------------------------------------------------ Recovery ------------------------------------------------
+
+    @property
+    def exists(self):
+        return os.path.isfile(self.snapshot_path)
+
+    def load(self):
+        """ Returns the ShowState stored on disk or None. The last torn record is silently dropped. """
+        if not self.exists:
+            return None
+        start = time.perf_counter()
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                state = ShowState.from_dict(json.load(f))
+        except (ValueError, KeyError) as e:
+            self._log("Broken snapshot %s: %s" % (self.snapshot_path, e))
+            return None
+
+        replayed = 0
+        if os.path.isfile(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        self._log("Torn record dropped: %r" % line[:80])
+                        break
+                    if record['s'] <= state.seq:  # Already in the snapshot (crashed between compaction steps)
+                        continue
+                    try:
+                        state.apply(record)
+                    except (IndexError, KeyError) as e:
+                        self._log("Inconsistent record %r dropped: %s" % (record, e))
+                        break
+                    replayed += 1
+        self._log("Restored %d rows and %d records in %.1fms" %
+                  (len(state.rows), replayed, (time.perf_counter() - start) * 1000))
+        return state
+
+    def discard(self):
+        self.stop()
+        for p in (self.snapshot_path, self.journal_path):
+            if os.path.isfile(p):
+                os.remove(p)
+        self.state = None
+
+    # ------------------------------------------------ Recording ------------------------------------------------
+
+    def start(self, state):
+        """ Writes `state` as a fresh snapshot and starts recording on top of it """
+        self.stop()
+        self.state = state
+        self._thread = threading.Thread(target=self._writer, name="ShowJournal", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def record(self, op, **fields):
+        """ Thread-safe and never blocks """
+        if self._thread:
+            fields['o'] = op
+            self._queue.put(fields)
+
+    def set_row(self, row, cols, color):
+        self.record('row', r=row, v=cols, c=color)
+
+    def insert_row(self, row, cols, color):
+        self.record('ins', r=row, v=cols, c=color)
+
+    def delete_row(self, row):
+        self.record('del', r=row)
+
+    def set_cursor(self, row):
+        self.record('cur', r=row)
+
+    def set_bg(self, track, marks):
+        self.record('bg', i=track, m=marks)
+
+    def request_snapshot(self, callback):
+        """ `callback(state dict)` on the writer thread, in order with the records. The dict is live. """
+        if self._thread:
+            self._queue.put(callback)
+
+    def _writer(self):
+        self._compact()
+        self._file = open(self.journal_path, 'a', encoding='utf-8')
+        last_fsync = time.monotonic()
+        dirty = False
+        stop = False
+        while not stop:
+            try:
+                batch = [self._queue.get(timeout=self.fsync_interval)]
+            except queue.Empty:
+                batch = []
+            while True:  # Draining everything accumulated during the previous write
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                batch = batch[:batch.index(None)]
+                stop = True
+
+            for record in batch:
+                if callable(record):
+                    record(self.state.to_dict())
+                    continue
+                record['s'] = self.state.seq + 1
+                try:
+                    self.state.apply(record)
+                except (IndexError, KeyError) as e:
+                    self._log("Record %r does not fit the state: %s" % (record, e))
+                    continue
+                self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+                self._records_since_compact += 1
+                dirty = True
+                for listener in self.listeners:
+                    listener(record)
+
+            now = time.monotonic()
+            if dirty and (stop or now - last_fsync >= self.fsync_interval):
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                last_fsync = now
+                dirty = False
+
+            if self._records_since_compact and (stop or self._records_since_compact >= self.compact_records or
+                                                now - self._last_compact >= self.compact_interval):
+                self._compact()
+
+        self._file.close()
+        self._file = None
+
+    def _compact(self):
+        """ Snapshot first (atomically), truncate the journal after. Records are numbered, so a crash in between
+        only leaves records that `load()` skips. """
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state.to_dict(), f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        if self._file:
+            self._file.seek(0)
+            self._file.truncate()
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        else:
+            open(self.journal_path, 'w').close()
+        self._records_since_compact = 0
+        self._last_compact = time.monotonic()
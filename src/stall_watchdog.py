@@ -0,0 +1,102 @@
+# Main loop stall watchdog: a heartbeat is posted to the GUI loop, and while it is overdue the GUI thread stack
+# is sampled. When the heartbeat finally runs, the stall is reported with its duration and the code that blocked,
+# the location seen in most samples (preferably our own code, not the wx or stdlib frames it called).
+
+import collections
+import os
+import sys
+import threading
+import time
+import traceback
+
+
+class Stall(object):
+    def __init__(self, started, duration_ms, location, stack, samples):
+        self.started = started  # time.time()
+        self.duration_ms = duration_ms
+        self.location = location  # "function (file:line)"
+        self.stack = stack  # Outermost first, the most sampled one
+        self.samples = samples
+
+    def __str__(self):
+        return "%.0f ms in %s" % (self.duration_ms, self.location)
+
+
+class StallWatchdog(object):
+    def __init__(self, post, on_stall, thread_id=None, threshold_ms=200, interval_ms=50, sample_ms=10,
+                 root=None):
+        """ `post(func)` runs func on the GUI loop (wx.CallAfter), `on_stall(stall)` is called there too.
+            Frames under `root` (the sources folder by default) are preferred as the blocking location. """
+        self.post = post
+        self.on_stall = on_stall
+        self.thread_id = thread_id or threading.get_ident()
+        self.threshold = threshold_ms / 1000.0
+        self.interval = interval_ms / 1000.0
+        self.sample_interval = sample_ms / 1000.0
+        self.root = os.path.abspath(root or os.path.dirname(os.path.abspath(__file__)))
+        self._lock = threading.Lock()
+        self._sent = None  # Monotonic time of the heartbeat in flight
+        self._sent_wall = None
+        self._samples = []
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._watch, name="StallWatchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _watch(self):
+        while self._running:
+            with self._lock:
+                sent = self._sent
+                if sent is None:
+                    self._sent, self._sent_wall = time.monotonic(), time.time()
+            if sent is None:
+                self.post(self._heartbeat)
+                time.sleep(self.interval)
+            elif time.monotonic() - sent > self.threshold:
+                self._sample()
+                time.sleep(self.sample_interval)
+            else:
+                time.sleep(self.sample_interval)
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        stack = tuple((f.filename, f.lineno, f.name) for f in traceback.extract_stack(frame))
+        with self._lock:
+            if self._sent is not None:
+                self._samples.append(stack)
+
+    def _heartbeat(self):
+        """ On the GUI loop """
+        with self._lock:
+            duration = time.monotonic() - self._sent
+            started, samples = self._sent_wall, self._samples
+            self._sent, self._samples = None, []
+        if duration > self.threshold and samples:
+            self.on_stall(self.attribute(started, duration * 1000, samples))
+
+    def attribute(self, started, duration_ms, samples):
+        """ The location in most samples, the innermost frame of ours in each of them """
+        locations = collections.Counter()
+        stacks = {}
+        for stack in samples:
+            ours = [frame for frame in stack if os.path.abspath(frame[0]).startswith(self.root)
+                    and os.path.abspath(frame[0]) != os.path.abspath(__file__)]
+            filename, lineno, name = (ours or stack)[-1]
+            location = "%s (%s:%d)" % (name, os.path.basename(filename), lineno)
+            locations[location] += 1
+            stacks.setdefault(location, stack)
+        location = locations.most_common(1)[0][0]
+        stack = ["%s (%s:%d)" % (name, os.path.basename(filename), lineno) for filename, lineno, name in
+                 stacks[location]]
+        return Stall(started, duration_ms, location, stack, len(samples))
@@ -0,0 +1,38 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+import time
+
+import wx
+
+
+class StallsWindow(wx.Frame):
+    """ UI stalls of this session, newest first, with the stack of the selected one """
+    def __init__(self, parent, title, stalls, close_callback):
+        wx.Frame.__init__(self, parent, title=title, size=(700, 400))
+        self.stalls = stalls
+
+        main_sizer = wx.BoxSizer(wx.VERTICAL)
+        self.list = wx.ListCtrl(self, style=wx.LC_REPORT | wx.LC_SINGLE_SEL)
+        for i, (label, width) in enumerate(((_("Time"), 80), (_("Duration"), 80), (_("Blocked in"), 500))):
+            self.list.InsertColumn(i, label, width=width)
+        self.stack = wx.TextCtrl(self, style=wx.TE_READONLY | wx.TE_MULTILINE | wx.TE_DONTWRAP)
+        main_sizer.Add(self.list, 1, wx.EXPAND)
+        main_sizer.Add(self.stack, 1, wx.EXPAND | wx.TOP, border=1)
+        self.SetSizer(main_sizer)
+        self.Layout()
+
+        self.list.Bind(wx.EVT_LIST_ITEM_SELECTED, self.on_select)
+        self.Bind(wx.EVT_CLOSE, close_callback)
+        self.reload()
+
+    def reload(self):
+        self.list.DeleteAllItems()
+        for i, stall in enumerate(reversed(self.stalls)):
+            self.list.InsertItem(i, time.strftime('%H:%M:%S', time.localtime(stall.started)))
+            self.list.SetItem(i, 1, '%.0f ms' % stall.duration_ms)
+            self.list.SetItem(i, 2, stall.location)
+
+    def on_select(self, e):
+        stall = list(reversed(self.stalls))[e.GetIndex()]
+        self.stack.SetValue("%d samples\n\n%s" % (stall.samples, "\n".join(reversed(stall.stack))))
@@ -0,0 +1,126 @@
+# Thumbnails of the items: rendering for the ThumbnailCache workers, the grid column and the preview pane.
+
+import os
+import time
+
+import vlc
+import wx
+import wx.grid
+
+from constants import FileTypes
+from image_info import decode_plan
+from projector import PilImage
+
+THUMB_SIZE = (56, 32)
+PREVIEW_SIZE = (320, 180)
+DECODE_BUDGET = 256 * 1024 * 1024  # A thumbnail is not worth more
+
+
+class ThumbnailRenderer(object):
+    """ Called from the worker threads: still images are decoded, videos give a frame grabbed by VLC """
+    def __init__(self):
+        self.vlc_instance = vlc.Instance('--intf=dummy', '--vout=dummy', '--no-audio', '--no-video-title-show')
+
+    def __call__(self, src, dst, size):
+        ext = src.rsplit('.', 1)[-1].lower()
+        if ext == 'm3u':
+            raise ValueError("streams have no thumbnails")
+        if ext in FileTypes.video_extensions:
+            frame = dst[:-4] + '.frame.png'
+            try:
+                self.grab_frame(src, frame)
+                self.render_image(frame, dst, size)
+            finally:
+                if os.path.isfile(frame):
+                    os.remove(frame)
+        else:
+            self.render_image(src, dst, size)
+
+    @staticmethod
+    def render_image(src, dst, size):
+        plan = decode_plan(src, size, jpeg_draft=PilImage is not None)
+        if plan and plan[3] > DECODE_BUDGET:
+            raise ValueError("%dx%d is too big to decode" % plan[1:3])
+        if PilImage:
+            with PilImage.open(src) as pil:
+                pil.draft('RGB', size)
+                pil.thumbnail(size)
+                pil.save(dst, 'PNG')
+            return
+        img = wx.Image(src, wx.BITMAP_TYPE_ANY)
+        if not img.IsOk():
+            raise ValueError("not decodable")
+        ratio = min(size[0] / float(img.GetWidth()), size[1] / float(img.GetHeight()))
+        img.Rescale(max(1, int(img.GetWidth() * ratio)), max(1, int(img.GetHeight() * ratio)), wx.IMAGE_QUALITY_HIGH)
+        img.SaveFile(dst, wx.BITMAP_TYPE_PNG)
+
+    def grab_frame(self, src, dst, timeout=10.0):
+        """ One frame through VLC's scene filter, 2 seconds in, or the first one for shorter clips """
+        folder, name = os.path.split(dst)
+        for start_time in (2.0, 0.0):
+            media = self.vlc_instance.media_new(src, ':video-filter=scene', ':scene-format=png', ':scene-replace',
+                                                ':scene-ratio=1', ':scene-path=' + folder,
+                                                ':scene-prefix=' + name[:-4], ':start-time=%.1f' % start_time)
+            player = self.vlc_instance.media_player_new()
+            player.set_media(media)
+            player.play()
+            deadline = time.monotonic() + timeout
+            try:
+                while time.monotonic() < deadline and player.get_state() not in {vlc.State.Ended, vlc.State.Error}:
+                    if os.path.isfile(dst) and os.path.getsize(dst):
+                        time.sleep(0.1)  # Let the filter finish writing the file
+                        return
+                    time.sleep(0.05)
+            finally:
+                player.stop()
+                player.release()
+                media.release()
+        raise ValueError("no video frame")
+
+
+class ThumbnailCellRenderer(wx.grid.GridCellRenderer):
+    def __init__(self, get_bitmap):
+        """ `get_bitmap(row)`: wx.Bitmap or None, called only for the rows on the screen """
+        wx.grid.GridCellRenderer.__init__(self)
+        self.get_bitmap = get_bitmap
+
+    def Draw(self, grid, attr, dc, rect, row, col, is_selected):
+        dc.SetBrush(wx.Brush(grid.GetSelectionBackground() if is_selected else attr.GetBackgroundColour()))
+        dc.SetPen(wx.TRANSPARENT_PEN)
+        dc.DrawRectangle(rect)
+        bitmap = self.get_bitmap(row)
+        if bitmap:
+            dc.DrawBitmap(bitmap, rect.x + (rect.width - bitmap.GetWidth()) // 2,
+                          rect.y + (rect.height - bitmap.GetHeight()) // 2)
+
+    def GetBestSize(self, grid, attr, dc, row, col):
+        return wx.Size(THUMB_SIZE[0] + 4, THUMB_SIZE[1] + 2)
+
+    def Clone(self):
+        return ThumbnailCellRenderer(self.get_bitmap)
+
+
+class PreviewPane(wx.Panel):
+    def __init__(self, parent):
+        wx.Panel.__init__(self, parent, size=(PREVIEW_SIZE[0] + 8, -1))
+        self.SetBackgroundColour(wx.BLACK)
+        self.SetForegroundColour(wx.WHITE)
+        self.bitmap = None
+        self.label = ''
+        self.Bind(wx.EVT_PAINT, self.on_paint)
+
+    def set(self, bitmap, label):
+        self.bitmap, self.label = bitmap, label
+        self.Refresh()
+
+    def on_paint(self, e):
+        dc = wx.PaintDC(self)
+        w, h = self.GetClientSize()
+        y = 4
+        if self.bitmap:
+            dc.DrawBitmap(self.bitmap, (w - self.bitmap.GetWidth()) // 2, y)
+            y += self.bitmap.GetHeight() + 4
+        else:
+            y += PREVIEW_SIZE[1] + 4
+        dc.SetTextForeground(self.GetForegroundColour())
+        dc.DrawLabel(self.label, wx.Rect(4, y, w - 8, h - y), wx.ALIGN_CENTER_HORIZONTAL | wx.ALIGN_TOP)
@@ -0,0 +1,103 @@
+# On-disk thumbnail cache keyed by path + mtime + size, filled by a small worker pool. The key of a source is
+# computed once, painting a row does not touch the disk; forget() the source when its file is replaced.
+# Requests are served newest first (LIFO): they come from painting the visible grid rows, so after scrolling
+# the rows on screen are rendered before the ones scrolled past, which are dropped once the queue is full.
+
+import collections
+import hashlib
+import os
+import threading
+
+
+class ThumbnailCache(object):
+    def __init__(self, cache_dir, render, on_ready, workers=2, max_pending=64, logger=None):
+        """ `render(src, dst, size)` writes a PNG, `on_ready(src)` is called from a worker after it """
+        self.cache_dir = cache_dir
+        self.render = render
+        self.on_ready = on_ready
+        self.max_pending = max_pending
+        self.logger = logger
+
+        self._paths = {}  # (src, size) -> cache path
+        self._ready = set()
+        self._pending = collections.OrderedDict()  # dst -> (src, size)
+        self._in_progress = set()
+        self._failed = set()
+        self._cond = threading.Condition()
+        self._running = True
+        self._threads = [threading.Thread(target=self._work, name="Thumbnails-%d" % i, daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _log(self, msg):
+        if self.logger:
+            self.logger.log("[Thumbnails] " + msg)
+
+    def cache_path(self, src, size):
+        try:
+            mtime = os.stat(src).st_mtime_ns
+        except OSError:
+            return None
+        key = hashlib.blake2b(("%s|%d|%dx%d" % (src, mtime, size[0], size[1])).encode('utf-8'),
+                              digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, key + '.png')
+
+    def request(self, src, size):
+        """ Returns the thumbnail path if it is ready, otherwise schedules it and returns None """
+        dst = self._paths.get((src, size), False)
+        if dst is False:
+            dst = self._paths[(src, size)] = self.cache_path(src, size)
+        if not dst or dst in self._failed:
+            return None
+        if dst in self._ready:
+            return dst
+        with self._cond:
+            if dst in self._in_progress:
+                return None
+            if dst not in self._pending and os.path.isfile(dst):  # Rendered in an earlier session
+                self._ready.add(dst)
+                return dst
+            self._pending.pop(dst, None)
+            self._pending[dst] = (src, size)  # Most recent at the end
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+            self._cond.notify()
+        return None
+
+    def forget(self, src):
+        """ The file has changed: its next request computes the key again """
+        for key in [key for key in self._paths if key[0] == src]:
+            self._ready.discard(self._paths.pop(key))
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._pending.clear()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                dst, (src, size) = self._pending.popitem(last=True)
+                self._in_progress.add(dst)
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp = dst[:-4] + '.%d.tmp.png' % threading.get_ident()
+                self.render(src, tmp, size)
+                os.replace(tmp, dst)
+            except Exception as e:  # A broken file must not kill the worker
+                self._failed.add(dst)
+                self._log("Can't render %s: %s" % (src, e))
+            else:
+                self._ready.add(dst)
+                self.on_ready(src)
+            finally:
+                with self._cond:
+                    self._in_progress.discard(dst)
@@ -0,0 +1,138 @@
+# Timecode for lighting and video desks over UDP, driven by the PlaybackClock.
+# 'mtc': MIDI Timecode full-frame SysEx every frame, plus a MIDI Show Control GO with the item number
+#        when the item changes (for bridges to rtpMIDI / ipMIDI).
+# 'smpte': "HH:MM:SS:FF <item>\n" text, for media servers and custom scripts.
+
+import collections
+import socket
+import threading
+import time
+
+from osc_input import parse_address
+
+MTC_RATE_CODES = {24: 0, 25: 1, 30: 3}
+
+
+def timecode_fields(ms, fps):
+    frames = int(ms * fps // 1000)
+    seconds = frames // fps
+    return seconds // 3600 % 24, seconds // 60 % 60, seconds % 60, frames % fps
+
+
+def mtc_full_frame(ms, fps):
+    h, m, s, f = timecode_fields(ms, fps)
+    return bytes([0xF0, 0x7F, 0x7F, 0x01, 0x01, MTC_RATE_CODES[fps] << 5 | h, m, s, f, 0xF7])
+
+
+def msc_go(item):
+    """ MIDI Show Control GO to all devices, lighting command format. None if the item has no cue number. """
+    cue = ''.join(c for c in str(item) if c.isdigit() or c == '.').lstrip('0') or None
+    if not cue:
+        return None
+    return bytes([0xF0, 0x7F, 0x7F, 0x02, 0x01, 0x01]) + cue.encode('ascii') + b'\xF7'
+
+
+def smpte_text(ms, fps, item):
+    return ("%02d:%02d:%02d:%02d %s\n" % (timecode_fields(ms, fps) + (item or '',))).encode('utf-8')
+
+
+class TimecodeSender(object):
+    def __init__(self, address, clock, fps=25, fmt='mtc', logger=None, hold_interval=1.0):
+        if fps not in MTC_RATE_CODES:
+            raise ValueError("Unsupported frame rate %s" % fps)
+        if fmt not in ('mtc', 'smpte'):
+            raise ValueError("Unknown timecode format %s" % fmt)
+        self.address = parse_address(address)
+        self.clock = clock
+        self.fps = fps
+        self.fmt = fmt
+        self.logger = logger
+        self.hold_interval = hold_interval  # Repeats the frame while paused, so desks keep the position
+
+        self.item = None
+        self._item_sent = None
+        self._sock = None
+        self._thread = None
+        self._running = False
+        self.lateness_ms = collections.deque(maxlen=fps * 600)
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+    def _log(self, msg):
+        if self.logger:
+            self.logger.log("[Timecode] " + msg)
+
+    def set_item(self, item):
+        self.item = item
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="TimecodeSender", daemon=True)
+        self._thread.start()
+        self._log("Sending %s at %d fps to %s:%d" % ((self.fmt.upper(), self.fps) + self.address))
+
+    def stop(self):
+        if self._thread:
+            self._running = False
+            self._thread.join()
+            self._thread = None
+            self._sock.close()
+            self._sock = None
+            self._log(self.jitter_summary())
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def packets(self, ms):
+        if self.fmt == 'smpte':
+            return [smpte_text(ms, self.fps, self.item)]
+        packets = [mtc_full_frame(ms, self.fps)]
+        if self.item != self._item_sent:
+            self._item_sent = self.item
+            go = msc_go(self.item)
+            if go:
+                packets.insert(0, go)
+        return packets
+
+    def _run(self):
+        period = 1.0 / self.fps
+        deadline = time.monotonic()
+        last_sent = 0
+        while self._running:
+            deadline += period
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            now = time.monotonic()
+            late = now - deadline
+            if late > period:  # Stalled for more than a frame: skip the missed frames instead of bursting
+                self.frames_dropped += int(late / period)
+                deadline = now
+                late = 0
+            self.lateness_ms.append(late * 1000)
+
+            self.clock.sample()
+            ms = self.clock.now_ms()
+            if ms is None:
+                self._item_sent = None
+                continue  # Stopped: nothing is sent, desks free-wheel and stop by themselves
+            if not self.clock.running and now - last_sent < self.hold_interval:
+                continue
+            try:
+                for packet in self.packets(ms):
+                    self._sock.sendto(packet, self.address)
+            except OSError as e:
+                self._log("Send to %s:%d failed: %s" % (self.address + (e,)))
+                continue
+            last_sent = now
+            self.frames_sent += 1
+
+    def jitter_summary(self):
+        if not self.lateness_ms:
+            return "No frames"
+        s = sorted(self.lateness_ms)
+        return "%d frames sent, %d dropped, lateness mean %.2fms, p99 %.2fms, max %.2fms" % \
+               (self.frames_sent, self.frames_dropped, sum(s) / len(s), s[int(len(s) * 0.99)], s[-1])
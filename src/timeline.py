@@ -0,0 +1,150 @@
+# Timeline mode: rows with a scheduled wall-clock start ("12:00", "15:30 countdown"). The scheduler keeps the
+# deadlines on the monotonic clock, so they do not drift and a system clock change does not fire anything twice;
+# when the wall clock is stepped (NTP, the operator fixing the time) the deadlines are re-anchored to it.
+# Plus the projected slip of the rows: the program advancing from the row playing now, with the known durations.
+
+import threading
+import time
+
+ACTIONS = ('zad', 'countdown', 'play', 'bgstop')
+DAY = 24 * 3600
+
+
+def parse_start(text):
+    """ "HH:MM[:SS] [action]" to (seconds of the day, action or None), None for an empty cell, ValueError """
+    parts = text.split()
+    if not parts:
+        return None
+    fields = parts[0].split(':')
+    if len(fields) not in (2, 3) or not all(f.isdigit() for f in fields):
+        raise ValueError("Start time must be HH:MM or HH:MM:SS, not %r" % parts[0])
+    h, m, s = (int(f) for f in fields + ['0'] * (3 - len(fields)))
+    if h > 23 or m > 59 or s > 59:
+        raise ValueError("No such time %r" % parts[0])
+    action = parts[1].lower() if len(parts) > 1 else None
+    if action is not None and action not in ACTIONS or len(parts) > 2:
+        raise ValueError("Unknown action %r, use one of: %s" % (" ".join(parts[1:]), ", ".join(ACTIONS)))
+    return h * 3600 + m * 60 + s, action
+
+
+def occurrence(seconds_of_day, now):
+    """ Wall time of that time of the day nearest to `now`: a show running past midnight keeps its order """
+    local = time.localtime(now)
+    midnight = now - (local.tm_hour * 3600 + local.tm_min * 60 + local.tm_sec) - (now % 1)
+    ts = midnight + seconds_of_day
+    if ts - now > DAY / 2:
+        ts -= DAY
+    elif now - ts > DAY / 2:
+        ts += DAY
+    return ts
+
+
+def format_slip(seconds):
+    sign = '-' if seconds < 0 else '+'
+    return "%s%d:%02d" % ((sign,) + divmod(int(round(abs(seconds))), 60))
+
+
+def project_slips(rows, progress, now, gap=0):
+    """ Slip in seconds of every row, None for the rows without a schedule.
+        `rows`: [{'scheduled': wall ts or None, 'duration': s or None, 'started': wall ts or None}],
+        `progress`: the index of the row started last (-1 before the show). The rows up to it have their real
+        slip, the next ones start after it (with `gap` between the items) but never before their schedule. """
+    slips = []
+    t = now
+    for i, row in enumerate(rows):
+        if i <= progress:
+            started, scheduled = row['started'], row['scheduled']
+            slips.append(started - scheduled if started is not None and scheduled is not None else None)
+            if i == progress:
+                t = max(now, (started if started is not None else now) + (row['duration'] or 0) + gap)
+            continue
+        if row['scheduled'] is not None:
+            t = max(t, row['scheduled'])
+            slips.append(t - row['scheduled'])
+        else:
+            slips.append(None)
+        t += (row['duration'] or 0) + gap
+    return slips
+
+
+class TimelineScheduler(object):
+    def __init__(self, fire, logger=None, late_s=60, jump_s=1.0, check_s=1.0, now=time.time, mono=time.monotonic):
+        """ `fire(key, action)` is called from the scheduler thread. Entries armed more than `late_s` after
+            their time are not fired. """
+        self.fire = fire
+        self.logger = logger
+        self.late = late_s
+        self.jump = jump_s
+        self.check = check_s
+        self._now = now
+        self._mono = mono
+        self._cond = threading.Condition()
+        self._entries = {}  # key -> [wall ts, action, fired]
+        self._offset = now() - mono()  # Wall minus monotonic
+        self._running = False
+        self._thread = None
+
+    def _log(self, msg):
+        if self.logger:
+            self.logger.log("[Timeline] " + msg)
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="TimelineScheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread:
+            with self._cond:
+                self._running = False
+                self._cond.notify()
+            self._thread.join()
+            self._thread = None
+
+    def set_entries(self, entries):
+        """ [(key, wall ts, action)]. An entry that keeps its key and time keeps its fired state. """
+        with self._cond:
+            now = self._mono() + self._offset
+            old = self._entries
+            self._entries = {}
+            for key, ts, action in entries:
+                fired = old[key][2] if key in old and old[key][0] == ts else now - ts > self.late
+                self._entries[key] = [ts, action, fired]
+            self._cond.notify()
+
+    def _reanchor(self):
+        offset = self._now() - self._mono()
+        if abs(offset - self._offset) > self.jump:
+            self._log("System clock changed by %+.1fs, the schedule follows it" % (offset - self._offset))
+            self._offset = offset
+
+    def _run(self):
+        while True:
+            due = []
+            with self._cond:
+                if not self._running:
+                    return
+                self._reanchor()
+                mono = self._mono()
+                wait = self.check
+                for key, entry in self._entries.items():
+                    if entry[2]:
+                        continue
+                    deadline = entry[0] - self._offset
+                    if deadline <= mono:
+                        entry[2] = True
+                        due.append((deadline, key, entry[1]))
+                    else:
+                        wait = min(wait, deadline - mono)
+                if not due:
+                    self._cond.wait(wait)
+                    continue
+            for deadline, key, action in sorted(due):
+                late = self._mono() - deadline
+                if late > self.late:
+                    self._log("Missed %s by %.0fs" % (key, late))
+                    continue
+                try:
+                    self.fire(key, action)
+                except Exception as e:
+                    self._log("%s failed: %s" % (key, e))
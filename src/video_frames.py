@@ -0,0 +1,67 @@
+# One decode for several projector outputs: libvlc renders the video into memory through the video callbacks
+# (instead of a native window), the frame is copied into a single wx.Bitmap that every output draws scaled.
+
+import ctypes
+import threading
+
+import vlc
+import wx
+
+# python-vlc declares the chroma as c_char_p, which can not be written from a callback
+_FormatCb = ctypes.CFUNCTYPE(ctypes.c_uint, ctypes.POINTER(ctypes.c_void_p), ctypes.c_void_p,
+                             ctypes.POINTER(ctypes.c_uint), ctypes.POINTER(ctypes.c_uint),
+                             ctypes.POINTER(ctypes.c_uint), ctypes.POINTER(ctypes.c_uint))
+_CleanupCb = ctypes.CFUNCTYPE(None, ctypes.c_void_p)
+_set_format_callbacks = ctypes.CFUNCTYPE(None, ctypes.c_void_p, _FormatCb, _CleanupCb)(
+    ('libvlc_video_set_format_callbacks', vlc.dll))
+
+
+class VideoFrameTap(object):
+    def __init__(self, player):
+        """ Switches the player to memory rendering for good, libvlc can not switch back to a window """
+        self.on_frame = None  # Called on the GUI thread when self.bitmap has a new frame
+        self.size = None
+        self.bitmap = None
+        self._buffer = None
+        self._lock = threading.Lock()
+        self._frame_pending = False
+
+        # VLC calls them from its threads, they must stay referenced for the player lifetime
+        self._callbacks = (vlc.CallbackDecorators.VideoLockCb(self._lock_cb),
+                           vlc.CallbackDecorators.VideoUnlockCb(self._unlock_cb),
+                           vlc.CallbackDecorators.VideoDisplayCb(self._display_cb),
+                           _FormatCb(self._format_cb), _CleanupCb(lambda opaque: None))
+        player.video_set_callbacks(self._callbacks[0], self._callbacks[1], self._callbacks[2], None)
+        _set_format_callbacks(player, self._callbacks[3], self._callbacks[4])
+
+    def _format_cb(self, opaque, chroma, width, height, pitches, lines):
+        ctypes.memmove(chroma, b'RV32', 4)  # BGRX in memory, what wx.BitmapBufferFormat_RGB32 expects
+        w, h = width[0], height[0]
+        with self._lock:
+            self._buffer = (ctypes.c_ubyte * (w * h * 4))()
+            self.size = (w, h)
+        pitches[0], lines[0] = w * 4, h
+        return 1
+
+    def _lock_cb(self, opaque, planes):
+        self._lock.acquire()
+        planes[0] = ctypes.addressof(self._buffer)
+        return None
+
+    def _unlock_cb(self, opaque, picture, planes):
+        self._lock.release()
+
+    def _display_cb(self, opaque, picture):
+        if not self._frame_pending:  # Frames are dropped while the GUI is busy painting the previous one
+            self._frame_pending = True
+            wx.CallAfter(self._deliver)
+
+    def _deliver(self):
+        with self._lock:
+            self._frame_pending = False
+            w, h = self.size
+            if not self.bitmap or self.bitmap.GetSize() != (w, h):
+                self.bitmap = wx.Bitmap(w, h, 32)
+            self.bitmap.CopyFromBuffer(self._buffer, wx.BitmapBufferFormat_RGB32, w * 4)
+        if self.on_frame:
+            self.on_frame()
@@ -0,0 +1,177 @@
+# Waveform overviews: min/max peaks per 10 ms bucket, computed once per file in a process pool and kept
+# as .npy files next to the .fest file. The widgets read them memory-mapped, only the range on screen.
+# NumPy is optional: without it there are simply no waveforms.
+
+import concurrent.futures
+import hashlib
+import os
+import threading
+import wave
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from os_tools import process_context
+
+BUCKET_MS = 10
+SAMPLE_RATE = 8000  # Mono 8 kHz is plenty for an overview
+BUCKET_SAMPLES = SAMPLE_RATE * BUCKET_MS // 1000
+
+
+def wav_peaks(wav_path, chunk_buckets=6000):
+    """ (n, 2) int16 array of min/max per bucket of a 16-bit mono wav, read in chunks """
+    parts = []
+    with wave.open(wav_path, 'rb') as w:
+        if w.getsampwidth() != 2 or w.getnchannels() != 1:
+            raise ValueError("16-bit mono expected")
+        bucket = w.getframerate() * BUCKET_MS // 1000
+        while True:
+            data = w.readframes(bucket * chunk_buckets)
+            if not data:
+                break
+            samples = np.frombuffer(data, dtype='<i2')
+            tail = len(samples) % bucket
+            if tail:  # Last bucket of the file
+                samples = np.concatenate([samples, np.repeat(samples[-1:], bucket - tail)])
+            samples = samples.reshape(-1, bucket)
+            parts.append(np.stack([samples.min(axis=1), samples.max(axis=1)], axis=1))
+    return np.concatenate(parts) if parts else np.zeros((0, 2), dtype='<i2')
+
+
+def reduce_peaks(peaks, start, end, columns):
+    """ min/max of buckets [start, end) in `columns` columns, only this range of the (mmap) array is read """
+    start, end = max(0, start), min(len(peaks), end)
+    if end - start <= 0 or columns <= 0:
+        return np.zeros((0, 2), dtype=peaks.dtype)
+    view = peaks[start:end]
+    if end - start <= columns:  # Zoomed in more than a bucket per column
+        return np.asarray(view)
+    edges = np.linspace(0, end - start, columns + 1).astype(np.intp)[:-1]
+    return np.stack([np.minimum.reduceat(view[:, 0], edges), np.maximum.reduceat(view[:, 1], edges)], axis=1)
+
+
+def window_levels(peaks, end, buckets):
+    """ (peak, rms) of the bucket amplitudes, half of max - min, over the buckets [end - buckets, end).
+        0..1 of full scale. The peaks are 10 ms min/max, so the rms is the one of their envelope. """
+    start, end = max(0, end - buckets), min(len(peaks), end)
+    if end - start <= 0:
+        return 0.0, 0.0
+    block = np.asarray(peaks[start:end], dtype=np.float32)
+    amplitude = (block[:, 1] - block[:, 0]) * (0.5 / 32768)
+    return float(amplitude.max()), float(np.sqrt(np.mean(amplitude * amplitude)))
+
+
+def decode_to_wav(src, wav_path, timeout=600):
+    """ VLC transcodes the audio to 8 kHz mono wav, faster than real time. Runs in a pool process. """
+    import time
+    import vlc  # Imported in the worker process only
+    instance = vlc.Instance('--intf=dummy', '--no-video', '--quiet')
+    dst = wav_path.replace('\\', '/')
+    media = instance.media_new(src, ':sout=#transcode{vcodec=none,acodec=s16l,channels=1,samplerate=%d}'
+                                    ':std{access=file,mux=wav,dst="%s"}' % (SAMPLE_RATE, dst), ':no-sout-video')
+    player = instance.media_player_new()
+    player.set_media(media)
+    player.play()
+    deadline = time.monotonic() + timeout
+    try:
+        while player.get_state() not in {vlc.State.Ended, vlc.State.Error, vlc.State.Stopped}:
+            if time.monotonic() > deadline:
+                raise TimeoutError("transcoding %s" % src)
+            time.sleep(0.05)
+        if player.get_state() == vlc.State.Error:
+            raise ValueError("VLC can not decode %s" % src)
+    finally:
+        player.stop()
+        player.release()
+        media.release()
+        instance.release()
+
+
+def compute_peaks(src, dst):
+    tmp_wav = dst + '.%d.wav' % os.getpid()
+    try:
+        decode_to_wav(src, tmp_wav)
+        peaks = wav_peaks(tmp_wav)
+    finally:
+        if os.path.isfile(tmp_wav):
+            os.remove(tmp_wav)
+    tmp = dst[:-4] + '.%d.tmp.npy' % os.getpid()
+    np.save(tmp, peaks)
+    os.replace(tmp, dst)
+    return dst
+
+
+class WaveformCache(object):
+    def __init__(self, cache_dir, on_ready=None, workers=2, logger=None):
+        """ `on_ready(src)` is called from a pool thread when the peaks of a file are saved """
+        self.cache_dir = cache_dir
+        self.on_ready = on_ready
+        self.workers = workers
+        self.logger = logger
+        self._pool = None
+        self._futures = {}
+        self._failed = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def available():
+        return np is not None
+
+    def _log(self, msg):
+        if self.logger:
+            self.logger.log("[Waveform] " + msg)
+
+    def peaks_path(self, src):
+        try:
+            st = os.stat(src)
+        except OSError:
+            return None
+        key = hashlib.blake2b(("%s|%d|%d|%d" % (src, st.st_size, st.st_mtime_ns, BUCKET_MS)).encode('utf-8'),
+                              digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, key + '.npy')
+
+    def peaks(self, src, compute=True):
+        """ Memory-mapped peaks, or None if they are not computed yet (then they are scheduled) """
+        dst = self.peaks_path(src)
+        if not dst or np is None:
+            return None
+        if os.path.isfile(dst):
+            return np.load(dst, mmap_mode='r')
+        if compute:
+            self.request(src, dst)
+        return None
+
+    def request(self, src, dst=None):
+        dst = dst or self.peaks_path(src)
+        if not dst or np is None or os.path.isfile(dst):
+            return
+        with self._lock:
+            if dst in self._futures or dst in self._failed:
+                return
+            if not self._pool:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                self._pool = concurrent.futures.ProcessPoolExecutor(self.workers, mp_context=process_context())
+            future = self._pool.submit(compute_peaks, src, dst)
+            self._futures[dst] = future
+        future.add_done_callback(lambda f: self._done(src, dst, f))
+
+    def _done(self, src, dst, future):
+        with self._lock:
+            self._futures.pop(dst, None)
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error:
+                self._failed.add(dst)
+        if error:
+            self._log("Can't compute the peaks of %s: %s" % (src, error))
+        elif self.on_ready:
+            self.on_ready(src)
+
+    def stop(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool:
+            pool.shutdown(wait=True, cancel_futures=True)
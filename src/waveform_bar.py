@@ -0,0 +1,117 @@
+# Progress bar with the waveform overview behind it. Keeps the wx.Gauge API (SetRange/SetValue in ms),
+# so it replaces the gauge of the main window as is. The mouse wheel zooms around the play position,
+# a click seeks when `on_seek` is given.
+
+import wx
+
+from waveform import BUCKET_MS, reduce_peaks
+
+MAX_ZOOM = 64
+
+
+class WaveformBar(wx.Panel):
+    def __init__(self, parent, size=wx.DefaultSize, on_seek=None):
+        wx.Panel.__init__(self, parent, size=size, style=wx.FULL_REPAINT_ON_RESIZE)
+        self.SetBackgroundStyle(wx.BG_STYLE_PAINT)
+        self.on_seek = on_seek
+        self.range, self.value = 1, 0
+        self.peaks = None
+        self.zoom = 1
+        self._lines_key, self._lines = None, []
+        self._drawn = None
+
+        self.Bind(wx.EVT_PAINT, self.on_paint)
+        self.Bind(wx.EVT_MOUSEWHEEL, self.on_wheel)
+        self.Bind(wx.EVT_LEFT_DOWN, self.on_click)
+        self.SetToolTip(_("Mouse wheel to zoom the waveform"))
+
+    # --- wx.Gauge API ---
+
+    def GetRange(self):
+        return self.range
+
+    def SetRange(self, value):
+        value = max(1, int(value))
+        if value != self.range:
+            self.range = value
+            self.Refresh()
+
+    def GetValue(self):
+        return self.value
+
+    def SetValue(self, value):
+        self.value = min(max(0, int(value)), self.range)
+        if self._drawn != self.drawn_state():  # Nothing to repaint most of the ticks
+            self.Refresh()
+
+    def set_peaks(self, peaks):
+        """ Memory-mapped (n, 2) min/max array from WaveformCache, or None """
+        self.peaks = peaks
+        self._lines_key = None
+        self.Refresh()
+
+    # --- View ---
+
+    def view(self):
+        """ (start_ms, end_ms) on the screen """
+        if self.zoom == 1:
+            return 0, self.range
+        span = self.range // self.zoom
+        start = min(max(0, self.value - span // 2), self.range - span)
+        return start, start + span
+
+    def drawn_state(self):
+        start, end = self.view()
+        return self.GetClientSize()[0] * (self.value - start) // max(1, end - start), start, end
+
+    def waveform_lines(self, w, h, start, end):
+        """ One vertical line per column, recomputed only when the view changes """
+        key = (w, h, start // BUCKET_MS, end // BUCKET_MS)
+        if key != self._lines_key:
+            self._lines_key = key
+            columns = reduce_peaks(self.peaks, start // BUCKET_MS, -(-end // BUCKET_MS), w)
+            step = w / float(max(1, len(columns)))
+            mid, scale = h / 2.0, h / 65536.0
+            self._lines = [(int(i * step), int(mid - hi * scale), int(i * step), int(mid - lo * scale))
+                           for i, (lo, hi) in enumerate(columns.tolist())]
+        return self._lines
+
+    def on_paint(self, e):
+        dc = wx.AutoBufferedPaintDC(self)
+        w, h = self.GetClientSize()
+        dc.SetBackground(wx.Brush(wx.SystemSettings.GetColour(wx.SYS_COLOUR_BTNFACE)))
+        dc.Clear()
+        self._drawn = self.drawn_state()
+        x, start, end = self._drawn
+
+        played, rest = wx.Colour(80, 160, 80), wx.Colour(140, 140, 140)
+        if self.peaks is not None and len(self.peaks):
+            lines = self.waveform_lines(w, h, start, end)
+            split = next((i for i, line in enumerate(lines) if line[0] >= x), len(lines))
+            dc.DrawLineList(lines[:split], wx.Pen(played))
+            dc.DrawLineList(lines[split:], wx.Pen(rest))
+        else:
+            dc.SetPen(wx.TRANSPARENT_PEN)
+            dc.SetBrush(wx.Brush(played))
+            dc.DrawRectangle(0, h // 4, x, h // 2)
+
+        if self.value:
+            dc.SetPen(wx.Pen(wx.Colour(200, 0, 0), 2))
+            dc.DrawLine(x, 0, x, h)
+        if self.zoom > 1:
+            dc.SetTextForeground(wx.Colour(60, 60, 60))
+            dc.DrawText('x%d' % self.zoom, 2, 0)
+
+    def on_wheel(self, e):
+        zoom = self.zoom * 2 if e.GetWheelRotation() > 0 else self.zoom // 2
+        zoom = min(max(1, zoom), MAX_ZOOM)
+        if zoom != self.zoom and self.range // zoom >= BUCKET_MS:
+            self.zoom = zoom
+            self.Refresh()
+
+    def on_click(self, e):
+        if not self.on_seek or self.range <= 1:
+            e.Skip()
+            return
+        start, end = self.view()
+        self.on_seek(start + (end - start) * e.GetX() // max(1, self.GetClientSize()[0]))
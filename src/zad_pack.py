@@ -0,0 +1,166 @@
+# Show pack: every still ZAD pre-rendered at the exact size of each projector output, as raw RGB frames in one
+# file next to the .fest file. At show time the file is memory-mapped and the bitmaps are made straight from
+# the mapped frames, nothing is opened or decoded. Rebuilding renders only new and changed images; frames of
+# other projector sizes or of images no longer in the show are dropped.
+#
+# Layout: header (magic, index offset, index length), 4 KiB aligned frames, JSON index. New frames and the new
+# index are appended after the current index, the header is rewritten last, so an interrupted build leaves the
+# previous pack readable.
+
+import json
+import mmap
+import os
+import struct
+import threading
+
+MAGIC = b'ZADPACK1'
+HEADER = struct.Struct('<8sQQ')
+ALIGN = 4096
+
+
+def _aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+class ZadPack(object):
+    def __init__(self, file_path, logger=None):
+        self.file_path = file_path
+        self.logger = logger
+        self.entries = {}  # (abs src, (w, h), policy) -> index entry
+        self._lock = threading.Lock()
+        self._file = None
+        self._map = None
+        self.open()
+
+    def log(self, msg):
+        if self.logger:
+            self.logger.log("[ZAD Pack] " + msg)
+
+    @staticmethod
+    def key(src, size, policy):
+        return os.path.abspath(src), tuple(size), policy
+
+    def open(self):
+        """ Maps the pack if there is a readable one """
+        with self._lock:
+            self._close()
+            if not os.path.isfile(self.file_path):
+                return
+            try:
+                self._file = open(self.file_path, 'rb')
+                magic, index_offset, index_length = HEADER.unpack(self._file.read(HEADER.size))
+                if magic != MAGIC:
+                    raise ValueError("not a ZAD pack")
+                self._file.seek(index_offset)
+                index = json.loads(self._file.read(index_length).decode('utf-8'))
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError, struct.error) as e:
+                self.log("Can't read %s: %s" % (self.file_path, e))
+                self._close()
+                return
+            self.entries = {self.key(e['src'], e['size'], e['policy']): e for e in index}
+
+    def _close(self):
+        if self._map:
+            self._map.close()
+        if self._file:
+            self._file.close()
+        self._map = self._file = None
+        self.entries = {}
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    @staticmethod
+    def _valid(entry, st):
+        return st is not None and entry['src_size'] == st.st_size and entry['src_mtime_ns'] == st.st_mtime_ns
+
+    @staticmethod
+    def _stat(src):
+        try:
+            return os.stat(src)
+        except OSError:
+            return None
+
+    def sizes(self):
+        return {entry_key[1] for entry_key in self.entries}
+
+    def frame(self, src, size, policy, convert):
+        """ convert(w, h, rgb buffer) on the mapped frame, None if it is not in the pack or the image changed.
+            The buffer is only valid during the call. If the image is unreachable, the packed frame is used. """
+        with self._lock:
+            entry = self.entries.get(self.key(src, size, policy))
+            if not entry or not self._map:
+                return None
+            st = self._stat(src)
+            if st is not None and not self._valid(entry, st):
+                return None
+            with memoryview(self._map) as view, view[entry['offset']:entry['offset'] + entry['length']] as rgb:
+                return convert(entry['w'], entry['h'], rgb)
+
+    def stale(self, jobs):
+        """ The (src, size, policy) jobs that have no valid frame """
+        return [job for job in jobs if not self._valid(self.entries.get(self.key(*job), {'src_size': None}),
+                                                       self._stat(job[0]))]
+
+    def build(self, jobs, render, compact_ratio=0.5):
+        """ Makes the pack hold exactly the frames of the jobs, `render(src, size, policy)` gives (w, h, rgb)
+            or None for the stale ones. Frames are written as they are rendered. Returns their number. """
+        wanted = {self.key(*job): job for job in jobs}
+        todo = self.stale(jobs)
+        with self._lock:
+            kept = [entry for key, entry in self.entries.items() if key in wanted and wanted[key] not in todo]
+            unchanged = not todo and len(kept) == len(self.entries)
+            self._close()
+        if unchanged:
+            self.open()
+            return 0
+
+        file_size = os.path.getsize(self.file_path) if os.path.isfile(self.file_path) else 0
+        rewrite = not kept or file_size * compact_ratio > sum(entry['length'] for entry in kept)
+        target = self.file_path + '.tmp' if rewrite else self.file_path
+        rendered = 0
+        with open(target, 'wb' if rewrite else 'r+b') as f:
+            if rewrite:  # Kept frames are copied over, the holes of the dropped ones are gone
+                f.write(HEADER.pack(MAGIC, 0, 0))
+                offset, entries = HEADER.size, []
+                if kept:
+                    with open(self.file_path, 'rb') as old:
+                        for entry in kept:
+                            old.seek(entry['offset'])
+                            offset = self._write_frame(f, offset, old.read(entry['length']), dict(entry), entries)
+            else:
+                magic, index_offset, index_length = HEADER.unpack(f.read(HEADER.size))
+                offset, entries = index_offset + index_length, list(kept)
+            for src, size, policy in todo:
+                st = self._stat(src)
+                frame = render(src, size, policy) if st else None
+                if not frame:
+                    continue
+                w, h, rgb = frame
+                entry = {'src': os.path.abspath(src), 'size': list(size), 'policy': policy, 'w': w, 'h': h,
+                         'src_size': st.st_size, 'src_mtime_ns': st.st_mtime_ns}
+                offset = self._write_frame(f, offset, rgb, entry, entries)
+                rendered += 1
+            index = json.dumps(entries, ensure_ascii=False).encode('utf-8')
+            f.seek(offset)
+            f.write(index)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, offset, len(index)))
+        if rewrite:
+            os.replace(target, self.file_path)
+        self.open()
+        return rendered
+
+    @staticmethod
+    def _write_frame(f, offset, rgb, entry, entries):
+        offset = _aligned(offset)
+        f.seek(offset)
+        f.write(rgb)
+        entry['offset'], entry['length'] = offset, len(rgb)
+        entries.append(entry)
+        return offset + len(rgb)
@@ -0,0 +1,46 @@
+import unittest
+
+# Ugly hack to allow absolute import from the src folder
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import tempfile
+import wave
+import audio_profiles
+
+
+class AudioProfilesTests(unittest.TestCase):
+    def test_profiles(self):
+        custom = {"safe": {'main': {'file_caching_ms': 2000}},
+                  "usb": {'main': {'aout': 'alsa', 'device': 'hw:1,0', 'resampler': 'soxr', 'resampler_quality': 4,
+                                   'args': '--no-video-title-show'}}}
+        self.assertEqual(audio_profiles.get_profile(custom, ""), {})
+        self.assertEqual(audio_profiles.get_profile(custom, "safe"), custom["safe"])  # Overridden
+        self.assertIn("live-low-latency", audio_profiles.all_profiles(custom))
+        with self.assertRaises(KeyError):
+            audio_profiles.get_profile(custom, "loud")
+
+        usb = audio_profiles.get_profile(custom, "usb")
+        self.assertEqual(audio_profiles.instance_args(usb, 'main'),
+                         "--aout=alsa --audio-resampler=soxr --soxr-resampler-quality=4 --no-video-title-show")
+        self.assertEqual(audio_profiles.audio_device(usb, 'main'), 'hw:1,0')
+        self.assertEqual(audio_profiles.instance_args(usb, 'bg'), "")
+        self.assertIsNone(audio_profiles.audio_device(usb, 'bg'))
+
+        live = audio_profiles.get_profile(custom, "live-low-latency")
+        self.assertEqual(audio_profiles.media_options(live, 'zad'), [':file-caching=100'])
+        self.assertTrue(audio_profiles.instance_args(live, 'main').startswith("--file-caching=100 "))
+
+    def test_calibration(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tone = os.path.join(tmp_dir, 'tone.wav')
+            audio_profiles.write_test_tone(tone, seconds=1, rate=8000)
+            with wave.open(tone, 'rb') as w:
+                self.assertEqual(w.getnframes(), 8000)
+        self.assertEqual(audio_profiles.recommend({'a': [50, 60, 70], 'b': [20, None, 20], 'c': [40, 45, 90]}), 'c')
+        self.assertIsNone(audio_profiles.recommend({'a': [None], 'b': []}))
+
+
+if __name__ == '__main__':
+    unittest.main()
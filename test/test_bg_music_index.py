@@ -0,0 +1,98 @@
+import unittest
+
+# Ugly hack to allow absolute import from the src folder
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import tempfile
+import threading
+import time
+from bg_music_index import BackgroundMusicIndex
+
+
+class BackgroundMusicIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.dir.name, 'bg')
+        for name in ['b/02.mp3', 'b/01.ogg', 'a.flac', 'cover.jpg', '.hidden/x.mp3']:
+            os.makedirs(os.path.dirname(os.path.join(self.root, name)), exist_ok=True)
+            with open(os.path.join(self.root, name), 'wb') as f:
+                f.write(name.encode())
+        self.index = BackgroundMusicIndex(os.path.join(self.dir.name, 'fest.bgindex.sqlite'), batch_size=2)
+
+    def scan(self):
+        tracks, probed, done = [], [], threading.Event()
+
+        def probe(file_path, cancelled):
+            probed.append(os.path.basename(file_path))
+            return 61000, 'Title ' + os.path.basename(file_path), 'Artist'
+
+        def on_updated(updates):
+            for i, track in updates.items():
+                tracks[i].update(track)
+
+        self.index.scan_async(self.root, tracks.extend, lambda: None, on_updated, probe)
+        self.index._thread.join()
+        return tracks, probed
+
+    def test_scan_and_cache(self):
+        tracks, probed = self.scan()
+        self.assertEqual([os.path.relpath(t['path'], self.root) for t in tracks],
+                         ['a.flac', os.path.join('b', '01.ogg'), os.path.join('b', '02.mp3')])
+        self.assertEqual(sorted(probed), ['01.ogg', '02.mp3', 'a.flac'])
+        self.assertEqual((tracks[1]['title'], tracks[1]['artist'], tracks[1]['duration']),
+                         ('Title 01.ogg', 'Artist', 61000))
+
+        with open(os.path.join(self.root, 'a.flac'), 'ab') as f:
+            f.write(b'changed')
+        tracks, probed = self.scan()
+        self.assertEqual(probed, ['a.flac'])
+        self.assertEqual(tracks[2]['title'], 'Title 02.mp3')
+
+    def test_cancel_slow_probe(self):
+        probing = threading.Event()
+
+        def probe(file_path, cancelled):  # Like VLC parsing a file on a stalled network drive
+            probing.set()
+            deadline = time.monotonic() + 4
+            while time.monotonic() < deadline and not cancelled():
+                time.sleep(0.01)
+            return None, None, None
+
+        self.index.scan_async(self.root, lambda tracks: None, lambda: None, lambda updates: None, probe)
+        self.assertTrue(probing.wait(2))
+        start = time.monotonic()
+        self.index.close()
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_rescan_does_not_revive_a_stuck_scan(self):
+        probing, calls = threading.Event(), []
+
+        def stuck_probe(file_path, cancelled):  # Ignores cancelled, outlives cancel()
+            calls.append(file_path)
+            probing.set()
+            time.sleep(1.5)
+            return 1000, 'Stuck', None
+
+        self.index.scan_async(self.root, lambda tracks: None, lambda: None, lambda updates: None, stuck_probe)
+        self.assertTrue(probing.wait(2))
+        old = self.index._thread
+        tracks, probed = self.scan()
+        old.join()
+        self.assertEqual(len(calls), 1)  # The old scan stopped after its probe
+        self.assertEqual(sorted(probed), ['01.ogg', '02.mp3', 'a.flac'])
+
+    def test_history(self):
+        path = os.path.join(self.root, 'a.flac')
+        self.index.record_play(path)
+        self.assertEqual(self.index.played_since(self.index.start_of_day()), {path})
+        self.assertEqual(self.index.played_since(2 ** 40), set())
+
+    def tearDown(self):
+        self.index.close()
+        self.dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+
+# Ugly hack to allow absolute import from the src folder
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import sqlite3
+import tempfile
+from c2_search import C2SearchIndex
+
+
+class C2SearchTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.dir.name, 'sqlite.db')
+        db = sqlite3.connect(self.source)
+        db.executescript("""
+            CREATE TABLE list (id INTEGER PRIMARY KEY, title TEXT, card_code TEXT, default_duration INTEGER);
+            CREATE TABLE requests (id INTEGER PRIMARY KEY, number INTEGER, topic_id INTEGER,
+                                   voting_number INTEGER, voting_title TEXT);
+            CREATE TABLE [values] (request_id INTEGER, request_section_id INTEGER, section_title TEXT,
+                                   title TEXT, value TEXT);
+            INSERT INTO list VALUES (1, 'Cosplay Show', 'CS', 180);
+            INSERT INTO requests VALUES (10, 101, 1, 1, 'Team Rocket');
+            INSERT INTO requests VALUES (11, 102, 1, 2, 'Sailor Moon');
+            INSERT INTO [values] VALUES (10, 1, 'Info', 'Character', 'Jessie'), (10, 1, 'Info', 'City', 'Москва'),
+                                        (11, 1, 'Info', 'Character', 'Usagi Tsukino'), (11, 1, 'Info', 'City', 'Kazan');
+        """)
+        db.commit()
+        db.close()
+        self.index = C2SearchIndex(os.path.join(self.dir.name, 'fest.c2search.sqlite'), self.source)
+
+    def execute(self, sql):
+        db = sqlite3.connect(self.source)
+        db.execute(sql)
+        db.commit()
+        db.close()
+        os.utime(self.source, ns=(0, os.stat(self.source).st_mtime_ns + 10 ** 9))
+
+    def test_search(self):
+        self.assertTrue(self.index.stale)
+        self.index.update()
+        self.assertFalse(self.index.stale)
+        self.assertEqual(self.index.search('jess'), {'101'})
+        self.assertEqual(self.index.search('москв'), {'101'})
+        self.assertEqual(self.index.search('cosplay'), {'101', '102'})
+        self.assertEqual(self.index.search('usagi kazan'), {'102'})
+        self.assertEqual(self.index.search('usagi moscow'), set())
+        self.assertEqual(self.index.search('"'), set())
+        self.assertEqual(self.index.search('AND ('), set())
+
+    def test_search_during_update(self):
+        self.index.update()
+        with self.index._lock:  # A re-index holds the writer
+            self.index._db.execute("BEGIN")
+            self.index._db.execute("DELETE FROM fts")
+            self.assertEqual(self.index.search('jess'), {'101'})  # The last committed index
+            self.index._db.execute("ROLLBACK")
+
+    def test_incremental(self):
+        self.index.update()
+        self.execute("UPDATE [values] SET value = 'James' WHERE request_id = 10 AND title = 'Character'")
+        self.assertTrue(self.index.stale)
+        self.index.update()
+        self.assertEqual(self.index.search('jessie'), set())
+        self.assertEqual(self.index.search('james'), {'101'})
+
+        self.execute("DELETE FROM requests WHERE id = 11")
+        self.index.update()
+        self.assertEqual(self.index.search('usagi'), set())
+        self.index.close()
+
+        reopened = C2SearchIndex(self.index.index_path, self.source)  # Up to date from the cache
+        self.assertFalse(reopened.stale)
+        self.assertEqual(reopened.search('james'), {'101'})
+        reopened.close()
+
+    def tearDown(self):
+        self.index.close()
+        self.dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
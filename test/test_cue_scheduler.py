@@ -0,0 +1,87 @@
+import unittest
+
+# Ugly hack to allow absolute import from the src folder
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import threading
+import time
+import cue_scheduler
+from cue_scheduler import CueScheduler, EMERGENCY, STOP, GO, UI
+
+
+class CueSchedulerTests(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = CueScheduler(['main', 'bg'])
+        self.done = []
+        self.started = threading.Event()
+
+    def fade(self, name, steps=1000):
+        self.started.set()
+        for i in range(steps):
+            cue_scheduler.sleep(0.01)
+        self.done.append(name)
+
+    def wait_idle(self, lane):
+        deadline = time.monotonic() + 2
+        while self.scheduler.busy(lane) and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def test_priorities_and_preemption(self):
+        self.scheduler.submit('main', GO, 'fade', self.fade, 'fade')
+        self.started.wait(1)
+        for name, priority in (('ui', UI), ('go', GO)):  # Queued behind the fade
+            self.scheduler.submit('main', priority, name, self.done.append, name)
+        time.sleep(0.05)
+        self.assertEqual(self.done, [])
+
+        start = time.monotonic()
+        self.scheduler.submit('main', STOP, 'stop', self.done.append, 'stop')  # Cancels the fade, drops UI and go
+        self.wait_idle('main')
+        self.assertLess(time.monotonic() - start, 0.1)
+        self.assertEqual(self.done, ['stop'])
+        outcomes = {entry['name']: entry['outcome'] for entry in self.scheduler.trace}
+        self.assertEqual(outcomes, {'fade': 'cancelled', 'ui': 'preempted', 'go': 'preempted', 'stop': 'done'})
+
+    def test_emergency_and_deadlines(self):
+        self.scheduler.submit('bg', GO, 'bg fade', self.fade, 'bg fade')
+        self.started.wait(1)
+        self.scheduler.submit('main', GO, 'late', self.done.append, 'late', deadline_s=0)
+        self.scheduler.submit('main', GO, 'broken', lambda: 1 / 0)
+        self.scheduler.submit('main', GO, 'next', self.done.append, 'next')
+        self.wait_idle('main')
+        self.assertEqual(self.done, ['next'])
+
+        self.scheduler.submit('main', EMERGENCY, 'emergency', self.done.append, 'emergency')
+        self.wait_idle('main')
+        self.wait_idle('bg')
+        self.assertEqual(self.done, ['next', 'emergency'])
+        outcomes = {entry['name']: entry['outcome'] for entry in self.scheduler.trace}
+        self.assertEqual(outcomes['late'], 'expired')
+        self.assertTrue(outcomes['broken'].startswith('error'))
+        self.assertEqual(outcomes['bg fade'], 'cancelled')
+
+    def test_supersede(self):
+        failed = []
+        self.scheduler.submit('main', GO, 'go 1', self.fade, 'go 1', on_failed=failed.append)
+        self.started.wait(1)
+        self.scheduler.submit('main', UI, 'ui', self.done.append, 'ui')
+        self.scheduler.submit('main', GO, 'go 2', self.fade, 'go 2', 1, on_failed=failed.append)
+        self.scheduler.submit('main', GO, 'go 3', self.done.append, 'go 3', supersede=True)
+        self.wait_idle('main')
+        self.assertEqual(self.done, ['go 3', 'ui'])  # The UI command is not a GO, it stays
+        self.assertEqual(failed, ['superseded', 'cancelled'])
+        outcomes = {entry['name']: entry['outcome'] for entry in self.scheduler.trace}
+        self.assertEqual(outcomes, {'go 1': 'cancelled', 'go 2': 'superseded', 'go 3': 'done', 'ui': 'done'})
+
+    def test_outside_of_the_scheduler(self):
+        cue_scheduler.checkpoint()
+        cue_scheduler.sleep(0)
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+
+# Ugly hack to allow absolute import from the src folder
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import json
+import tempfile
+import threading
+import time
+from artnet_output import artdmx_packet
+from cue_tracks import CueTrackRunner, TimedCue, load_cue_tracks, parse_time
+
+
+class FakeClock(object):
+    """ Media time running with the monotonic clock, can be paused and seeked """
+    def __init__(self):
+        self.running = False
+        self.base_ms = 0
+        self.t0 = time.monotonic()
+
+    def sample(self):
+        pass
+
+    def now_ms(self):
+        return self.base_ms + ((time.monotonic() - self.t0) * 1000 if self.running else 0)
+
+    def play(self, from_ms):
+        self.base_ms, self.t0, self.running = from_ms, time.monotonic(), True
+
+    def pause(self):
+        self.base_ms, self.running = self.now_ms(), False
+
+
+class CueTracksTests(unittest.TestCase):
+    def test_load(self):
+        self.assertEqual(parse_time("1:23.5"), 83500)
+        self.assertEqual(parse_time(2), 2000)
+        self.assertEqual(parse_time("1:00:00"), 3600000)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'fest.cues.json')
+            self.assertEqual(load_cue_tracks(file_path), {})
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump({"142": [{"at": "0:03", "action": "blackout"},
+                                   {"at": 1.5, "action": "dmx", "arg": "blue", "fade": 2}]}, f)
+            cues = load_cue_tracks(file_path)['142']
+            self.assertEqual([(c.at_ms, c.action, c.arg, c.fields) for c in cues],
+                             [(1500, 'dmx', 'blue', {'fade': 2}), (3000, 'blackout', None, {})])
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump({"142": [{"at": 1, "action": "explode"}]}, f)
+            with self.assertRaises(ValueError):
+                load_cue_tracks(file_path)
+
+    def test_artdmx(self):
+        packet = artdmx_packet(7, 0x123, bytes([255, 0, 10]))
+        self.assertEqual(packet[:8], b'Art-Net\0')
+        self.assertEqual(packet[8:18], bytes([0x00, 0x50, 0, 14, 7, 0, 0x23, 0x01, 0, 4]))
+        self.assertEqual(packet[18:], bytes([255, 0, 10, 0]))
+
+    def test_runner(self):
+        clock = FakeClock()
+        fired = []
+        done = threading.Event()
+
+        def fire(item, cue):
+            fired.append((cue.arg, clock.now_ms() - cue.at_ms))
+            if cue.arg == 'end':
+                done.set()
+
+        runner = CueTrackRunner(clock, fire)
+        runner.start()
+        try:
+            runner.arm('142', [TimedCue(-1, 'osc', 'old'), TimedCue(60, 'osc', 'a'), TimedCue(120, 'osc', 'b'),
+                               TimedCue(2000, 'osc', 'paused'), TimedCue(5000, 'osc', 'end')])
+            clock.play(0)
+            time.sleep(0.2)
+            clock.pause()  # At ~200 ms, 'paused' must wait
+            time.sleep(0.1)
+            self.assertEqual([arg for arg, late in fired], ['old', 'a', 'b'])
+            clock.play(4950)  # Seek over 'paused': skipped, not fired late
+            self.assertTrue(done.wait(2))
+            self.assertEqual([arg for arg, late in fired], ['old', 'a', 'b', 'end'])
+            self.assertTrue(all(late < 10 for arg, late in fired[1:]), fired)
+
+            runner.arm('143', [TimedCue(100, 'osc', 'never')])
+            clock.play(0)
+            runner.disarm()
+            time.sleep(0.2)
+            self.assertEqual(fired[-1][0], 'end')
+        finally:
+            runner.stop()
+
+    def test_clock_stops_during_spin(self):
+        clock = FakeClock()
+        fired = []
+        runner = CueTrackRunner(clock, lambda item, cue: fired.append(cue.arg), spin_ms=50)
+        runner.start()
+        try:
+            runner.arm('142', [TimedCue(40, 'osc', 'a')])
+            clock.play(0)
+            time.sleep(0.02)  # Spinning for 'a'
+            clock.running = False  # Buffering: the position holds without the pause bookkeeping
+            clock.base_ms = 20
+            time.sleep(0.3)
+            self.assertEqual(fired, [])
+            runner.disarm()  # The runner is not stuck in the spin
+            runner.arm('143', [TimedCue(10, 'osc', 'b')])
+            clock.play(0)
+            time.sleep(0.1)
+            self.assertEqual(fired, ['b'])
+        finally:
+            runner.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
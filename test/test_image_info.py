@@ -0,0 +1,50 @@
+import unittest
+
+# Ugly hack to allow absolute import from the src folder
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import struct
+import tempfile
+from image_info import image_size, decode_plan, jpeg_scale
+
+
+class ImageInfoTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def write(self, name, data):
+        file_path = os.path.join(self.dir.name, name)
+        with open(file_path, 'wb') as f:
+            f.write(data)
+        return file_path
+
+    def test_headers(self):
+        png = self.write('a.png', b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' +
+                         struct.pack('>II', 7680, 4320) + b'\x08\x06\0\0\0')
+        self.assertEqual(image_size(png), ('png', 7680, 4320))
+
+        app0 = b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\0' + b'\0' * 9
+        sof = b'\xff\xc2' + struct.pack('>HBHHB', 11, 8, 3000, 4000, 3) + b'\0' * 3
+        jpeg = self.write('a.jpg', b'\xff\xd8' + app0 + sof)
+        self.assertEqual(image_size(jpeg), ('jpeg', 4000, 3000))
+
+        self.assertIsNone(image_size(self.write('a.mp4', b'\0\0\0\x18ftypmp42')))
+
+    def test_decode_plan(self):
+        self.assertEqual(jpeg_scale((8000, 6000), (1920, 1080)), 4)
+        self.assertEqual(jpeg_scale((1920, 1080), (1920, 1080)), 1)
+
+        sof = b'\xff\xc0' + struct.pack('>HBHHB', 11, 8, 6000, 8000, 3) + b'\0' * 3
+        jpeg = self.write('big.jpg', b'\xff\xd8' + sof)
+        self.assertEqual(decode_plan(jpeg, (1920, 1080)), ('jpeg', 2000, 1500, 2000 * 1500 * 4))
+        self.assertEqual(decode_plan(jpeg, (1920, 1080), jpeg_draft=False), ('jpeg', 8000, 6000, 8000 * 6000 * 4))
+        self.assertIsNone(decode_plan(os.path.join(self.dir.name, 'missing.png')))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+# Ugly hack to allow absolute import from the src folder
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import tempfile
+from input_trace import InputRecorder, load_trace, summarize, compare
+
+
+class InputTraceTests(unittest.TestCase):
+    def test_record_and_load(self):
+        with tempfile.TemporaryDirectory() as folder:
+            file_path = os.path.join(folder, 'Fest.traces', 'input.jsonl')
+            recorder = InputRecorder(file_path, 'Fest.fest')
+            recorder.record_state({'seq': 0, 'cols': ['num'], 'rows': [], 'cursor': 0, 'bg': {}})
+            recorder.record('select', '142')
+            recorder.record('edit', {'num': '142', 'col': 'notes', 'value': '>143 мик'})
+            recorder.record('play_async')
+            recorder.close()
+            recorder.record('end_show')  # Closed: ignored
+
+            header, events = load_trace(file_path)
+            self.assertEqual(header['session'], 'Fest.fest')
+            self.assertEqual(header['state']['cols'], ['num'])
+            self.assertEqual([(e['action'], e['arg']) for e in events],
+                             [('select', '142'), ('edit', {'num': '142', 'col': 'notes', 'value': '>143 мик'}),
+                              ('play_async', None)])
+            self.assertEqual([e['t'] for e in events], sorted(e['t'] for e in events))
+
+    def test_old_traces_removed(self):
+        with tempfile.TemporaryDirectory() as folder:
+            for i in range(5):
+                InputRecorder(os.path.join(folder, 'input-%d.jsonl' % i), 'Fest.fest', keep=3).close()
+            self.assertEqual(sorted(os.listdir(folder)), ['input-2.jsonl', 'input-3.jsonl', 'input-4.jsonl'])
+
+    def test_summary_and_baseline(self):
+        summary = summarize([float(i) for i in range(1, 101)])
+        self.assertEqual((summary['count'], summary['p50'], summary['p90'], summary['max']), (100, 50.5, 90.1, 100))
+        self.assertEqual(summarize([]), {'count': 0})
+
+        baseline = {'cues': {'main/play': summarize([40, 50, 60])}, 'skipped': 0}
+        self.assertEqual(compare({'cues': {'main/play': summarize([45, 55, 64])}}, baseline), [])
+        regressions = compare({'cues': {'main/play': summarize([40, 50, 200])}}, baseline)
+        self.assertEqual(len(regressions), 2)  # p90 and max
+        self.assertTrue(regressions[0].startswith('cues/main/play p90'))
+        self.assertEqual(compare({'cues': {}}, baseline), [])  # Not replayed this time
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+# Ugly hack to allow absolute import from the src folder
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import tempfile
+from media_manifest import MediaManifest
+
+
+class MediaManifestTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.files_dir = os.path.join(self.tmp_dir.name, 'files')
+        os.mkdir(self.files_dir)
+        for name in ('001 First.mp3', '001 First.png', '002 Second.mp4'):
+            self.write(name, name.encode() * 1000)
+        self.manifest_path = os.path.join(self.tmp_dir.name, 'test.manifest.json')
+
+    def write(self, name, data):
+        with open(os.path.join(self.files_dir, name), 'wb') as f:
+            f.write(data)
+
+    def test_verify(self):
+        self.assertEqual(MediaManifest(self.manifest_path).build([self.files_dir]), 3)
+
+        self.write('002 Second.mp4', b'truncated')
+        self.write('003 Third.mp3', b'new')
+        os.remove(os.path.join(self.files_dir, '001 First.png'))
+        mtime = os.stat(os.path.join(self.files_dir, '001 First.mp3')).st_mtime
+        os.utime(os.path.join(self.files_dir, '001 First.mp3'), (mtime + 10, mtime + 10))  # Touched only
+
+        report = MediaManifest(self.manifest_path).verify([self.files_dir])
+        self.assertEqual([os.path.basename(p) for p in report['missing']], ['001 First.png'])
+        self.assertEqual([os.path.basename(p) for p in report['added']], ['003 Third.mp3'])
+        self.assertEqual([os.path.basename(p) for p in report['changed']], ['002 Second.mp4'])
+
+    def test_quick_check(self):
+        MediaManifest(self.manifest_path).build([self.files_dir])
+        file_path = os.path.join(self.files_dir, '001 First.mp3')
+        st = os.stat(file_path)
+        with open(file_path, 'r+b') as f:  # Bit rot: same size and mtime
+            f.write(b'X')
+        os.utime(file_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        manifest = MediaManifest(self.manifest_path)
+        self.assertEqual(manifest.verify([self.files_dir], quick=True)['changed'], [])
+        self.assertEqual(manifest.verify([self.files_dir])['changed'], [os.path.abspath(file_path)])
+
+    def test_incremental_build(self):
+        MediaManifest(self.manifest_path).build([self.files_dir])
+        self.write('002 Second.mp4', b'other version')
+        manifest = MediaManifest(self.manifest_path)
+        self.assertEqual(manifest.build([self.files_dir]), 1)
+        self.assertEqual(manifest.verify([self.files_dir]), {'missing': [], 'added': [], 'changed': []})
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+# Ugly hack to allow absolute import from the src folder
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import tempfile
+import time
+from media_staging import MediaStaging, STAGED, FAILED
+
+
+class MediaStagingTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.share = os.path.join(self.dir.name, 'share')
+        os.makedirs(self.share)
+        self.staging = MediaStaging(os.path.join(self.dir.name, 'cache'), chunk_mb=1, rescan_s=0.05)
+
+    def write(self, name, data, mtime=None):
+        file_path = os.path.join(self.share, name)
+        with open(file_path, 'wb') as f:
+            f.write(data)
+        if mtime:
+            os.utime(file_path, (mtime, mtime))
+        return file_path
+
+    def wait_for(self, src, state):
+        deadline = time.monotonic() + 5
+        while self.staging.state(src)[0] != state and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.staging.state(src)[0], state)
+
+    def test_staging(self):
+        data = os.urandom(3 * 1024 * 1024 + 5)
+        src = self.write('001 Song.mp4', data, mtime=1500000000)
+        missing = os.path.join(self.share, '002 Gone.mp4')
+        self.assertEqual(self.staging.resolve(src), src)
+
+        self.staging.stage([src, missing])
+        self.wait_for(src, STAGED)
+        self.wait_for(missing, FAILED)
+        local = self.staging.resolve(src)
+        self.assertNotEqual(local, src)
+        self.assertEqual(open(local, 'rb').read(), data)
+
+        self.write('001 Song.mp4', b'new version', mtime=1600000000)  # The copy is stale now
+        self.assertEqual(self.staging.resolve(src), src)
+        deadline = time.monotonic() + 5
+        while self.staging.resolve(src) == src and time.monotonic() < deadline:  # Taken again by the next pass
+            time.sleep(0.01)
+        self.assertEqual(open(self.staging.resolve(src), 'rb').read(), b'new version')
+
+        os.remove(src)  # The share is gone, the verified copy is still played
+        self.assertEqual(self.staging.resolve(src), local)
+
+    def tearDown(self):
+        self.staging.stop()
+        self.dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+# Ugly hack to allow absolute import from the src folder
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import queue
+import socket
+import struct
+from osc_input import OscListener, encode_message, parse_packet
+
+
+class OscTests(unittest.TestCase):
+    def parse(self, data):
+        messages = []
+        parse_packet(memoryview(data), lambda address, args: messages.append((address, args)))
+        return messages
+
+    def test_roundtrip(self):
+        self.assertEqual(self.parse(encode_message('/fest/go')), [(b'/fest/go', [])])
+        self.assertEqual(self.parse(encode_message('/fest/select', 5, '005a', 0.5, True, None)),
+                         [(b'/fest/select', [5, '005a', 0.5, True, None])])
+
+    def test_bundle(self):
+        first, second = encode_message('/fest/zad'), encode_message('/fest/select', 7)
+        bundle = b'#bundle\0' + b'\0' * 7 + b'\1' + \
+            struct.pack('>i', len(first)) + first + struct.pack('>i', len(second)) + second
+        self.assertEqual(self.parse(bundle), [(b'/fest/zad', []), (b'/fest/select', [7])])
+
+    def test_listener_and_feedback(self):
+        received = queue.Queue()
+        feedback = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        feedback.bind(('127.0.0.1', 0))
+        feedback.settimeout(2)
+
+        listener = OscListener('127.0.0.1:0', {b'/fest/go': lambda args, ns: received.put((args, ns))},
+                               '127.0.0.1:%d' % feedback.getsockname()[1])
+        listener.start()
+        try:
+            sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sender.sendto(encode_message('/fest/go', 1), listener.listen_address)
+            args, received_ns = received.get(timeout=2)
+            self.assertEqual(args, [1])
+            listener.executed('/fest/go', received_ns)
+            self.assertEqual(len(listener.latencies_ms), 1)
+            sender.close()
+
+            listener.publish({'item': '001', 'player': 'Playing'})
+            listener.publish({'item': '001', 'player': 'Stopped'})
+            messages = [self.parse(feedback.recv(1024))[0] for i in range(3)]
+            self.assertEqual(messages, [(b'/fest/item', ['001']), (b'/fest/player', ['Playing']),
+                                        (b'/fest/player', ['Stopped'])])
+        finally:
+            listener.stop()
+            feedback.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
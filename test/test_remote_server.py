@@ -0,0 +1,91 @@
+import unittest
+
+# Ugly hack to allow absolute import from the src folder
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import base64
+import http.client
+import json
+import queue
+import socket
+import struct
+from remote_server import RemoteControlServer
+
+
+class RemoteServerTests(unittest.TestCase):
+    def setUp(self):
+        self.commands = queue.Queue()
+        self.server = RemoteControlServer('127.0.0.1', 0, lambda action, arg: self.commands.put((action, arg)),
+                                          ['show_zad', 'select'], token='secret', arg_actions=['select'])
+        self.server.start()
+
+    def request(self, method, url):
+        conn = http.client.HTTPConnection('127.0.0.1', self.server.port, timeout=2)
+        conn.request(method, url)
+        response = conn.getresponse()
+        body = response.read()
+        conn.close()
+        return response.status, body
+
+    def ws_connect(self):
+        sock = socket.create_connection(('127.0.0.1', self.server.port), timeout=2)
+        key = base64.b64encode(os.urandom(16))
+        sock.sendall(b"GET /ws?token=secret HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\n"
+                     b"Connection: Upgrade\r\nSec-WebSocket-Key: " + key + b"\r\nSec-WebSocket-Version: 13\r\n\r\n")
+        f = sock.makefile('rb')
+        self.assertIn(b"101", f.readline())
+        while f.readline() != b"\r\n":
+            pass
+        return sock, f
+
+    @staticmethod
+    def ws_read(f):
+        b1, b2 = f.read(2)
+        length = b2 & 0x7F
+        if length == 126:
+            length, = struct.unpack('!H', f.read(2))
+        return json.loads(f.read(length).decode('utf-8'))
+
+    @staticmethod
+    def ws_send(sock, data):
+        payload, mask = json.dumps(data).encode('utf-8'), os.urandom(4)
+        sock.sendall(struct.pack('!BB', 0x81, 0x80 | len(payload)) + mask +
+                     bytes(b ^ mask[i % 4] for i, b in enumerate(payload)))
+
+    def test_http_actions(self):
+        self.assertEqual(self.request('POST', '/action/show_zad')[0], 403)
+        self.assertEqual(self.request('POST', '/action/show_zad?token=secret')[0], 202)
+        self.assertEqual(self.commands.get(timeout=2), ('show_zad', None))
+        self.assertEqual(self.request('POST', '/action/format_c?token=secret')[0], 404)
+        self.assertEqual(self.request('POST', '/action/select?token=secret')[0], 400)
+        self.assertEqual(self.request('POST', '/action/select?token=secret&arg=5')[0], 202)
+        self.assertEqual(self.commands.get(timeout=2), ('select', '5'))
+        self.assertTrue(self.commands.empty())
+
+    def test_body_limit(self):
+        sock = socket.create_connection(('127.0.0.1', self.server.port), timeout=2)
+        sock.sendall(b"POST /action/select?token=secret HTTP/1.1\r\nContent-Length: 1000000000\r\n\r\n")
+        self.assertIn(b"413", sock.makefile('rb').readline())
+        sock.close()
+        self.assertTrue(self.commands.empty())
+
+    def test_websocket_state_diffs(self):
+        self.server.publish({'item': '001', 'player': 'Playing', 'time': 1})
+        sock, f = self.ws_connect()
+        self.assertEqual(self.ws_read(f), {'item': '001', 'player': 'Playing', 'time': 1})
+
+        self.server.publish({'item': '001', 'player': 'Playing', 'time': 2})
+        self.assertEqual(self.ws_read(f), {'time': 2})
+
+        self.ws_send(sock, {'action': 'select', 'arg': '005'})
+        self.assertEqual(self.commands.get(timeout=2), ('select', '005'))
+        sock.close()
+
+    def tearDown(self):
+        self.server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+
+# Ugly hack to allow absolute import from the src folder
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import tempfile
+import threading
+import time
+from replication import PrimaryWatch, ReplicationPrimary, ReplicationStandby, decode, encode_playback, encode_record, FRAME
+from show_journal import ShowJournal, ShowState
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class ReplicationTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.journal = ShowJournal(os.path.join(self.tmp_dir.name, 'test'))
+        self.journal.start(ShowState(['№', 'name', 'files', 'notes'],
+                                     [{'cols': ['brk', 'Opening', 'break', '30m'], 'color': [128, 255, 200]},
+                                      {'cols': ['001', 'Первый', 'mp3', ''], 'color': [255, 255, 255]},
+                                      {'cols': ['002', 'Second', 'mp3', ''], 'color': [255, 255, 255]}]))
+        self.records = []
+        self.lost = []
+        self.lost_event = threading.Event()
+        self.primary = None
+        self.standby = None
+
+    def tearDown(self):
+        if self.standby:
+            self.standby.stop()
+        if self.primary:
+            self.primary.stop()
+        self.journal.stop()
+        self.tmp_dir.cleanup()
+
+    def on_lost(self, reason):
+        self.lost.append(reason)
+        self.lost_event.set()
+
+    def start(self, heartbeat_s=0.05, snapshot_s=30, timeout_s=1.0):
+        self.primary = ReplicationPrimary("127.0.0.1:0", self.journal, heartbeat_s=heartbeat_s,
+                                          snapshot_s=snapshot_s)
+        self.primary.start()
+        self.standby = ReplicationStandby("127.0.0.1:%d" % self.primary.port, self.records.extend,
+                                          on_lost=self.on_lost, timeout_s=timeout_s, retry_s=0.05)
+        self.standby.start()
+        self.assertTrue(wait_for(lambda: self.standby.state is not None))
+
+    def test_frames(self):
+        record = {'o': 'ins', 's': 7, 'r': 2, 'v': ['001a', 'Первый', 'mp3', '<001'], 'c': [128, 255, 255]}
+        data = encode_record(record)
+        kind, length = FRAME.unpack_from(data)
+        self.assertEqual(decode(kind, data[FRAME.size:]), record)
+        self.assertEqual(len(data), FRAME.size + length)
+        self.assertLess(len(data), 50)
+        data = encode_playback('001', 83500, True, '/bg/track.mp3', 1000, False)
+        kind, length = FRAME.unpack_from(data)
+        playback = decode(kind, data[FRAME.size:])
+        self.assertEqual(playback[:6], ('001', 83500, True, '/bg/track.mp3', 1000, False))
+
+    def test_follows_the_primary(self):
+        self.start()
+        self.assertEqual(self.standby.state.rows[1]['cols'][1], 'Первый')
+        self.journal.set_row(1, ['001', 'Первый', 'mp3', 'late'], [200, 200, 255])
+        self.journal.insert_row(2, ['001a', 'Первый', 'mp3', '<001'], [128, 255, 255])
+        self.journal.delete_row(0)
+        self.journal.set_cursor(1)
+        self.journal.set_bg(3, {'/bg/track.mp3': [200, 200, 200]})
+        self.primary.set_playback('001', 5000, True, '/bg/track.mp3', 0, False)
+        self.assertTrue(wait_for(lambda: self.standby.state.seq == 5))
+        self.assertEqual(self.standby.state.to_dict(), self.journal.state.to_dict())
+        self.assertEqual([r['o'] for r in self.records], ['snap', 'row', 'ins', 'del', 'cur', 'bg'])
+
+        self.assertTrue(wait_for(lambda: self.standby.playback.num == '001'))
+        num, pos_ms, playing = self.standby.position()[:3]
+        self.assertTrue(playing)
+        self.assertTrue(5000 <= pos_ms < 5100)  # Runs on from the last heartbeat
+
+        self.primary.stop()  # On purpose: no failover
+        self.assertTrue(wait_for(lambda: not self.standby.connected))
+        self.assertEqual(self.lost, [])
+
+    def test_periodic_snapshot(self):
+        self.start(snapshot_s=0.1)
+        self.assertTrue(wait_for(lambda: [r['o'] for r in self.records].count('snap') >= 2))
+
+    def test_heartbeat_loss(self):
+        self.start(heartbeat_s=10, timeout_s=0.3)
+        self.assertTrue(self.lost_event.wait(3))
+        self.assertIn("heartbeat", self.lost[0])
+
+    def test_connection_loss(self):
+        self.start()
+        with self.primary._lock:
+            [peer.close() for peer in self.primary._peers]  # Like a crashed primary
+        self.assertTrue(self.lost_event.wait(3))
+        self.assertEqual(len(self.lost), 1)
+
+    def test_primary_watch(self):
+        self.primary = ReplicationPrimary("127.0.0.1:0", self.journal, heartbeat_s=0.05)
+        self.primary.start()
+        back = []
+        watch = PrimaryWatch("127.0.0.1:%d" % self.primary.port, lambda: back.append(time.monotonic()),
+                             retry_s=0.05)
+        watch.start()
+        try:
+            self.assertTrue(wait_for(lambda: back))
+            time.sleep(0.3)
+            self.assertEqual(len(back), 1)  # Once while it stays
+        finally:
+            watch.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+# Ugly hack to allow absolute import from the src folder
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import tempfile
+from show_journal import ShowJournal, ShowState
+
+
+class ShowJournalTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.base_path = os.path.join(self.tmp_dir.name, 'test')
+        self.base_state = ShowState(['№', 'name', 'files', 'notes'],
+                                    [{'cols': ['brk', 'Opening', 'break', '30m'], 'color': [128, 255, 200]},
+                                     {'cols': ['001', 'First', 'mp3', ''], 'color': [255, 255, 255]},
+                                     {'cols': ['002', 'Second', 'mp3', ''], 'color': [255, 255, 255]}])
+
+    def test_replay(self):
+        journal = ShowJournal(self.base_path)
+        journal.start(self.base_state)
+        journal.set_row(1, ['001', 'First', 'mp3', 'late'], [200, 200, 200])
+        journal.insert_row(2, ['001a', 'First', 'mp3', '<001'], [128, 255, 255])
+        journal.delete_row(0)
+        journal.set_cursor(1)
+        journal.set_bg(3, {'/bg/track.mp3': [200, 200, 255]})
+        journal.stop()
+
+        state = ShowJournal(self.base_path).load()
+        self.assertEqual([r['cols'][0] for r in state.rows], ['001', '001a', '002'])
+        self.assertEqual(state.rows[0], {'cols': ['001', 'First', 'mp3', 'late'], 'color': [200, 200, 200]})
+        self.assertEqual(state.cursor, 1)
+        self.assertEqual(state.bg['track'], 3)
+        self.assertEqual(state.seq, 5)
+
+    def test_torn_tail_and_stale_records(self):
+        journal = ShowJournal(self.base_path, compact_records=2)
+        journal.start(self.base_state)
+        journal.set_cursor(1)
+        journal.set_cursor(2)  # Compaction is triggered here
+        journal.set_cursor(0)
+        journal.stop()
+
+        with open(journal.journal_path, 'a', encoding='utf-8') as f:
+            f.write('{"s":1,"o":"cur","r":1}\n')  # Stale record that is already in the snapshot
+            f.write('{"s":4,"o":"cu')  # Crash in the middle of a write
+
+        state = ShowJournal(self.base_path).load()
+        self.assertEqual(state.cursor, 0)
+        self.assertEqual(state.seq, 3)
+
+    def test_discard(self):
+        journal = ShowJournal(self.base_path)
+        journal.start(self.base_state)
+        journal.discard()
+        self.assertIsNone(ShowJournal(self.base_path).load())
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+# Ugly hack to allow absolute import from the src folder
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import queue
+import threading
+import time
+from stall_watchdog import StallWatchdog
+
+
+def blocking_call(seconds):
+    time.sleep(seconds)
+
+
+class StallWatchdogTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = queue.Queue()  # Stands for the GUI event loop
+        self.stalls = []
+        self.loop_thread = threading.Thread(target=self.run_loop)
+        self.loop_thread.start()
+
+    def run_loop(self):
+        while True:
+            func = self.loop.get()
+            if func is None:
+                return
+            func()
+
+    def test_stall_attribution(self):
+        watchdog = StallWatchdog(self.loop.put, self.stalls.append, self.loop_thread.ident, threshold_ms=100,
+                                 interval_ms=10, sample_ms=5, root=os.path.dirname(os.path.abspath(__file__)))
+        watchdog.start()
+        time.sleep(0.2)
+        self.assertEqual(self.stalls, [])  # A responsive loop
+
+        self.loop.put(lambda: blocking_call(0.4))
+        deadline = time.monotonic() + 2
+        while not self.stalls and time.monotonic() < deadline:
+            time.sleep(0.01)
+        watchdog.stop()
+
+        self.assertEqual(len(self.stalls), 1)
+        stall = self.stalls[0]
+        self.assertGreaterEqual(stall.duration_ms, 300)
+        self.assertTrue(stall.location.startswith('blocking_call (test_stall_watchdog.py:'), stall.location)
+        self.assertGreater(stall.samples, 10)
+        self.assertIn('run_loop', stall.stack[-3])
+
+    def tearDown(self):
+        self.loop.put(None)
+        self.loop_thread.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
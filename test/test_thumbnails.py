@@ -0,0 +1,81 @@
+import unittest
+
+# Ugly hack to allow absolute import from the src folder
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import queue
+import tempfile
+import threading
+from thumbnails import ThumbnailCache
+
+
+class ThumbnailCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.ready = queue.Queue()
+        self.rendered = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def render(self, src, dst, size):
+        self.gate.wait()
+        if src.endswith('broken.png'):
+            raise ValueError("broken")
+        self.rendered.append(os.path.basename(src))
+        with open(dst, 'w') as f:
+            f.write("%s %dx%d" % (src, size[0], size[1]))
+
+    def source(self, name):
+        file_path = os.path.join(self.dir.name, name)
+        with open(file_path, 'w') as f:
+            f.write(name)
+        return file_path
+
+    def test_request_and_invalidation(self):
+        cache = ThumbnailCache(os.path.join(self.dir.name, 'thumbs'), self.render, self.ready.put, workers=1)
+        src = self.source('001.png')
+        self.assertIsNone(cache.request(src, (56, 32)))
+        self.assertEqual(self.ready.get(timeout=2), src)
+        thumb = cache.request(src, (56, 32))
+        self.assertTrue(os.path.isfile(thumb))
+
+        os.utime(src, ns=(0, 0))  # Replaced file: a new thumbnail
+        self.assertEqual(cache.request(src, (56, 32)), thumb)  # Not seen until the item is refreshed
+        cache.forget(src)
+        self.assertIsNone(cache.request(src, (56, 32)))
+        self.ready.get(timeout=2)
+        self.assertNotEqual(cache.request(src, (56, 32)), thumb)
+
+        broken = self.source('broken.png')
+        cache.request(broken, (56, 32))
+        while cache.cache_path(broken, (56, 32)) not in cache._failed:
+            pass
+        self.assertIsNone(cache.request(broken, (56, 32)))
+        self.assertFalse(cache._pending)  # Not retried
+        cache.stop()
+        self.assertEqual(self.rendered, ['001.png', '001.png'])
+
+    def test_newest_first(self):
+        self.gate.clear()
+        cache = ThumbnailCache(os.path.join(self.dir.name, 'thumbs'), self.render, self.ready.put, workers=1,
+                               max_pending=2)
+        sources = [self.source('%03d.png' % i) for i in range(5)]
+        cache.request(sources[0], (56, 32))
+        while cache._pending:  # Taken by the worker, which waits for the gate
+            pass
+        for src in sources[1:]:
+            cache.request(src, (56, 32))
+        self.gate.set()
+        for i in range(3):  # The one in progress and the two last requested
+            self.ready.get(timeout=2)
+        cache.stop()
+        self.assertEqual(self.rendered[1:], ['004.png', '003.png'])
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+
+# Ugly hack to allow absolute import from the src folder
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import socket
+from playback_clock import PlaybackClock
+from timecode_output import TimecodeSender, mtc_full_frame, msc_go, smpte_text
+
+
+class FakePlayer(object):
+    def __init__(self):
+        self.now = 0.0
+        self.time = 0
+        self.playing = True
+
+
+class PlaybackClockTests(unittest.TestCase):
+    def setUp(self):
+        self.player = FakePlayer()
+        self.clock = PlaybackClock(lambda: self.player.time, lambda: self.player.playing, lambda: self.player.now)
+
+    def test_interpolation_and_drift(self):
+        self.assertIsNone(self.clock.now_ms())
+        self.clock.start(0)
+        self.player.now = 0.1
+        self.assertAlmostEqual(self.clock.now_ms(), 100)
+
+        # VLC runs 40ms ahead: the clock speeds up but never goes backwards
+        self.player.now, self.player.time = 0.25, 290
+        previous = self.clock.now_ms()
+        self.clock.sample()
+        self.assertAlmostEqual(self.clock.error_ms, 40)
+        self.player.now = 1.25
+        self.assertGreater(self.clock.now_ms(), previous + 1000)
+
+        self.player.now, self.player.time = 1.3, 60000  # Seek
+        self.clock.sample()
+        self.assertAlmostEqual(self.clock.now_ms(), 60000)
+
+    def test_hold_and_stop(self):
+        self.clock.start(1000)
+        self.player.now, self.player.playing = 0.5, False
+        self.clock.sample()
+        self.player.now = 5
+        self.assertAlmostEqual(self.clock.now_ms(), 1500)
+        self.clock.stop()
+        self.assertIsNone(self.clock.now_ms())
+
+
+class TimecodeTests(unittest.TestCase):
+    def test_encoding(self):
+        ms = ((1 * 60 + 2) * 60 + 3) * 1000 + 480  # 01:02:03, 12 frames at 25 fps
+        self.assertEqual(mtc_full_frame(ms, 25), bytes([0xF0, 0x7F, 0x7F, 0x01, 0x01, 0x21, 2, 3, 12, 0xF7]))
+        self.assertEqual(smpte_text(ms, 30, '005'), b"01:02:03:14 005\n")
+        self.assertEqual(msc_go('005'), b"\xF0\x7F\x7F\x02\x01\x015\xF7")
+        self.assertIsNone(msc_go('countdown'))
+
+    def test_sender(self):
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(('127.0.0.1', 0))
+        receiver.settimeout(2)
+        clock = PlaybackClock(lambda: -1)
+        clock.start(3000)
+        sender = TimecodeSender('127.0.0.1:%d' % receiver.getsockname()[1], clock, 25, 'smpte')
+        sender.set_item('007')
+        sender.start()
+        try:
+            first = receiver.recv(64).decode()
+            second = receiver.recv(64).decode()
+        finally:
+            sender.stop()
+            receiver.close()
+        self.assertTrue(first.startswith("00:00:03:") and first.endswith(" 007\n"), first)
+        self.assertGreater(second, first)
+        self.assertTrue(sender.lateness_ms)
+
+
+if __name__ == '__main__':
+    unittest.main()
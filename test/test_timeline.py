@@ -0,0 +1,79 @@
+import unittest
+
+# Ugly hack to allow absolute import from the src folder
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import threading
+import time
+from timeline import TimelineScheduler, format_slip, occurrence, parse_start, project_slips
+
+
+class TimelineTests(unittest.TestCase):
+    def test_parse_start(self):
+        self.assertEqual(parse_start("12:00"), (12 * 3600, None))
+        self.assertEqual(parse_start(" 09:05:30 Countdown "), (9 * 3600 + 5 * 60 + 30, 'countdown'))
+        self.assertIsNone(parse_start("  "))
+        for bad in ("12", "25:00", "12:60", "12:00 dance", "12:00 zad now", "noon"):
+            with self.assertRaises(ValueError):
+                parse_start(bad)
+
+    def test_occurrence(self):
+        now = time.mktime((2026, 5, 1, 23, 50, 0, 0, 0, -1))
+        self.assertEqual(occurrence(23 * 3600 + 55 * 60, now), now + 300)
+        self.assertEqual(occurrence(10 * 60, now), now + 20 * 60)  # After midnight
+        self.assertEqual(occurrence(23 * 3600, now), now - 50 * 60)
+        self.assertEqual(format_slip(90.4), "+1:30")
+        self.assertEqual(format_slip(-45), "-0:45")
+
+    def test_project_slips(self):
+        rows = [{'scheduled': 1000, 'duration': 100, 'started': 1030},
+                {'scheduled': None, 'duration': 200, 'started': None},
+                {'scheduled': 1200, 'duration': 60, 'started': None},
+                {'scheduled': 1900, 'duration': None, 'started': None}]
+        # The first row started 30s late and plays until 1130, the second one until 1340
+        self.assertEqual(project_slips(rows, 0, now=1050, gap=10), [30, None, 150, 0])  # Waits for 1900
+        self.assertEqual(project_slips(rows, 0, now=1200, gap=10), [30, None, 210, 0])  # Starts from now
+        self.assertEqual(project_slips(rows, -1, now=900), [0, None, 100, 0])
+
+
+class TimelineSchedulerTests(unittest.TestCase):
+    def setUp(self):
+        self.fired = []
+        self.event = threading.Event()
+        self.wall_offset = 0.0
+        self.scheduler = TimelineScheduler(self.fire, late_s=60, check_s=0.02,
+                                           now=lambda: time.time() + self.wall_offset)
+        self.scheduler.start()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def fire(self, key, action):
+        self.fired.append((key, action, time.monotonic()))
+        self.event.set()
+
+    def test_fires_once_on_time(self):
+        t0 = time.monotonic()
+        ts = time.time() + 0.1
+        self.scheduler.set_entries([('101', ts, 'zad'), ('old', ts - 3600, 'zad')])
+        self.assertTrue(self.event.wait(2))
+        self.assertEqual([f[:2] for f in self.fired], [('101', 'zad')])
+        self.assertGreaterEqual(self.fired[0][2] - t0, 0.09)
+        self.scheduler.set_entries([('101', ts, 'zad'), ('102', ts + 3600, 'zad')])  # 101 keeps its fired state
+        time.sleep(0.1)
+        self.assertEqual(len(self.fired), 1)
+
+    def test_system_clock_step(self):
+        self.scheduler.set_entries([('brk 15:00', time.time() + 30, 'countdown')])
+        time.sleep(0.1)
+        self.wall_offset = 30  # The clock is set right: 15:00 is now
+        self.assertTrue(self.event.wait(2))
+        self.wall_offset = -3600  # And back: nothing fires again
+        time.sleep(0.1)
+        self.assertEqual([f[:2] for f in self.fired], [('brk 15:00', 'countdown')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+# Ugly hack to allow absolute import from the src folder
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import struct
+import tempfile
+import wave
+from waveform import WaveformCache, wav_peaks, reduce_peaks, window_levels, np, BUCKET_SAMPLES
+
+
+class WaveformTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def write_wav(self, samples):
+        file_path = os.path.join(self.dir.name, 'a.wav')
+        with wave.open(file_path, 'wb') as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(8000)
+            w.writeframes(struct.pack('<%dh' % len(samples), *samples))
+        return file_path
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_peaks(self):
+        samples = [0] * BUCKET_SAMPLES + [-1000, 2000] * (BUCKET_SAMPLES // 2) + [5, -7, 3]
+        peaks = wav_peaks(self.write_wav(samples), chunk_buckets=1)
+        self.assertEqual(peaks.tolist(), [[0, 0], [-1000, 2000], [-7, 5]])
+
+        npy = os.path.join(self.dir.name, 'a.npy')
+        np.save(npy, np.arange(200, dtype='<i2').reshape(100, 2))
+        mapped = np.load(npy, mmap_mode='r')
+        self.assertEqual(reduce_peaks(mapped, 0, 100, 4).tolist(), [[0, 49], [50, 99], [100, 149], [150, 199]])
+        self.assertEqual(reduce_peaks(mapped, 98, 120, 4).tolist(), [[196, 197], [198, 199]])
+        self.assertEqual(len(reduce_peaks(mapped, 100, 120, 4)), 0)
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_window_levels(self):
+        peaks = np.array([[0, 0], [-16384, 16384], [-8192, 8192], [0, 0]], dtype='<i2')
+        self.assertEqual(window_levels(peaks, 2, 1), (0.5, 0.5))
+        peak, rms = window_levels(peaks, 3, 3)  # The window is cut at the start
+        self.assertEqual(peak, 0.5)
+        self.assertAlmostEqual(rms, ((0.5 ** 2 + 0.25 ** 2) / 3) ** 0.5)
+        self.assertEqual(window_levels(peaks, 10, 2), (0.0, 0.0))  # After the end: silence
+        self.assertEqual(window_levels(peaks, 0, 5), (0.0, 0.0))
+
+    def test_cache_key(self):
+        cache = WaveformCache(os.path.join(self.dir.name, 'peaks'))
+        src = self.write_wav([0] * 10)
+        key = cache.peaks_path(src)
+        self.assertEqual(cache.peaks_path(src), key)
+        os.utime(src, ns=(0, 0))  # Replaced file: new peaks
+        self.assertNotEqual(cache.peaks_path(src), key)
+        self.assertIsNone(cache.peaks_path(os.path.join(self.dir.name, 'missing.wav')))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
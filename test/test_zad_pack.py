@@ -0,0 +1,62 @@
+import unittest
+
+# Ugly hack to allow absolute import from the src folder
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import tempfile
+from zad_pack import ZadPack
+
+
+class ZadPackTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.rendered = []
+
+    def image(self, name, content, mtime=1500000000):
+        file_path = os.path.join(self.dir.name, name)
+        with open(file_path, 'wb') as f:
+            f.write(content)
+        os.utime(file_path, (mtime, mtime))
+        return file_path
+
+    def render(self, src, size, policy):
+        """ A 'frame' derived from the file content and the output size """
+        self.rendered.append(os.path.basename(src))
+        with open(src, 'rb') as f:
+            return size[0], size[1], f.read() * size[0] * size[1]
+
+    def test_build_and_read(self):
+        pack_path = os.path.join(self.dir.name, 'fest.zadpack')
+        a, b = self.image('001.jpg', b'a'), self.image('002.jpg', b'bb')
+        pack = ZadPack(pack_path)
+        self.assertIsNone(pack.frame(a, (4, 3), 'fit', lambda w, h, rgb: bytes(rgb)))
+
+        jobs = [(a, (4, 3), 'fit'), (b, (4, 3), 'fit')]
+        self.assertEqual(pack.build(jobs, self.render), 2)
+        pack = ZadPack(pack_path)  # As at the next start
+        self.assertEqual(pack.frame(b, (4, 3), 'fit', lambda w, h, rgb: (w, h, bytes(rgb))), (4, 3, b'bb' * 12))
+        self.assertIsNone(pack.frame(b, (8, 6), 'fit', lambda w, h, rgb: bytes(rgb)))  # Other projector size
+
+        self.image('002.jpg', b'BB', mtime=1600000000)  # Changed: only it is rendered again
+        self.assertIsNone(pack.frame(b, (4, 3), 'fit', lambda w, h, rgb: bytes(rgb)))
+        self.rendered = []
+        self.assertEqual(pack.build(jobs, self.render, compact_ratio=0), 1)  # Appended after the old index
+        self.assertEqual(self.rendered, ['002.jpg'])
+        self.assertEqual(pack.frame(b, (4, 3), 'fit', lambda w, h, rgb: bytes(rgb)), b'BB' * 12)
+        self.assertEqual(pack.frame(a, (4, 3), 'fit', lambda w, h, rgb: bytes(rgb)), b'a' * 12)
+        self.assertEqual(pack.build(jobs, self.render), 0)
+
+        big = [(a, (8, 6), 'fit')]  # The projector changed: the old frames are dropped
+        self.assertEqual(pack.build(big, self.render), 1)
+        self.assertEqual(pack.sizes(), {(8, 6)})
+        self.assertEqual(pack.frame(a, (8, 6), 'fit', lambda w, h, rgb: bytes(rgb)), b'a' * 48)
+        pack.close()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()